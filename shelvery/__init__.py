@@ -1,4 +1,5 @@
 __version__ = '0.10.0'
 LAMBDA_WAIT_ITERATION = 'lambda_wait_iteration'
 S3_DATA_PREFIX = 'backups'
+POLL_ESTIMATES_PREFIX = 'poll_estimates'
 SHELVERY_DO_BACKUP_TAGS = ['True', 'true', '1', 'TRUE']
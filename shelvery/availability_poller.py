@@ -0,0 +1,263 @@
+"""Batched waiting for backups to become available.
+
+Every copy, share and store operation has to wait for its backup to become available
+first. Polled one backup at a time, that is one thread and one describe call per backup
+every few seconds. Instead, waiters register the backup id with the poller of their
+engine type and region, and a single thread per poller resolves all pending ids with
+batched describe calls.
+
+How often each backup is checked is up to its PollSchedule: a backup that reports its
+progress is checked around the time it is expected to complete, a small one is checked
+often, and anything else is backed off exponentially.
+"""
+
+import logging
+import random
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+# What an engine knows about a pending backup. Only `available` is required; progress is a
+# percentage, size is in GiB, started is the datetime the backup was started at, and
+# entity_id is what completion estimates are remembered against between runs.
+BackupStatus = namedtuple('BackupStatus', ['available', 'progress', 'size', 'started', 'entity_id'],
+                          defaults=(None, None, None, None))
+
+
+class PollSchedule:
+    """Decides when each pending backup is checked next."""
+
+    # seconds, bounds of the interval between two checks of the same backup
+    MIN_INTERVAL = 5
+    MAX_INTERVAL = 300
+
+    # +/- share of an interval added at random, so backups started together spread out
+    JITTER = 0.2
+
+    # GiB, backups up to this size are checked at the minimum interval
+    SMALL_BACKUP_SIZE = 8
+
+    def __init__(self, estimates=None):
+        # entity id -> seconds per GiB its backups took to complete, carried between runs
+        self.estimates = estimates if estimates is not None else {}
+        # entity ids whose estimate changed in this run, the only ones to save
+        self.updated = set()
+        # backup id -> when it is checked next, how often it was checked, last progress seen
+        self._pending = {}
+
+    def add(self, backup_id, now, learn=True):
+        """Schedule checks of a backup. Estimates are only used for and learned from backups
+        with learn set - copies take as long as the copy does, not as their entity takes to back up
+        """
+        self._pending.setdefault(backup_id, {'next': now, 'registered': now, 'attempts': 0, 'last': None,
+                                             'learn': learn})
+
+    def remove(self, backup_id):
+        self._pending.pop(backup_id, None)
+
+    def due(self, now):
+        # checks due shortly are brought forward, so they share the batch
+        horizon = now + self.MIN_INTERVAL / 2
+        return [backup_id for backup_id, state in self._pending.items() if state['next'] <= horizon]
+
+    def next_check(self):
+        return min((state['next'] for state in self._pending.values()), default=None)
+
+    def pending(self, backup_id, status, now):
+        """The backup is not available yet, schedule its next check."""
+        state = self._pending[backup_id]
+        state['attempts'] += 1
+        interval = self._estimate_remaining(state, status, now)
+        if interval is None:
+            interval = self.MIN_INTERVAL * 2 ** state['attempts']
+        interval = self._clamp(interval) * random.uniform(1 - self.JITTER, 1 + self.JITTER)
+        state['next'] = now + self._clamp(interval)
+
+    def completed(self, backup_id, status, now):
+        """The backup is available, remember how long its entity takes to back up."""
+        state = self._pending.pop(backup_id, None)
+        if state is None or status.entity_id is None or not state['learn']:
+            return
+
+        started = status.started.timestamp() if status.started is not None else state['registered']
+        took = (now - started) / (status.size or 1)
+        previous = self.estimates.get(status.entity_id)
+        self.estimates[status.entity_id] = took if previous is None else (previous + took) / 2
+        self.updated.add(status.entity_id)
+
+    def _estimate_remaining(self, state, status, now):
+        last, state['last'] = state['last'], (now, status.progress)
+
+        if status.size is not None and status.size <= self.SMALL_BACKUP_SIZE:
+            return self.MIN_INTERVAL
+
+        # progress observed between two checks is the best guess there is
+        if status.progress is not None and last is not None and last[1] is not None:
+            progressed = status.progress - last[1]
+            if progressed > 0:
+                return (100 - status.progress) * (now - last[0]) / progressed
+
+        # otherwise go by how long this entity took last time
+        estimate = self.estimates.get(status.entity_id) if status.entity_id is not None and state['learn'] else None
+        if estimate is not None:
+            started = status.started.timestamp() if status.started is not None else state['registered']
+            remaining = estimate * (status.size or 1) - (now - started)
+            if remaining > 0:
+                return remaining
+
+        return None
+
+    def _clamp(self, interval):
+        return min(self.MAX_INTERVAL, max(self.MIN_INTERVAL, interval))
+
+
+class AvailabilityPoller:
+    """Resolves pending backups of one engine type, in one region, in batches."""
+
+    # backup ids per describe call
+    BATCH_SIZE = 100
+
+    _pollers = {}
+    _pollers_lock = threading.Lock()
+
+    def __init__(self, engine, region):
+        self.engine = engine
+        self.region = region
+        # backup id -> futures of everyone waiting on it
+        self._pending = {}
+        # backup ids not to learn completion estimates from, see PollSchedule.add
+        self._unlearned = set()
+        self._schedule = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def for_engine(cls, engine, region):
+        """The process wide poller for the engine's backups in the region."""
+        key = (engine.get_engine_type(), region, engine.role_arn, engine.role_external_id)
+        with cls._pollers_lock:
+            poller = cls._pollers.get(key)
+            if poller is None:
+                poller = cls._pollers[key] = cls(engine, region)
+            return poller
+
+    @classmethod
+    def clear(cls):
+        with cls._pollers_lock:
+            cls._pollers.clear()
+
+    def wait(self, backup_id: str, learn: bool = True) -> Future:
+        """Register a backup, the returned future resolves once it is available. Leave learn
+        unset for copies, whose completion says nothing about how long their entity takes to back up.
+        """
+        future = Future()
+        with self._lock:
+            self._pending.setdefault(backup_id, []).append(future)
+            if not learn:
+                self._unlearned.add(backup_id)
+            if self._schedule is not None:
+                self._schedule.add(backup_id, time.time(), learn=backup_id not in self._unlearned)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True,
+                                                name=f"shelvery-poller-{self.engine.get_engine_type()}-{self.region}")
+                self._thread.start()
+        self._wakeup.set()
+        return future
+
+    def forget(self, backup_id: str, future: Future):
+        """Stop polling for a waiter that has given up."""
+        with self._lock:
+            futures = self._pending.get(backup_id, [])
+            if future in futures:
+                futures.remove(future)
+            if not futures:
+                self._pending.pop(backup_id, None)
+                self._unlearned.discard(backup_id)
+                if self._schedule is not None:
+                    self._schedule.remove(backup_id)
+        self._wakeup.set()
+
+    def _run(self):
+        if self._schedule is None:
+            schedule = PollSchedule(self._load_estimates())
+            with self._lock:
+                now = time.time()
+                for backup_id in self._pending:
+                    schedule.add(backup_id, now, learn=backup_id not in self._unlearned)
+                self._schedule = schedule
+
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._thread = None
+                    estimates = {entity_id: self._schedule.estimates[entity_id]
+                                 for entity_id in self._schedule.updated}
+                    self._schedule.updated.clear()
+                    break
+                backup_ids = self._schedule.due(time.time())
+
+            if not backup_ids:
+                self._wakeup.clear()
+                with self._lock:
+                    next_check = self._schedule.next_check()
+                self._wakeup.wait(max(0, next_check - time.time()) if next_check is not None else None)
+                continue
+
+            statuses = {}
+            for i in range(0, len(backup_ids), self.BATCH_SIZE):
+                statuses.update(self._poll(backup_ids[i:i + self.BATCH_SIZE]))
+
+            now = time.time()
+            with self._lock:
+                for backup_id in backup_ids:
+                    if backup_id not in self._pending:
+                        continue
+                    status = statuses.get(backup_id) or BackupStatus(False)
+                    if not status.available:
+                        self._schedule.pending(backup_id, status, now)
+                        continue
+                    self._schedule.completed(backup_id, status, now)
+                    self._unlearned.discard(backup_id)
+                    for future in self._pending.pop(backup_id):
+                        if not future.done():
+                            future.set_result(True)
+
+            logger.info(f"{len(self._pending)} {self.engine.get_engine_type()} backups in {self.region} "
+                        f"not available yet")
+
+        self._save_estimates(estimates)
+
+    def _poll(self, backup_ids):
+        try:
+            return self.engine.get_backups_status(self.region, backup_ids)
+        except Exception as e:
+            # one bad id can fail a whole batch, so the rest must not wait on it
+            logger.warning(f"Batched availability check of {len(backup_ids)} backups in {self.region} "
+                           f"failed, checking them one by one: {e}")
+
+        statuses = {}
+        for backup_id in backup_ids:
+            try:
+                statuses[backup_id] = BackupStatus(bool(self.engine.is_backup_available(self.region, backup_id)))
+            except Exception as e:
+                logger.warning(f"Failed to get availability of backup {backup_id}: {e}")
+        return statuses
+
+    def _load_estimates(self):
+        try:
+            return self.engine.load_poll_estimates(self.region)
+        except Exception as e:
+            logger.warning(f"Failed to load completion estimates, polling without them: {e}")
+            return {}
+
+    def _save_estimates(self, estimates):
+        if not estimates:
+            return
+        try:
+            self.engine.save_poll_estimates(self.region, estimates)
+        except Exception as e:
+            logger.warning(f"Failed to save completion estimates: {e}")
@@ -1,12 +1,44 @@
 import json
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
 import boto3
+import botocore.session
 from botocore.config import Config
+from botocore.credentials import RefreshableCredentials
 
 from shelvery.runtime_config import RuntimeConfig
+from shelvery.rate_limiter import RateLimiter
 from shelvery import S3_DATA_PREFIX
 
 class AwsHelper:
 
+    # boto3 clients are thread safe and expensive to build, so a single client is kept per
+    # (service, region, role arn, external id) for the lifetime of the process - in lambda
+    # that is the lifetime of the warm container, so it carries over between invocations
+    _client_cache = {}
+    _client_cache_lock = threading.RLock()
+    # creating clients off a shared session is not thread safe, so clients are built one at
+    # a time - under a lock of their own, so that cache lookups never wait on a build
+    _client_build_lock = threading.Lock()
+    _client_cache_stats = {'hits': 0, 'misses': 0}
+
+    # assumed role credentials, and the sessions built on them, are shared by every thread
+    # and engine in the process, keyed by (role arn, external id). A role is assumed once
+    # and then only again shortly before its credentials expire
+    _role_credentials = {}
+    _role_sessions = {}
+    _role_locks = {}
+    _role_locks_lock = threading.Lock()
+
+    # sts:GetCallerIdentity never changes answer within a process, so it is resolved once per
+    # role (None being the runtime's own credentials)
+    _caller_identities = {}
+
+    # must not be shorter than botocore's own advisory refresh window of 15 minutes, or
+    # refreshable credentials would be handed back the same, nearly expired, set
+    CREDENTIALS_EXPIRY_MARGIN = timedelta(minutes=15)
 
     @staticmethod
     def get_shelvery_bucket_policy(owner_id, share_account_ids, bucket_name):
@@ -44,7 +76,26 @@ class AwsHelper:
 
     @staticmethod
     def local_account_id():
-        return AwsHelper.boto3_client('sts').get_caller_identity()['Account']
+        return AwsHelper.caller_identity()['Account']
+
+    @staticmethod
+    def caller_identity(arn=None, external_id=None):
+        """
+        Account, ARN and partition of the runtime credentials, or of the given assumed role.
+        Resolved once per process and role, every later call is answered from memory. No lock
+        is held over the sts call, threads racing on the first lookup may each make it
+        """
+        key = (arn, external_id)
+        identity = AwsHelper._caller_identities.get(key)
+        if identity is None:
+            sts_client = AwsHelper.boto3_client('sts', arn=arn, external_id=external_id)
+            response = sts_client.get_caller_identity()
+            identity = AwsHelper._caller_identities.setdefault(key, {
+                'Account': response['Account'],
+                'Arn': response['Arn'],
+                'Partition': response['Arn'].split(':')[1]
+            })
+        return identity
 
     @staticmethod
     def local_region():
@@ -56,7 +107,21 @@ class AwsHelper:
 
     @staticmethod
     def boto3_sts(arn,external_id):
-        sts_client = boto3.client('sts',config=Config(retries={'max_attempts':AwsHelper.boto3_retry_config()}))
+        """
+        Returns credentials of the assumed role. Cached per role for the whole process, and
+        only assumed again once the cached credentials are about to expire
+        """
+        key = (arn, external_id)
+        with AwsHelper._role_lock(key):
+            credentials = AwsHelper._role_credentials.get(key)
+            if credentials is None or AwsHelper._is_expiring(credentials['Expiration']):
+                credentials = AwsHelper._assume_role(arn, external_id)
+                AwsHelper._role_credentials[key] = credentials
+            return credentials
+
+    @staticmethod
+    def _assume_role(arn, external_id):
+        sts_client = AwsHelper.boto3_client('sts')
         if external_id is not None:
             assumedRoleObject = sts_client.assume_role(
                 RoleArn=arn,
@@ -71,35 +136,128 @@ class AwsHelper:
 
         return assumedRoleObject['Credentials']
 
+    @staticmethod
+    def _role_lock(key):
+        # one lock per role, so that many accounts can be assumed in parallel
+        with AwsHelper._role_locks_lock:
+            return AwsHelper._role_locks.setdefault(key, threading.RLock())
+
+    @staticmethod
+    def _is_expiring(expiration):
+        return expiration - datetime.now(timezone.utc) < AwsHelper.CREDENTIALS_EXPIRY_MARGIN
+
+    @staticmethod
+    def _role_session(arn, external_id):
+        """
+        boto3 session for the assumed role. Its credentials refresh themselves through
+        boto3_sts, so clients built from it stay valid for as long as they are cached
+        """
+        key = (arn, external_id)
+        with AwsHelper._role_lock(key):
+            if key not in AwsHelper._role_sessions:
+                def refresh():
+                    credentials = AwsHelper.boto3_sts(arn, external_id)
+                    return {
+                        'access_key': credentials['AccessKeyId'],
+                        'secret_key': credentials['SecretAccessKey'],
+                        'token': credentials['SessionToken'],
+                        'expiry_time': credentials['Expiration'].isoformat()
+                    }
+
+                botocore_session = botocore.session.get_session()
+                botocore_session._credentials = RefreshableCredentials.create_from_metadata(
+                    metadata=refresh(),
+                    refresh_using=refresh,
+                    method='sts-assume-role'
+                )
+                AwsHelper._role_sessions[key] = boto3.session.Session(botocore_session=botocore_session)
+            return AwsHelper._role_sessions[key]
+
+    @staticmethod
+    def paginate(client, operation_name, result_key, page_size=None, **kwargs):
+        """
+        Lazily yields every item under result_key of a paginated api call, built on botocore
+        paginators. Pages of page_size items are only requested as they are consumed, and
+        kwargs - filters included - are sent with every page request
+        """
+        pagination_config = {} if page_size is None else {'PageSize': page_size}
+        paginator = client.get_paginator(operation_name)
+        for page in paginator.paginate(PaginationConfig=pagination_config, **kwargs):
+            for item in page.get(result_key, []):
+                yield item
+
+    @staticmethod
+    def rds_tags(tags: Dict) -> List[Dict]:
+        """Tags in the form the RDS family of apis - RDS and DocumentDb - take them. Those do not allow
+        commas in tag values
+        """
+        return list(map(lambda k: {'Key': k, 'Value': tags[k].replace(',', ' ')}, tags))
+
     @staticmethod
     def boto3_client(service_name, region_name = None, arn = None, external_id = None):
         if region_name is None:
             region_name = AwsHelper.local_region()
 
-        if arn is not None:
-            credentials = AwsHelper.boto3_sts(arn,external_id)
-            client = boto3.client(service_name,
-                            aws_access_key_id=credentials['AccessKeyId'],
-                            aws_secret_access_key=credentials['SecretAccessKey'],
-                            aws_session_token=credentials['SessionToken'],
-                            region_name=region_name,
-                            config=Config(retries={'max_attempts':AwsHelper.boto3_retry_config()}))
-        else:
-            client = boto3.client(service_name,
-                            region_name=region_name,
-                            config=Config(retries={'max_attempts':AwsHelper.boto3_retry_config()}))
+        key = (service_name, region_name, arn, external_id)
+        with AwsHelper._client_cache_lock:
+            client = AwsHelper._client_cache.get(key)
+            if client is not None:
+                AwsHelper._client_cache_stats['hits'] += 1
+                return client
+
+        # the role is assumed outside of the cache lock, so a slow AssumeRole only holds up
+        # callers of that same role
+        session = boto3 if arn is None else AwsHelper._role_session(arn, external_id)
+        with AwsHelper._client_build_lock:
+            with AwsHelper._client_cache_lock:
+                client = AwsHelper._client_cache.get(key)
+                if client is not None:
+                    AwsHelper._client_cache_stats['hits'] += 1
+                    return client
+            client = session.client(service_name,
+                                    region_name=region_name,
+                                    config=Config(retries={'max_attempts':AwsHelper.boto3_retry_config()}))
+            AwsHelper._rate_limit(client, arn)
+            with AwsHelper._client_cache_lock:
+                AwsHelper._client_cache_stats['misses'] += 1
+                AwsHelper._client_cache[key] = client
+            return client
 
+    @staticmethod
+    def _rate_limit(client, arn):
+        """Draw every call of the client from the process wide token buckets, see RateLimiter"""
+        scale = RuntimeConfig.get_rate_limit_scale()
+        if scale > 0:
+            RateLimiter.attach(client, account=arn, scale=scale, configured=RuntimeConfig.get_rate_limits())
         return client
 
+    @staticmethod
+    def client_cache_stats():
+        """Hit and miss counters of the client cache, to confirm clients are being reused"""
+        with AwsHelper._client_cache_lock:
+            return dict(AwsHelper._client_cache_stats, size=len(AwsHelper._client_cache))
+
+    @staticmethod
+    def clear_client_cache():
+        with AwsHelper._client_cache_lock:
+            AwsHelper._client_cache.clear()
+            AwsHelper._client_cache_stats['hits'] = 0
+            AwsHelper._client_cache_stats['misses'] = 0
+        with AwsHelper._role_locks_lock:
+            AwsHelper._role_credentials.clear()
+            AwsHelper._role_sessions.clear()
+            AwsHelper._caller_identities.clear()
+
+    @staticmethod
     def boto3_session(service_name, region_name = None, arn = None, external_id = None):
         if arn is not None:
-            credentials = AwsHelper.boto3_sts(arn,external_id)
-            session = boto3.session.Session(region_name=region_name,
-                                            aws_access_key_id=credentials['AccessKeyId'],
-                                            aws_secret_access_key=credentials['SecretAccessKey'],
-                                            aws_session_token=credentials['SessionToken'],
-                                            ).resource(service_name)
+            role_session = AwsHelper._role_session(arn, external_id)
+            # resources are not thread safe, so each caller gets its own - only the
+            # credentials underneath are shared
+            with AwsHelper._client_build_lock:
+                session = role_session.resource(service_name, region_name=region_name)
         else:
             session = boto3.session.Session(region_name=region_name).resource(service_name)
 
+        AwsHelper._rate_limit(session.meta.client, arn)
         return session
@@ -0,0 +1,151 @@
+"""In-process execution of a create_backups run as a graph of dependent steps.
+
+Outside lambda, create_backups used to create every backup first, then dispatch every DR
+copy, then every share - each on its own thread that slept until its backup became
+available. In the pipeline a backup's store, copy and share steps are queued as soon as
+the backup is created, and only start once the AvailabilityPoller reports the backup as
+available. A fixed set of workers runs whatever is ready, so the first snapshot to
+complete is copied straight away and nothing sleeps on a thread of its own. Copies are
+also only given a worker once they hold a slot of their CopyScheduler.
+"""
+
+import contextvars
+import functools
+import itertools
+import logging
+import queue
+import threading
+import time
+
+from shelvery.availability_poller import AvailabilityPoller
+from shelvery.copy_scheduler import CopyScheduler
+from shelvery.runtime_config import RuntimeConfig
+
+logger = logging.getLogger(__name__)
+
+
+class BackupPipeline:
+    """Runs steps on a bounded set of workers as soon as what they depend on is done."""
+
+    # steps of a lower stage are picked up first: finishing the backups that already
+    # exist goes ahead of creating more of them
+    STAGE_FOLLOW_UP = 0
+    STAGE_CREATE = 1
+
+    _STOP = (float('inf'), 0, None, None)
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self.errors = []
+        self._queue = queue.PriorityQueue()
+        self._sequence = itertools.count(1)
+        self._cond = threading.Condition()
+        self._outstanding = 0
+        # step -> (deadline, called when the deadline releases it)
+        self._waiting = {}
+        self._workers = []
+
+    def add(self, name, fn, stage=STAGE_FOLLOW_UP, ready=None, deadline=None, on_expire=None):
+        """Queue fn to run once the `ready` future is done, or once the deadline passes."""
+        # in the context of whoever queued it, e.g. the run report of create_backups
+        step = (stage, next(self._sequence), name, functools.partial(contextvars.copy_context().run, fn))
+        with self._cond:
+            self._outstanding += 1
+            self._start_workers()
+            if ready is None:
+                self._queue.put(step)
+                return
+            self._waiting[step] = (deadline, on_expire)
+            self._cond.notify_all()
+        ready.add_done_callback(lambda _: self._release(step))
+
+    def add_operation(self, engine, method_name: str, arguments, backup_region: str, backup_id: str,
+                      copy_region: str = None):
+        """Queue an engine operation, such as do_copy_backup, to run once its backup is available.
+
+        As with the invoker's thread mode, the operation runs on an engine of its own, so it
+        reports on its own - the engine shares this pipeline, so whatever the operation
+        dispatches in turn is queued here too. Operations copying the backup to copy_region
+        are queued again once available, to run once they are granted a copy slot.
+        """
+        poller = AvailabilityPoller.for_engine(engine, backup_region)
+        # backups outside of the region the engine runs in are DR copies, see do_wait_backup_available
+        ready = poller.wait(backup_id, learn=backup_region == engine.region)
+        deadline = time.time() + RuntimeConfig.get_wait_backup_timeout(engine)
+        engine_type = engine.get_engine_type()
+        role = (engine.role_arn, engine.role_external_id)
+
+        def run(scheduler=None, reservation=None):
+            from shelvery.factory import ShelveryFactory
+            backup_engine = ShelveryFactory.get_shelvery_instance(engine_type)
+            backup_engine.role_arn, backup_engine.role_external_id = role
+            backup_engine.pipeline = self
+            backup_engine.copy_slot = reservation
+            try:
+                getattr(backup_engine, method_name)(arguments)
+            finally:
+                if reservation is not None:
+                    # the slot goes back unless the copy took it over
+                    scheduler.discard(reservation)
+
+        def reserve():
+            scheduler = CopyScheduler.for_engine(engine, copy_region, RuntimeConfig.get_copy_concurrency(engine))
+            reservation = scheduler.reserve(lambda: engine._backup_size(backup_region, backup_id))
+            self.add(f"{method_name} {backup_id}", functools.partial(run, scheduler, reservation), ready=reservation)
+
+        # past the deadline the operation runs anyway, and times out through its own wait
+        self.add(f"{method_name} {backup_id}" if copy_region is None else f"reserve copy slot {backup_id}",
+                 run if copy_region is None else reserve, ready=ready, deadline=deadline,
+                 on_expire=lambda: poller.forget(backup_id, ready))
+
+    def join(self):
+        """Wait for every step, including the ones queued by steps that ran meanwhile."""
+        with self._cond:
+            while self._outstanding:
+                now = time.time()
+                for step, (deadline, on_expire) in list(self._waiting.items()):
+                    if deadline is not None and deadline <= now:
+                        del self._waiting[step]
+                        if on_expire is not None:
+                            on_expire()
+                        self._queue.put(step)
+                deadlines = [deadline for deadline, _ in self._waiting.values() if deadline is not None]
+                self._cond.wait(max(0, min(deadlines) - now) if deadlines else None)
+            workers, self._workers = self._workers, []
+
+        for _ in workers:
+            self._queue.put(self._STOP)
+        for worker in workers:
+            worker.join()
+
+    def _start_workers(self):
+        while len(self._workers) < self.max_workers:
+            worker = threading.Thread(target=self._work, daemon=True,
+                                      name=f"shelvery-pipeline-{len(self._workers)}")
+            self._workers.append(worker)
+            worker.start()
+
+    def _release(self, step):
+        with self._cond:
+            if self._waiting.pop(step, None) is None:
+                # already released by its deadline
+                return
+            self._queue.put(step)
+
+    def _work(self):
+        while True:
+            step = self._queue.get()
+            if step is self._STOP:
+                return
+            _, _, name, fn = step
+            try:
+                fn()
+            except BaseException as e:
+                # BaseException: the cli wait timeout calls sys.exit(), which must not take
+                # the worker - and every step queued behind it - down with it
+                logger.exception(f"Pipeline step {name} failed")
+                self.errors.append((name, e))
+            finally:
+                with self._cond:
+                    self._outstanding -= 1
+                    self._cond.notify_all()
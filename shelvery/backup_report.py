@@ -7,9 +7,11 @@ published to an optional SNS topic when the action finishes.
 Nothing in here is allowed to break a backup run.
 """
 
+import contextvars
 import functools
 import json
 import logging
+import threading
 import uuid
 from datetime import datetime, timezone
 
@@ -25,6 +27,10 @@ ABORTED = 'ABORTED'
 # entry list is bounded. The summary counters stay complete.
 MAX_ENTRIES = 500
 
+# The report of the action running in the current context, for what is observed outside the
+# engine - throttled api calls, see RateLimiter. Set by the engine while a report is open.
+current_run_report = contextvars.ContextVar('current_run_report', default=None)
+
 
 def _now():
     return datetime.now(timezone.utc)
@@ -69,12 +75,64 @@ class RunReport:
         self.started_at = _now()
         self.collected = 0
         self.entries = []
+        # what each report merged into this one covered, and how it went, see merge
+        self.sections = []
+        # 'service:operation class' -> api calls throttled while the action ran
+        self.throttles = {}
+        # operations may report from worker threads, see shelvery_create_concurrency
+        self._lock = threading.Lock()
+
+    # reports come back from worker processes pickled, see shelvery_worker_processes
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def merge(cls, reports, run_id=None):
+        """Combine the reports of several actions into the report of a single run.
+
+        Where the reports disagree on what ran where - two backup types, two regions - the
+        merged report lists every value, and each entry is labelled with the one it came from.
+        """
+        reports = list(reports)
+        fields = ('action', 'backup_type', 'account_id', 'region')
+        values = {field: sorted({str(getattr(r, field)) for r in reports}) for field in fields}
+        differing = [field for field in fields if len(values[field]) > 1]
+
+        merged = cls(*(','.join(values[field]) for field in fields), run_id=run_id,
+                     version=reports[0].version if reports else None)
+        if reports:
+            merged.started_at = min(r.started_at for r in reports)
+        for report in reports:
+            merged.collected += report.collected
+            with report._lock:
+                entries = list(report.entries)
+            for entry in entries:
+                merged.add(dict(entry, **{field: getattr(report, field) for field in differing}))
+            for key, count in report.throttles.items():
+                merged.throttled(key, count)
+            # one section per report, so a broken account or region shows up as such at a glance
+            merged.sections.append(dict({field: getattr(report, field) for field in fields},
+                                        status=report.status, summary=report.summary(),
+                                        throttles=dict(report.throttles)))
+        return merged
 
     def add(self, entry):
-        self.entries.append(entry)
+        with self._lock:
+            self.entries.append(entry)
+
+    def throttled(self, key, count=1):
+        with self._lock:
+            self.throttles[key] = self.throttles.get(key, 0) + count
 
     def count(self, status):
-        return sum(1 for e in self.entries if e['status'] == status)
+        with self._lock:
+            return sum(1 for e in self.entries if e['status'] == status)
 
     @property
     def status(self):
@@ -84,9 +142,19 @@ class RunReport:
             return 'PARTIAL'
         return 'OK'
 
+    def summary(self):
+        return {
+            'collected': self.collected,
+            'succeeded': self.count('OK'),
+            'skipped': self.count('IGNORE'),
+            'failed': self.count('ERROR') + self.count(ABORTED),
+        }
+
     def to_dict(self):
         # keep failures in preference to successes when trimming
-        entries = self.entries
+        with self._lock:
+            all_entries = list(self.entries)
+        entries = all_entries
         if len(entries) > MAX_ENTRIES:
             entries = ([e for e in entries if e['status'] != 'OK'] +
                        [e for e in entries if e['status'] == 'OK'])[:MAX_ENTRIES]
@@ -101,13 +169,10 @@ class RunReport:
             'started_at': _isoformat(self.started_at),
             'ended_at': _isoformat(_now()),
             'status': self.status,
-            'summary': {
-                'collected': self.collected,
-                'succeeded': self.count('OK'),
-                'skipped': self.count('IGNORE'),
-                'failed': self.count('ERROR') + self.count(ABORTED),
-            },
-            'entries_omitted': len(self.entries) - len(entries),
+            'summary': self.summary(),
+            'throttles': dict(self.throttles),
+            'sections': self.sections,
+            'entries_omitted': len(all_entries) - len(entries),
             'entries': entries,
         }
 
@@ -24,7 +24,13 @@ class BackupResource:
     RETENTION_MONTHLY = 'monthly'
     RETENTION_YEARLY = 'yearly'
 
-    def __init__(self, tag_prefix, entity_resource: EntityResource, construct=False, copy_resource_tags=True, exluded_resource_tag_keys=[], resource_properties={}):
+    # set by engines that pass the tags to the create call itself, so they are not tagged again
+    tagged_on_create = False
+
+    # the tags as last read from the backup, see changed_tags. None for backups not read from AWS
+    stored_tags = None
+
+    def __init__(self, tag_prefix, entity_resource: EntityResource, construct=False, copy_resource_tags=True, exluded_resource_tag_keys=[], resource_properties={}, account_id=None):
         """Construct new backup resource out of entity resource (e.g. ebs volume)."""
         # if object manually created
         if construct:
@@ -32,7 +38,7 @@ class BackupResource:
 
         # current date
         self.date_created = datetime.utcnow()
-        self.account_id = AwsHelper.local_account_id()
+        self.account_id = account_id if account_id is not None else AwsHelper.local_account_id()
 
         # determine retention period
         if self.date_created.day == 1:
@@ -96,13 +102,13 @@ class BackupResource:
         self.date_deleted = None
         self.resource_properties = resource_properties
 
-    def cross_account_copy(self, new_backup_id):
+    def cross_account_copy(self, new_backup_id, account_id=None, region=None):
         backup = copy.deepcopy(self)
 
         # backup name and retention type are copied
         backup.backup_id = new_backup_id
-        backup.region = AwsHelper.local_region()
-        backup.account_id = AwsHelper.local_account_id()
+        backup.region = region if region is not None else AwsHelper.local_region()
+        backup.account_id = account_id if account_id is not None else AwsHelper.local_account_id()
 
         tag_prefix = self.tags['shelvery:tag_name']
         backup.tags[f"{tag_prefix}:region"] = backup.region
@@ -114,6 +120,7 @@ class BackupResource:
         backup.tags[f"{tag_prefix}:cross_account_copy"] = 'true'
         backup.tags[f"{tag_prefix}:dr_regions"] = ''
         backup.tags[f"{tag_prefix}:dr_copies"] = ''
+        backup.stored_tags = None
         
         return backup
 
@@ -122,9 +129,11 @@ class BackupResource:
     def construct(cls,
                   tag_prefix: str,
                   backup_id: str,
-                  tags: Dict):
+                  tags: Dict,
+                  account_id: str = None):
         """
-        Construct BackupResource object from object id and aws tags stored by shelvery
+        Construct BackupResource object from object id and aws tags stored by shelvery.
+        account_id is used for backups that carry no src_account tag
         """
 
         obj = BackupResource(None, None, True)
@@ -132,6 +141,7 @@ class BackupResource:
         obj.entity_id = None
         obj.backup_id = backup_id
         obj.tags = tags
+        obj.stored_tags = dict(tags)
 
         # read properties from tags
         obj.retention_type = tags[f"{tag_prefix}:retention_type"]
@@ -152,11 +162,34 @@ class BackupResource:
         obj.region = tags[f"{tag_prefix}:region"]
         if f"{tag_prefix}:src_account" in tags:
             obj.account_id = tags[f"{tag_prefix}:src_account"]
+        elif account_id is not None:
+            obj.account_id = account_id
         else:
             obj.account_id = AwsHelper.local_account_id()
 
         return obj
 
+    def __getstate__(self):
+        """State pickled, copied and dumped to yaml - without what only holds for the backup as read
+        from or created in AWS by this run
+        """
+        state = dict(self.__dict__)
+        state.pop('stored_tags', None)
+        state.pop('tagged_on_create', None)
+        return state
+
+    def __setstate__(self, state):
+        """Backups loaded from their stored data hold the tags they were stored with"""
+        self.__dict__.update(state)
+        tags = state.get('tags')
+        self.stored_tags = dict(tags) if tags is not None else None
+
+    def changed_tags(self) -> Dict:
+        """Tags added or changed since the backup was read, all of them if it was not"""
+        if self.stored_tags is None:
+            return dict(self.tags)
+        return {key: value for key, value in self.tags.items() if self.stored_tags.get(key) != value}
+
     def entity_resource_tags(self):
         return self.entity_resource.tags if self.entity_resource is not None else {}
     
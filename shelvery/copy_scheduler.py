@@ -0,0 +1,161 @@
+"""Limits on DR copies in flight.
+
+EBS and RDS only allow so many snapshot copies in progress to a destination region at a
+time, and copies started past that fail with ResourceLimitExceeded. Every copy takes a slot
+from the scheduler of its engine type, destination region and account first, and holds it
+until the copy has completed in the destination region. Copies that have to wait for a
+slot go largest first: the longest copies start earliest, so the last one finishes sooner.
+
+A slot is either waited for on the calling thread with acquire, or reserved as a future
+that resolves once it is granted, so a BackupPipeline step can be queued on it instead of
+taking up a worker while it waits.
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+class CopyScheduler:
+    """Hands out the copy slots of one engine type, destination region and account."""
+
+    _schedulers = {}
+    _schedulers_lock = threading.Lock()
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_flight = 0
+        # (-size, sequence, reservation) of every copy waiting for a slot
+        self._waiting = []
+        # reservations granted a slot that has not been taken over by a copy yet
+        self._granted = set()
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_engine(cls, engine, region, limit):
+        """The process wide scheduler of the engine's copies to the region"""
+        key = (engine.get_engine_type(), region, engine.role_arn, engine.role_external_id)
+        with cls._schedulers_lock:
+            scheduler = cls._schedulers.get(key)
+            if scheduler is None:
+                scheduler = cls._schedulers[key] = cls(limit)
+            # the limit may be configured differently by now, the latest one applies
+            scheduler.limit = limit
+            return scheduler
+
+    @classmethod
+    def clear(cls):
+        with cls._schedulers_lock:
+            cls._schedulers.clear()
+
+    def acquire(self, size_fn):
+        """Take a slot, waiting for one if all are in use. size_fn gives the size of the copy,
+        and is only called when it has to wait.
+        """
+        reservation = self.reserve(size_fn)
+        reservation.result()
+        self.take(reservation)
+
+    def reserve(self, size_fn) -> Future:
+        """Queue for a slot without waiting for it. The returned future resolves once the slot
+        is granted, and the slot is then held until it is taken over by a copy with take, or
+        given back with discard.
+        """
+        reservation = Future()
+        with self._lock:
+            if self._free():
+                self._grant(reservation)
+                return reservation
+
+        try:
+            size = size_fn() or 0
+        except Exception as e:
+            logger.warning(f"Failed to get the size of a queued copy, queueing it last: {e}")
+            size = 0
+
+        with self._lock:
+            if self._free():
+                self._grant(reservation)
+                return reservation
+            heapq.heappush(self._waiting, (-size, next(self._sequence), reservation))
+            logger.info(f"{self.in_flight} copies in flight, {len(self._waiting)} waiting for a slot")
+        return reservation
+
+    def take(self, reservation: Future) -> bool:
+        """Take over the slot of a granted reservation, to be released by the copy. False if the
+        reservation was not granted, or was taken over already.
+        """
+        with self._lock:
+            if reservation not in self._granted:
+                return False
+            self._granted.discard(reservation)
+            return True
+
+    def discard(self, reservation: Future):
+        """Give up a reservation no copy took over - leave the queue, or give the slot back"""
+        with self._lock:
+            if reservation.cancel():
+                # still queued, leave the queue
+                self._waiting = [waiting for waiting in self._waiting if waiting[2] is not reservation]
+                heapq.heapify(self._waiting)
+                return
+            if reservation not in self._granted:
+                return
+            self._granted.discard(reservation)
+        self.release()
+
+    def release(self):
+        """Hand the slot to the largest waiting copy, or free it"""
+        with self._lock:
+            if not self._waiting or self.in_flight > self.limit:
+                self.in_flight -= 1
+                return
+            _, _, reservation = heapq.heappop(self._waiting)
+            reservation.set_running_or_notify_cancel()
+            self._granted.add(reservation)
+        # outside of the lock, as whatever waits on it may reserve or release in turn
+        reservation.set_result(True)
+
+    def _grant(self, reservation):
+        self.in_flight += 1
+        self._granted.add(reservation)
+        reservation.set_running_or_notify_cancel()
+        reservation.set_result(True)
+
+    def release_when_done(self, future, timeout, on_timeout=None):
+        """Release the slot once the copy's completion future is done, or after timeout seconds at
+        the latest - a copy that fails in the destination region never completes.
+        """
+        released = []
+        released_lock = threading.Lock()
+
+        def release_once():
+            with released_lock:
+                if released:
+                    return
+                released.append(True)
+            self.release()
+
+        def expire():
+            if not future.done():
+                logger.warning(f"Copy still not complete after {timeout} seconds, releasing its slot")
+                if on_timeout is not None:
+                    on_timeout()
+            release_once()
+
+        def done(_):
+            timer.cancel()
+            release_once()
+
+        timer = threading.Timer(timeout, expire)
+        timer.daemon = True
+        timer.start()
+        future.add_done_callback(done)
+
+    def _free(self):
+        return self.in_flight < self.limit and not self._waiting
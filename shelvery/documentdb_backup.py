@@ -1,4 +1,7 @@
 import boto3
+import contextvars
+
+from concurrent.futures import ThreadPoolExecutor
 
 from shelvery.runtime_config import RuntimeConfig
 from shelvery.backup_resource import BackupResource
@@ -8,15 +11,62 @@ from shelvery.entity_resource import EntityResource
 from typing import Dict, List
 from botocore.errorfactory import ClientError
 from shelvery.aws_helper import AwsHelper
+from shelvery.availability_poller import BackupStatus
 
 
 class ShelveryDocumentDbBackup(ShelveryEngine):
+
+    # concurrent list_tags_for_resource calls, when snapshot tags can't be read in bulk
+    TAG_FETCH_CONCURRENCY = 8
+
+    CLEAN_DELETE_CONCURRENCY = 4
+
+    TAG_ON_COPY = True
+
+    # pending snapshots up to which their status is described one by one, rather than by listing every manual snapshot
+    STATUS_DESCRIBE_THRESHOLD = 10
+
+    def __init__(self):
+        ShelveryEngine.__init__(self)
+        # snapshot arn -> tags, for snapshots whose tags had to be fetched one by one
+        self._snapshot_tags_cache = {}
+
     def is_backup_available(self, backup_region: str, backup_id: str) -> bool:
         docdb_client = AwsHelper.boto3_client('docdb', region_name=backup_region, arn=self.role_arn,
                                               external_id=self.role_external_id)
         snapshots = docdb_client.describe_db_cluster_snapshots(DBClusterSnapshotIdentifier=backup_id)
         return snapshots['DBClusterSnapshots'][0]['Status'] == 'available'
 
+    def get_backups_status(self, backup_region: str, backup_ids: List[str]) -> Dict[str, BackupStatus]:
+        docdb_client = AwsHelper.boto3_client('docdb', region_name=backup_region, arn=self.role_arn,
+                                              external_id=self.role_external_id)
+        pending = set(backup_ids)
+        if len(pending) <= self.STATUS_DESCRIBE_THRESHOLD:
+            snapshots = self._describe_snapshots(docdb_client, pending)
+        else:
+            # the docdb api takes no snapshot id filter, so scan the manual snapshots instead
+            snapshots = AwsHelper.paginate(docdb_client, 'describe_db_cluster_snapshots', 'DBClusterSnapshots',
+                                           SnapshotType='manual')
+        return {snap['DBClusterSnapshotIdentifier']: BackupStatus(
+                    available=snap['Status'] == 'available',
+                    progress=snap.get('PercentProgress'),
+                    started=snap.get('SnapshotCreateTime'),
+                    entity_id=snap.get('DBClusterIdentifier'))
+                for snap in snapshots if snap['DBClusterSnapshotIdentifier'] in pending}
+
+    @staticmethod
+    def _describe_snapshots(docdb_client, snapshot_ids) -> List[Dict]:
+        """Each of snapshot_ids described on its own, leaving out those not found - as the listing would"""
+        snapshots = []
+        for snapshot_id in snapshot_ids:
+            try:
+                snapshots.extend(docdb_client.describe_db_cluster_snapshots(
+                    DBClusterSnapshotIdentifier=snapshot_id)['DBClusterSnapshots'])
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'DBClusterSnapshotNotFoundFault':
+                    raise
+        return snapshots
+
     def get_resource_type(self) -> str:
         return 'DocumentDb'
 
@@ -53,20 +103,24 @@ class ShelveryDocumentDbBackup(ShelveryEngine):
         response = docdb_client.copy_db_cluster_snapshot(
             SourceDBClusterSnapshotIdentifier=automated_snapshot_id,
             TargetDBClusterSnapshotIdentifier=backup_resource.name,
-            CopyTags=False
+            CopyTags=False,
+            Tags=AwsHelper.rds_tags(backup_resource.tags)
         )
         backup_resource.resource_properties = response['DBClusterSnapshot']
         backup_resource.backup_id = backup_resource.name
+        backup_resource.tagged_on_create = True
         return backup_resource
 
     def backup_from_cluster(self, backup_resource):
         docdb_client = AwsHelper.boto3_client('docdb', arn=self.role_arn, external_id=self.role_external_id)
         response = docdb_client.create_db_cluster_snapshot(
             DBClusterSnapshotIdentifier=backup_resource.name,
-            DBClusterIdentifier=backup_resource.entity_id
+            DBClusterIdentifier=backup_resource.entity_id,
+            Tags=AwsHelper.rds_tags(backup_resource.tags)
         )
         backup_resource.resource_properties = response['DBClusterSnapshot']
         backup_resource.backup_id = backup_resource.name
+        backup_resource.tagged_on_create = True
         return backup_resource
 
     def delete_backup(self, backup_resource: BackupResource):
@@ -75,16 +129,15 @@ class ShelveryDocumentDbBackup(ShelveryEngine):
             DBClusterSnapshotIdentifier=backup_resource.backup_id
         )
 
-    def tag_backup_resource(self, backup_resource: BackupResource):
+    def tag_backup_resource(self, backup_resource: BackupResource, tags: Dict = None):
         regional_docdb_client = AwsHelper.boto3_client('docdb', region_name=backup_resource.region, arn=self.role_arn,
                                                        external_id=self.role_external_id)
         snapshots = regional_docdb_client.describe_db_cluster_snapshots(
             DBClusterSnapshotIdentifier=backup_resource.backup_id)
         snapshot_arn = snapshots['DBClusterSnapshots'][0]['DBClusterSnapshotArn']
-        tags = list(map(lambda k: {'Key': k, 'Value': backup_resource.tags[k].replace(',', ' ')}, backup_resource.tags))
         regional_docdb_client.add_tags_to_resource(
             ResourceName=snapshot_arn,
-            Tags=tags
+            Tags=AwsHelper.rds_tags(backup_resource.tags if tags is None else tags)
         )
 
     def get_existing_backups(self, backup_tag_prefix: str) -> List[BackupResource]:
@@ -96,44 +149,52 @@ class ShelveryDocumentDbBackup(ShelveryEngine):
         # filter ones backed up with shelvery
         all_backups = self.get_shelvery_backups_only(all_snapshots, backup_tag_prefix, docdb_client)
 
+        # and only then look up the clusters those came from
+        self.populate_backup_entity_resource(all_backups, docdb_client)
+
         return all_backups
 
     def share_backup_with_account(self, backup_region: str, backup_id: str, aws_account_id: str):
+        self.share_backup_with_accounts(backup_region, backup_id, [aws_account_id])
+
+    def share_backup_with_accounts(self, backup_region: str, backup_id: str, aws_account_ids: List[str]):
         docdb_client = AwsHelper.boto3_client('docdb', region_name=backup_region, arn=self.role_arn,
                                               external_id=self.role_external_id)
         docdb_client.modify_db_cluster_snapshot_attribute(
             DBClusterSnapshotIdentifier=backup_id,
             AttributeName='restore',
-            ValuesToAdd=[aws_account_id]
+            ValuesToAdd=list(aws_account_ids)
         )
 
-    def copy_backup_to_region(self, backup_id: str, region: str) -> str:
+    def copy_backup_to_region(self, backup_id: str, region: str, tags: Dict = None) -> str:
         local_region = boto3.session.Session().region_name
         client_local = AwsHelper.boto3_client('docdb', arn=self.role_arn, external_id=self.role_external_id)
-        docdb_client = AwsHelper.boto3_client('docdb', region_name=region)
+        docdb_client = AwsHelper.boto3_client('docdb', region_name=region, arn=self.role_arn,
+                                              external_id=self.role_external_id)
         snapshots = client_local.describe_db_cluster_snapshots(DBClusterSnapshotIdentifier=backup_id)
         snapshot = snapshots['DBClusterSnapshots'][0]
         docdb_client.copy_db_cluster_snapshot(
             SourceDBClusterSnapshotIdentifier=snapshot['DBClusterSnapshotArn'],
             TargetDBClusterSnapshotIdentifier=backup_id,
             SourceRegion=local_region,
-            # tags are created explicitly
-            CopyTags=False
+            # tags are those of the source, with the dr copy metadata added
+            CopyTags=False,
+            Tags=AwsHelper.rds_tags(tags or {})
         )
         return backup_id
     
     def create_encrypted_backup(self, backup_id: str, kms_key: str, region: str) -> str:
         return backup_id
 
-    def copy_shared_backup(self, source_account: str, source_backup: BackupResource):
+    def copy_shared_backup(self, source_account: str, source_backup: BackupResource, tags: Dict = None):
         docdb_client = AwsHelper.boto3_client('docdb', arn=self.role_arn, external_id=self.role_external_id)
-        # copying of tags happens outside this method
         source_arn = f"arn:aws:rds:{source_backup.region}:{source_backup.account_id}:cluster-snapshot:{source_backup.backup_id}"
 
         params = {
             'SourceDBClusterSnapshotIdentifier': source_arn,
             'SourceRegion': source_backup.region,
             'CopyTags': False,
+            'Tags': AwsHelper.rds_tags(tags or {}),
             'TargetDBClusterSnapshotIdentifier': source_backup.backup_id
         }
 
@@ -169,7 +230,7 @@ class ShelveryDocumentDbBackup(ShelveryEngine):
         snapshot = snapshots['DBClusterSnapshots'][0]
         tags = docdb_client.list_tags_for_resource(ResourceName=snapshot['DBClusterSnapshotArn']).get('TagList', [])
         d_tags = dict(map(lambda t: (t['Key'], t['Value']), tags))
-        resource = BackupResource.construct(d_tags['shelvery:tag_name'], backup_id, d_tags)
+        resource = BackupResource.construct(d_tags['shelvery:tag_name'], backup_id, d_tags, self.account_id)
         resource.resource_properties = snapshot
         return resource
 
@@ -210,24 +271,9 @@ class ShelveryDocumentDbBackup(ShelveryEngine):
         :param docdb_client: boto3 DocumentDb service
         :return: all DocumentDb instances within region for given boto3 client
         """
-        # list of resource models
-        db_clusters = []
-        # temporary list of api models, as calls are batched
-        temp_clusters = docdb_client.describe_db_clusters(
-            Filters=[
-                {
-                    'Name': 'engine',
-                    'Values': ['docdb',
-                               ]
-                },
-            ])
-        db_clusters.extend(temp_clusters['DBClusters'])
-        # collect database instances
-        while 'Marker' in temp_clusters:
-            temp_clusters = docdb_client.describe_db_clusters(Marker=temp_clusters['Marker'])
-            db_clusters.extend(temp_clusters['DBClusters'])
-
-        return db_clusters
+        return list(AwsHelper.paginate(docdb_client, 'describe_db_clusters', 'DBClusters',
+                                       page_size=100,
+                                       Filters=[{'Name': 'engine', 'Values': ['docdb']}]))
 
     def get_shelvery_backups_only(self, all_snapshots, backup_tag_prefix, docdb_client):
         """
@@ -238,73 +284,90 @@ class ShelveryDocumentDbBackup(ShelveryEngine):
         """
         all_backups = []
         marker_tag = f"{backup_tag_prefix}:{BackupResource.BACKUP_MARKER_TAG}"
+        all_snapshots = list(all_snapshots)
+        snapshot_tags = self.get_snapshot_tags(all_snapshots, marker_tag, docdb_client)
         for snap in all_snapshots:
-            tags = docdb_client.list_tags_for_resource(ResourceName=snap['DBClusterSnapshotArn']).get('TagList', [])
             self.logger.info(f"Checking DocumentDb Snapshot {snap['DBClusterSnapshotIdentifier']}")
-            d_tags = dict(map(lambda t: (t['Key'], t['Value']), tags))
+            d_tags = snapshot_tags.get(snap['DBClusterSnapshotArn'], {})
             if marker_tag in d_tags:
                 if d_tags[marker_tag] in SHELVERY_DO_BACKUP_TAGS:
                     backup_resource = BackupResource.construct(backup_tag_prefix, snap['DBClusterSnapshotIdentifier'],
-                                                               d_tags)
-                    backup_resource.entity_resource = snap['EntityResource']
-                    backup_resource.entity_id = snap['EntityResource'].resource_id
+                                                               d_tags, self.account_id)
+                    backup_resource.entity_id = snap['DBClusterIdentifier']
 
                     all_backups.append(backup_resource)
 
         return all_backups
 
+    def get_snapshot_tags(self, all_snapshots, marker_tag, docdb_client) -> Dict[str, Dict]:
+        """
+        Tags of the given snapshots, keyed by snapshot arn. DocumentDb does not return tags with
+        its snapshots, so they are read in bulk through the Resource Groups Tagging API, which
+        returns only the snapshots carrying the marker tag. If that api is unavailable, e.g. not
+        allowed by the role's policy, tags are fetched per snapshot on a bounded pool instead
+        """
+        try:
+            tagging_client = AwsHelper.boto3_client('resourcegroupstaggingapi', arn=self.role_arn,
+                                                    external_id=self.role_external_id)
+            tagged = AwsHelper.paginate(tagging_client, 'get_resources', 'ResourceTagMappingList',
+                                        page_size=100,
+                                        TagFilters=[{'Key': marker_tag, 'Values': SHELVERY_DO_BACKUP_TAGS}],
+                                        ResourceTypeFilters=['rds:cluster-snapshot'])
+            return dict(map(lambda r: (r['ResourceARN'], BackupResource.dict_from_boto3_tags(r['Tags'])), tagged))
+        except ClientError as e:
+            self.logger.warning(f"Could not read DocumentDb snapshot tags through the tagging api, "
+                                f"listing tags per snapshot instead: {e}")
+
+        def list_tags(arn):
+            tags = docdb_client.list_tags_for_resource(ResourceName=arn).get('TagList', [])
+            return arn, BackupResource.dict_from_boto3_tags(tags)
+
+        uncached = [snap['DBClusterSnapshotArn'] for snap in all_snapshots
+                    if snap['DBClusterSnapshotArn'] not in self._snapshot_tags_cache]
+        with ThreadPoolExecutor(max_workers=self.TAG_FETCH_CONCURRENCY) as executor:
+            # in the caller's context, for throttles to count towards its run report
+            contexts = [contextvars.copy_context() for _ in uncached]
+            self._snapshot_tags_cache.update(executor.map(lambda context, arn: context.run(list_tags, arn),
+                                                          contexts, uncached))
+
+        return self._snapshot_tags_cache
+
     def collect_all_snapshots(self, docdb_client):
         """
         :param docdb_client:
-        :return: All snapshots within region for docdb_client
+        :return: All snapshots within region for docdb_client, yielded as they are paged in
         """
-        all_snapshots = []
-
         self.logger.info("Collecting DB cluster snapshots...")
-        tmp_snapshots = docdb_client.describe_db_cluster_snapshots(SnapshotType='manual')
-        all_snapshots.extend(tmp_snapshots['DBClusterSnapshots'])
-
-        while 'Marker' in tmp_snapshots:
-            self.logger.info(
-                f"Collected {len(tmp_snapshots['DBClusterSnapshots'])} manual snapshots. Continuing collection...")
-            tmp_snapshots = docdb_client.describe_db_cluster_snapshots(SnapshotType='manual',
-                                                                       Marker=tmp_snapshots['Marker'])
-            all_snapshots.extend(tmp_snapshots['DBClusterSnapshots'])
-
-        self.logger.info(f"Collected {len(all_snapshots)} manual snapshots.")
-        self.populate_snap_entity_resource(all_snapshots)
+        return AwsHelper.paginate(docdb_client, 'describe_db_cluster_snapshots', 'DBClusterSnapshots',
+                                  page_size=100, SnapshotType='manual')
 
-        return all_snapshots
-
-    def populate_snap_entity_resource(self, all_snapshots):
-        cluster_ids = []
-
-        for snap in all_snapshots:
-            if snap['DBClusterIdentifier'] not in cluster_ids:
-                cluster_ids.append(snap['DBClusterIdentifier'])
+    def populate_backup_entity_resource(self, backups, docdb_client):
+        """
+        Attach the source cluster to each backup, out of a single scan of all clusters in
+        the region indexed by identifier. Clusters that no longer exist resolve to an empty entity
+        """
+        if not backups:
+            return
 
-        entities = {}
-        docdb_client = AwsHelper.boto3_client('docdb', arn=self.role_arn, external_id=self.role_external_id)
         local_region = boto3.session.Session().region_name
+        clusters = dict(map(lambda c: (c['DBClusterIdentifier'], c), self.get_all_clusters(docdb_client)))
 
-        for cluster_id in cluster_ids:
-            try:
-                self.logger.info(f"Collecting tags from DB cluster {cluster_id} ...")
-                docdb_instance = docdb_client.describe_db_clusters(DBClusterIdentifier=cluster_id)['DBClusters'][0]
-                tags = docdb_client.list_tags_for_resource(ResourceName=docdb_instance['DBClusterArn']).get('TagList', [])
-                d_tags = dict(map(lambda t: (t['Key'], t['Value']), tags))
-                docdb_entity = EntityResource(cluster_id,
-                                              local_region,
-                                              docdb_instance['ClusterCreateTime'],
-                                              d_tags)
-                entities[cluster_id] = docdb_entity
-            except ClientError as e:
-                if 'DBClusterNotFoundFault' in str(type(e)):
+        entities = {}
+        for backup in backups:
+            cluster_id = backup.entity_id
+            if cluster_id not in entities:
+                if cluster_id in clusters:
+                    docdb_cluster = clusters[cluster_id]
+                    # DocumentDb api does not return tags with the cluster, so these are still
+                    # listed - though once per cluster that has backups, not once per snapshot
+                    self.logger.info(f"Collecting tags from DB cluster {cluster_id} ...")
+                    tags = docdb_client.list_tags_for_resource(ResourceName=docdb_cluster['DBClusterArn']).get('TagList', [])
+                    d_tags = dict(map(lambda t: (t['Key'], t['Value']), tags))
+                    entities[cluster_id] = EntityResource(cluster_id,
+                                                          local_region,
+                                                          docdb_cluster['ClusterCreateTime'],
+                                                          d_tags)
+                else:
                     entities[cluster_id] = EntityResource.empty()
                     entities[cluster_id].resource_id = cluster_id
-                else:
-                    raise e
-
-        for snap in all_snapshots:
-            if snap['DBClusterIdentifier'] in entities:
-                snap['EntityResource'] = entities[snap['DBClusterIdentifier']]
+            backup.entity_resource = entities[cluster_id]
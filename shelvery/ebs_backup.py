@@ -1,9 +1,10 @@
 import boto3
 
-from typing import List
+from typing import Dict, List
 
 from botocore.exceptions import ClientError
 from shelvery.aws_helper import AwsHelper
+from shelvery.availability_poller import BackupStatus
 from shelvery.engine import SHELVERY_DO_BACKUP_TAGS
 from shelvery.ec2_backup import ShelveryEC2Backup
 from shelvery.entity_resource import EntityResource
@@ -13,6 +14,15 @@ from shelvery.backup_resource import BackupResource
 class ShelveryEBSBackup(ShelveryEC2Backup):
     """Shelvery engine implementation for EBS data backups"""
 
+    # volume ids sent with a single describe_volumes request
+    DESCRIBE_VOLUMES_BATCH_SIZE = 200
+
+    # EC2 allows 20 snapshot copies in progress per destination region
+    COPY_CONCURRENCY = 20
+
+    # volume id of snapshots copied from other snapshots, rather than taken of a volume
+    COPIED_SNAPSHOT_VOLUME_ID = 'vol-ffffffff'
+
     def __init__(self):
         ShelveryEC2Backup.__init__(self)
 
@@ -23,22 +33,26 @@ class ShelveryEBSBackup(ShelveryEC2Backup):
     def get_existing_backups(self, tag_prefix: str) -> List[BackupResource]:
         ec2client = AwsHelper.boto3_client('ec2', arn=self.role_arn, external_id=self.role_external_id)
         # lookup snapshots by tags
-        snapshots = ec2client.describe_snapshots(Filters=[
-            {'Name': f"tag:{tag_prefix}:{BackupResource.BACKUP_MARKER_TAG}", 'Values': ['true']}
-        ])
+        snapshots = AwsHelper.paginate(ec2client, 'describe_snapshots', 'Snapshots',
+                                       page_size=1000,
+                                       Filters=[
+                                           {'Name': f"tag:{tag_prefix}:{BackupResource.BACKUP_MARKER_TAG}",
+                                            'Values': ['true']}
+                                       ])
         backups = []
 
         # create backup resource objects
-        for snap in snapshots['Snapshots']:        
+        for snap in snapshots:
             snap_tags = dict(map(lambda t: (t['Key'], t['Value']), snap['Tags']))
-            if f"{tag_prefix}:ami_id" in snap_tags:
+            if f"{tag_prefix}:{self.AMI_ID_TAG}" in snap_tags or f"{tag_prefix}:{self.AMI_NAME_TAG}" in snap_tags:
                 self.logger.info(f"EBS snapshot {snap['SnapshotId']} created by AMI shelvery backup, skiping...")
                 continue
                             
             backup = BackupResource.construct(
                 tag_prefix=tag_prefix,
                 backup_id=snap['SnapshotId'],
-                tags=snap_tags
+                tags=snap_tags,
+                account_id=self.account_id
             )
             # legacy code - entity id should be picked up from tags
             if backup.entity_id is None:
@@ -61,16 +75,18 @@ class ShelveryEBSBackup(ShelveryEC2Backup):
         # create snapshot
         snap = ec2client.create_snapshot(
             VolumeId=backup_resource.entity_id,
-            Description=backup_resource.name
+            Description=backup_resource.name,
+            **self.tag_specifications(backup_resource.tags, 'snapshot')
         )
         backup_resource.backup_id = snap['SnapshotId']
+        backup_resource.tagged_on_create = True
         return backup_resource
 
     def get_backup_resource(self, region: str, backup_id: str) -> BackupResource:
         ec2 = AwsHelper.boto3_session('ec2', region_name=region, arn=self.role_arn, external_id=self.role_external_id)
         snapshot = ec2.Snapshot(backup_id)
         d_tags = dict(map(lambda t: (t['Key'], t['Value']), snapshot.tags))
-        return BackupResource.construct(d_tags['shelvery:tag_name'], backup_id, d_tags)
+        return BackupResource.construct(d_tags['shelvery:tag_name'], backup_id, d_tags, self.account_id)
 
     def get_entities_to_backup(self, tag_name: str) -> List[EntityResource]:
         volumes = self.collect_volumes(tag_name)
@@ -96,33 +112,51 @@ class ShelveryEBSBackup(ShelveryEC2Backup):
         except Exception as e:
             self.logger.warn(f"Problem getting status of ec2 snapshot status for snapshot {backup_id}:{e}")
 
-    def copy_backup_to_region(self, backup_id: str, region: str):
+    def get_backups_status(self, backup_region: str, backup_ids: List[str]) -> Dict[str, BackupStatus]:
+        regional_client = AwsHelper.boto3_client('ec2', region_name=backup_region, arn=self.role_arn, external_id=self.role_external_id)
+        statuses = {}
+        for snapshot in regional_client.describe_snapshots(SnapshotIds=backup_ids)['Snapshots']:
+            self.logger.info(f"{snapshot['SnapshotId']} is {snapshot.get('Progress')} complete")
+            statuses[snapshot['SnapshotId']] = BackupStatus(
+                available=snapshot['State'] == 'completed',
+                progress=float(snapshot['Progress'].rstrip('%')) if snapshot.get('Progress') else None,
+                size=snapshot.get('VolumeSize'),
+                started=snapshot.get('StartTime'),
+                entity_id=snapshot.get('VolumeId') if snapshot.get('VolumeId') != self.COPIED_SNAPSHOT_VOLUME_ID else None)
+        return statuses
+
+    def copy_backup_to_region(self, backup_id: str, region: str, tags: Dict = None):
         ec2client = AwsHelper.boto3_client('ec2', arn=self.role_arn, external_id=self.role_external_id)
         snapshot = ec2client.describe_snapshots(SnapshotIds=[backup_id])['Snapshots'][0]
         regional_client = AwsHelper.boto3_client('ec2', region_name=region, arn=self.role_arn, external_id=self.role_external_id)
         copy_snapshot_response = regional_client.copy_snapshot(SourceSnapshotId=backup_id,
                                                                SourceRegion=ec2client._client_config.region_name,
                                                                DestinationRegion=region,
-                                                               Description=snapshot['Description'])
+                                                               Description=snapshot['Description'],
+                                                               **self.tag_specifications(tags, 'snapshot'))
 
         # return id of newly created snapshot in dr region
         return copy_snapshot_response['SnapshotId']
 
     def share_backup_with_account(self, backup_region: str, backup_id: str, aws_account_id: str):
+        self.share_backup_with_accounts(backup_region, backup_id, [aws_account_id])
+
+    def share_backup_with_accounts(self, backup_region: str, backup_id: str, aws_account_ids: List[str]):
         ec2 = AwsHelper.boto3_session('ec2', region_name=backup_region, arn=self.role_arn, external_id=self.role_external_id)
         snapshot = ec2.Snapshot(backup_id)
         snapshot.modify_attribute(Attribute='createVolumePermission',
                                   CreateVolumePermission={
-                                      'Add': [{'UserId': aws_account_id}]
+                                      'Add': [{'UserId': aws_account_id} for aws_account_id in aws_account_ids]
                                   },
-                                  UserIds=[aws_account_id],
+                                  UserIds=list(aws_account_ids),
                                   OperationType='add')
 
-    def copy_shared_backup(self, source_account: str, source_backup: BackupResource):
+    def copy_shared_backup(self, source_account: str, source_backup: BackupResource, tags: Dict = None):
         ec2client = AwsHelper.boto3_client('ec2', arn=self.role_arn, external_id=self.role_external_id)
         snap = ec2client.copy_snapshot(
             SourceSnapshotId=source_backup.backup_id,
-            SourceRegion=source_backup.region
+            SourceRegion=source_backup.region,
+            **self.tag_specifications(tags, 'snapshot')
         )
         return snap['SnapshotId']
     
@@ -131,49 +165,48 @@ class ShelveryEBSBackup(ShelveryEC2Backup):
     
     # collect all volumes tagged with given tag, in paginated manner
     def collect_volumes(self, tag_name: str):
-        load_volumes = True
-        next_token = ''
-        all_volumes = []
         ec2client = AwsHelper.boto3_client('ec2', arn=self.role_arn, external_id=self.role_external_id)
-        while load_volumes:
-            tagged_volumes = ec2client.describe_volumes(
-                Filters=[{'Name': f"tag:{tag_name}", 'Values': SHELVERY_DO_BACKUP_TAGS}],
-                NextToken=next_token
-            )
-            all_volumes = all_volumes + tagged_volumes['Volumes']
-            if 'NextToken' in tagged_volumes and len(tagged_volumes['NextToken']) > 0:
-                load_volumes = True
-                next_token = tagged_volumes['NextToken']
-            else:
-                load_volumes = False
-
-        return all_volumes
+        return AwsHelper.paginate(ec2client, 'describe_volumes', 'Volumes',
+                                  page_size=500,
+                                  Filters=[{'Name': f"tag:{tag_name}", 'Values': SHELVERY_DO_BACKUP_TAGS}])
 
     def populate_volume_information(self, backups):
-        volume_ids = []
         volumes = {}
         ec2client = AwsHelper.boto3_client('ec2', arn=self.role_arn, external_id=self.role_external_id)
         local_region = boto3.session.Session().region_name
 
-        # create list of all volume ids
-        for backup in backups:
-            if backup.entity_id not in volume_ids:
-                volume_ids.append(backup.entity_id)
-
-        # populate map volumeid->volume if present
-        for volume_id in volume_ids:
-            try:
-                volume = ec2client.describe_volumes(VolumeIds=[volume_id])['Volumes'][0]
-                d_tags = dict(map(lambda t: (t['Key'], t['Value']), volume['Tags']))
-                volumes[volume_id] = EntityResource(volume_id, local_region, volume['CreateTime'], d_tags)
-            except ClientError as e:
-                if 'InvalidVolume.NotFound' in str(e):
-                    volumes[volume_id] = EntityResource.empty()
-                    volumes[volume_id].resource_id = volume_id
-                else:
-                    raise e
+        # set of all volume ids - a clean run sees each volume once for every one of its snapshots
+        volume_ids = sorted({backup.entity_id for backup in backups})
+
+        # populate map volumeid->volume, many volumes per describe call
+        for i in range(0, len(volume_ids), self.DESCRIBE_VOLUMES_BATCH_SIZE):
+            self._describe_volumes(ec2client, volume_ids[i:i + self.DESCRIBE_VOLUMES_BATCH_SIZE], local_region, volumes)
 
         # add info to backup resource objects
         for backup in backups:
             if backup.entity_id in volumes:
                 backup.entity_resource = volumes[backup.entity_id]
+
+    def _describe_volumes(self, ec2client, volume_ids, local_region, volumes):
+        """
+        Add an entity for each of volume_ids to volumes. A single deleted volume fails the whole
+        request with InvalidVolume.NotFound, so a failed batch is split in halves until the deleted
+        volumes are isolated, and those resolve to an empty entity
+        """
+        try:
+            response = ec2client.describe_volumes(VolumeIds=volume_ids)
+        except ClientError as e:
+            if 'InvalidVolume.NotFound' not in str(e):
+                raise e
+            if len(volume_ids) == 1:
+                volumes[volume_ids[0]] = EntityResource.empty()
+                volumes[volume_ids[0]].resource_id = volume_ids[0]
+                return
+            middle = len(volume_ids) // 2
+            self._describe_volumes(ec2client, volume_ids[:middle], local_region, volumes)
+            self._describe_volumes(ec2client, volume_ids[middle:], local_region, volumes)
+            return
+
+        for volume in response['Volumes']:
+            d_tags = dict(map(lambda t: (t['Key'], t['Value']), volume.get('Tags', [])))
+            volumes[volume['VolumeId']] = EntityResource(volume['VolumeId'], local_region, volume['CreateTime'], d_tags)
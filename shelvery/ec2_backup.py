@@ -10,18 +10,33 @@ from typing import Dict, List
 class ShelveryEC2Backup(ShelveryEngine):
     """Parent class sharing common functionality for AMI and EBS backups"""
 
+    TAG_ON_COPY = True
+
+    # tags of the snapshots of an AMI backup, with the image id and name, for EBS backups to leave them alone
+    AMI_ID_TAG = 'ami_id'
+    AMI_NAME_TAG = 'ami_name'
+
     def __init__(self):
         ShelveryEngine.__init__(self)
         # default region will be picked up in AwsHelper.boto3_client call
         self.region = boto3.session.Session().region_name
 
-    def tag_backup_resource(self, backup_resource: BackupResource):
+    def tag_backup_resource(self, backup_resource: BackupResource, tags: Dict = None):
+        tags = backup_resource.tags if tags is None else tags
         regional_client = AwsHelper.boto3_client('ec2', region_name=backup_resource.region, arn=self.role_arn, external_id=self.role_external_id)
         regional_client.create_tags(
             Resources=[backup_resource.backup_id],
-            Tags=list(map(lambda k: {'Key': k, 'Value': backup_resource.tags[k]}, backup_resource.tags))
+            Tags=list(map(lambda k: {'Key': k, 'Value': tags[k]}, tags))
         )
 
+    @staticmethod
+    def tag_specifications(tags: Dict, resource_type: str) -> Dict:
+        """Arguments of a create or copy call that tag the new resource_type with tags, if any"""
+        if not tags:
+            return {}
+        return {'TagSpecifications': [{'ResourceType': resource_type,
+                                       'Tags': list(map(lambda k: {'Key': k, 'Value': tags[k]}, tags))}]}
+
     def delete_backup(self, backup_resource: BackupResource):
         pass
 
@@ -40,7 +55,7 @@ class ShelveryEC2Backup(ShelveryEngine):
     def is_backup_available(self, backup_region: str, backup_id: str) -> bool:
         pass
 
-    def copy_backup_to_region(self, backup_id: str, region: str) -> str:
+    def copy_backup_to_region(self, backup_id: str, region: str, tags: Dict = None) -> str:
         pass
 
     def get_backup_resource(self, region: str, backup_id: str) -> BackupResource:
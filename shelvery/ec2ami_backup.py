@@ -1,10 +1,14 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from functools import reduce
-from typing import List
+from typing import Dict, List
 from time import sleep 
 
 import boto3
+from botocore.exceptions import ClientError
 
 from shelvery.aws_helper import AwsHelper
+from shelvery.availability_poller import BackupStatus
 from shelvery.backup_resource import BackupResource
 from shelvery.entity_resource import EntityResource
 from shelvery.ec2_backup import ShelveryEC2Backup
@@ -13,26 +17,61 @@ from shelvery.engine import SHELVERY_DO_BACKUP_TAGS
 
 
 class ShelveryEC2AMIBackup(ShelveryEC2Backup):
+
+    # image and snapshot ids sent with a single describe request
+    DESCRIBE_BATCH_SIZE = 200
+
+    # calls made at once against the snapshots of a single image, when sharing or deleting it
+    SNAPSHOT_CALL_CONCURRENCY = 8
+
     def delete_backup(self, backup_resource: BackupResource):
         regional_client = AwsHelper.boto3_client('ec2', region_name=backup_resource.region, arn=self.role_arn, external_id=self.role_external_id)
-        ami = regional_client.describe_images(ImageIds=[backup_resource.backup_id])['Images'][0]
+        # backups listed for cleanup already know their snapshots
+        properties = getattr(backup_resource, 'resource_properties', None) or {}
+        if properties.get('ImageId') == backup_resource.backup_id:
+            snapshots = properties['SnapshotIds']
+        else:
+            ami = regional_client.describe_images(ImageIds=[backup_resource.backup_id])['Images'][0]
+            snapshots = self._image_snapshot_ids(ami)
 
         # delete image
         regional_client.deregister_image(ImageId=backup_resource.backup_id)
-        snapshots = []
-        for bdm in ami['BlockDeviceMappings']:
-            if 'Ebs' in bdm and 'SnapshotId' in bdm['Ebs']:
-                snapshots.append(bdm['Ebs']['SnapshotId'])
 
         # delete related snapshots
-        for snapshot in snapshots:
-            regional_client.delete_snapshot(SnapshotId=snapshot)
+        self._for_each_snapshot(lambda snapshot: regional_client.delete_snapshot(SnapshotId=snapshot), snapshots)
+
+    def _for_each_snapshot(self, call, snapshots: List[str]):
+        """Make call for each of the snapshots of an image, SNAPSHOT_CALL_CONCURRENCY at a time"""
+        if len(snapshots) <= 1:
+            for snapshot in snapshots:
+                call(snapshot)
+            return
+        with ThreadPoolExecutor(max_workers=min(len(snapshots), self.SNAPSHOT_CALL_CONCURRENCY)) as executor:
+            # in the caller's context, for throttles to count towards its run report
+            futures = [executor.submit(contextvars.copy_context().run, call, snapshot) for snapshot in snapshots]
+            # so the first failed call is raised here
+            for future in futures:
+                future.result()
+
+    @staticmethod
+    def _image_snapshot_ids(image) -> List[str]:
+        return [bdm['Ebs']['SnapshotId'] for bdm in image.get('BlockDeviceMappings', [])
+                if 'SnapshotId' in bdm.get('Ebs', {})]
+
+    def _describe_images(self, regional_client, image_ids: List[str]) -> List[Dict]:
+        images = []
+        for i in range(0, len(image_ids), self.DESCRIBE_BATCH_SIZE):
+            images.extend(regional_client.describe_images(ImageIds=image_ids[i:i + self.DESCRIBE_BATCH_SIZE])['Images'])
+        return images
 
     def get_existing_backups(self, backup_tag_prefix: str) -> List[BackupResource]:
         ec2client = AwsHelper.boto3_client('ec2', arn=self.role_arn, external_id=self.role_external_id)
-        amis = ec2client.describe_images(Filters=[
-            {'Name': f"tag:{backup_tag_prefix}:{BackupResource.BACKUP_MARKER_TAG}", 'Values': ['true']}
-        ])['Images']
+        amis = AwsHelper.paginate(ec2client, 'describe_images', 'Images',
+                                  page_size=1000,
+                                  Filters=[
+                                      {'Name': f"tag:{backup_tag_prefix}:{BackupResource.BACKUP_MARKER_TAG}",
+                                       'Values': ['true']}
+                                  ])
         backups = []
         instances = dict(map(
             lambda x: (x.resource_id, x),
@@ -41,10 +80,13 @@ class ShelveryEC2AMIBackup(ShelveryEC2Backup):
         for ami in amis:
             backup = BackupResource.construct(backup_tag_prefix,
                                               ami['ImageId'],
-                                              dict(map(lambda x: (x['Key'], x['Value']), ami['Tags'])))
+                                              dict(map(lambda x: (x['Key'], x['Value']), ami['Tags'])),
+                                              self.account_id)
 
             if backup.entity_id in instances:
                 backup.entity_resource = instances[backup.entity_id]
+            # so deleting the backup does not have to describe the image again
+            backup.resource_properties = {'ImageId': ami['ImageId'], 'SnapshotIds': self._image_snapshot_ids(ami)}
 
             backups.append(backup)
 
@@ -56,16 +98,29 @@ class ShelveryEC2AMIBackup(ShelveryEC2Backup):
     def get_engine_type(self) -> str:
         return 'ec2ami'
 
-    def copy_shared_backup(self, source_account: str, source_backup: BackupResource):
+    def copy_shared_backup(self, source_account: str, source_backup: BackupResource, tags: Dict = None):
         ec2client = AwsHelper.boto3_client('ec2', arn=self.role_arn, external_id=self.role_external_id)
         ami = ec2client.copy_image(
             ClientToken=f"{AwsHelper.local_account_id()}{source_account}{source_backup.backup_id}",
             SourceImageId=source_backup.backup_id,
             SourceRegion=source_backup.region,
-            Name=source_backup.backup_id
+            Name=source_backup.backup_id,
+            **self.image_tag_specifications(tags, source_backup.backup_id)
         )
         return ami['ImageId']
 
+    def image_tag_specifications(self, tags: Dict, image_name: str) -> Dict:
+        """Arguments of a create or copy call that tag the new image and its snapshots. The snapshots are
+        also marked as part of an AMI backup, for EBS backups to leave alone - by the image name, under a
+        tag of its own, as the ami_id tag holds the image id and that is not known yet
+        """
+        if not tags:
+            return {}
+        snapshot_tags = dict(tags)
+        snapshot_tags[f"{tags['shelvery:tag_name']}:{self.AMI_NAME_TAG}"] = image_name
+        return {'TagSpecifications': self.tag_specifications(tags, 'image')['TagSpecifications'] +
+                                     self.tag_specifications(snapshot_tags, 'snapshot')['TagSpecifications']}
+
     def backup_resource(self, backup_resource: BackupResource):
         regional_client = AwsHelper.boto3_client('ec2', region_name=backup_resource.region, arn=self.role_arn, external_id=self.role_external_id)
         ami = regional_client.create_image(
@@ -73,20 +128,35 @@ class ShelveryEC2AMIBackup(ShelveryEC2Backup):
             Name=backup_resource.name,
             Description=f"Shelvery created backup for {backup_resource.entity_id}",
             InstanceId=backup_resource.entity_id,
-
+            **self.image_tag_specifications(backup_resource.tags, backup_resource.name)
         )
         backup_resource.backup_id = ami['ImageId']
+        backup_resource.tagged_on_create = True
         return backup_resource
 
-    def tag_backup_resource(self, backup_resource: BackupResource):
+    def tag_backup_resource(self, backup_resource: BackupResource, tags: Dict = None):
+        # backups and their copies are tagged as they are created, this updates the tags of a backup
         regional_client = AwsHelper.boto3_client('ec2', region_name=backup_resource.region, arn=self.role_arn, external_id=self.role_external_id)
+        if tags is not None:
+            # the same changes go to the image and all of its snapshots, in a single call
+            properties = getattr(backup_resource, 'resource_properties', None) or {}
+            if properties.get('ImageId') == backup_resource.backup_id:
+                snapshots = properties['SnapshotIds']
+            else:
+                snapshots = self._get_snapshots_from_ami(backup_resource)
+            regional_client.create_tags(
+                Resources=[backup_resource.backup_id] + snapshots,
+                Tags=list(map(lambda k: {'Key': k, 'Value': tags[k]}, tags))
+            )
+            return
+
         regional_client.create_tags(
             Resources=[backup_resource.backup_id],
             Tags=list(map(lambda k: {'Key': k, 'Value': backup_resource.tags[k]}, backup_resource.tags))
         )
         snapshots = self._get_snapshots_from_ami(backup_resource)        
         # tag all snapshots associated with the ami
-        backup_resource.tags[f"{backup_resource.tags['shelvery:tag_name']}:ami_id"] = backup_resource.backup_id
+        backup_resource.tags[f"{backup_resource.tags['shelvery:tag_name']}:{self.AMI_ID_TAG}"] = backup_resource.backup_id
         self.logger.info(f"Tagging {len(snapshots)} AMI snapshots: {snapshots}")
         regional_client.create_tags(
             Resources=snapshots,
@@ -123,46 +193,31 @@ class ShelveryEC2AMIBackup(ShelveryEC2Backup):
 
     def _get_all_entities(self) -> List[EntityResource]:
         ec2client = AwsHelper.boto3_client('ec2', arn=self.role_arn, external_id=self.role_external_id)
-        instances = ec2client.describe_instances()
-        while 'NextToken' in instances:
-            instances += ec2client.describe_instances(
-                NextToken=instances['NextToken']
-            )
-        return self._convert_instances_to_entities(instances)
+        reservations = AwsHelper.paginate(ec2client, 'describe_instances', 'Reservations', page_size=1000)
+        return self._convert_instances_to_entities(reservations)
 
     def get_entities_to_backup(self, tag_name: str) -> List[EntityResource]:
         ec2client = AwsHelper.boto3_client('ec2', arn=self.role_arn, external_id=self.role_external_id)
-        instances = ec2client.describe_instances(
-            Filters=[
-                {
-                    'Name': f"tag:{tag_name}",
-                    'Values': SHELVERY_DO_BACKUP_TAGS
-                }
-            ]
-        )
-        while 'NextToken' in instances:
-            instances += ec2client.describe_instances(
-                Filters=[
-                    {
-                        'Name': f"tag:{tag_name}",
-                        'Values': SHELVERY_DO_BACKUP_TAGS
-                    }
-                ],
-                NextToken=instances['NextToken']
-            )
-
-        return self._convert_instances_to_entities(instances)
+        reservations = AwsHelper.paginate(ec2client, 'describe_instances', 'Reservations',
+                                          page_size=1000,
+                                          Filters=[
+                                              {
+                                                  'Name': f"tag:{tag_name}",
+                                                  'Values': SHELVERY_DO_BACKUP_TAGS
+                                              }
+                                          ])
+        return self._convert_instances_to_entities(reservations)
 
     @staticmethod
-    def _convert_instances_to_entities(instances):
+    def _convert_instances_to_entities(reservations):
         """
         Params:
-            instances: a list of Reservations (i.e. the response from `aws ec2 describe-instances`)
+            reservations: iterable of Reservations (i.e. as returned by `aws ec2 describe-instances`)
         """
         local_region = boto3.session.Session().region_name
 
         entities = []
-        for reservation in instances['Reservations']:
+        for reservation in reservations:
             for instance in reservation['Instances']:
                 tags = {}
                 if 'Tags' in instance:
@@ -179,7 +234,45 @@ class ShelveryEC2AMIBackup(ShelveryEC2Backup):
 
         return False
 
-    def copy_backup_to_region(self, backup_id: str, region: str) -> str:
+    def get_backups_status(self, backup_region: str, backup_ids: List[str]) -> Dict[str, BackupStatus]:
+        regional_client = AwsHelper.boto3_client('ec2', region_name=backup_region, arn=self.role_arn, external_id=self.role_external_id)
+        images = self._describe_images(regional_client, backup_ids)
+
+        # an image is as far along as its snapshots, described for all pending images at once
+        pending_snapshots = [snapshot for ami in images if ami['State'] != 'available'
+                             for snapshot in self._image_snapshot_ids(ami)]
+        progress = self._snapshots_progress(regional_client, pending_snapshots)
+
+        statuses = {}
+        for ami in images:
+            tags = dict(map(lambda x: (x['Key'], x['Value']), ami.get('Tags', [])))
+            volumes = [bdm['Ebs'] for bdm in ami.get('BlockDeviceMappings', []) if 'Ebs' in bdm]
+            sizes = [volume.get('VolumeSize') or 0 for volume in volumes]
+            snapshots = [progress.get(volume.get('SnapshotId')) for volume in volumes]
+            image_progress = None
+            if volumes and None not in snapshots and sum(sizes) > 0:
+                image_progress = sum(p * size for p, size in zip(snapshots, sizes)) / sum(sizes)
+            statuses[ami['ImageId']] = BackupStatus(
+                available=ami['State'] == 'available',
+                progress=image_progress,
+                size=sum(sizes) or None,
+                entity_id=tags.get(f"{tags.get('shelvery:tag_name')}:entity_id"))
+        return statuses
+
+    def _snapshots_progress(self, regional_client, snapshot_ids: List[str]) -> Dict[str, float]:
+        progress = {}
+        try:
+            for i in range(0, len(snapshot_ids), self.DESCRIBE_BATCH_SIZE):
+                response = regional_client.describe_snapshots(SnapshotIds=snapshot_ids[i:i + self.DESCRIBE_BATCH_SIZE])
+                for snapshot in response['Snapshots']:
+                    if snapshot.get('Progress'):
+                        progress[snapshot['SnapshotId']] = float(snapshot['Progress'].rstrip('%'))
+        except ClientError as e:
+            # progress only decides when images are checked again, they are polled without it
+            self.logger.warning(f"Could not read progress of {len(snapshot_ids)} AMI snapshots: {e}")
+        return progress
+
+    def copy_backup_to_region(self, backup_id: str, region: str, tags: Dict = None) -> str:
         local_region = boto3.session.Session().region_name
         local_client = AwsHelper.boto3_client('ec2', region_name=local_region, arn=self.role_arn, external_id=self.role_external_id)
         regional_client = AwsHelper.boto3_client('ec2', region_name=region, arn=self.role_arn, external_id=self.role_external_id)
@@ -189,7 +282,8 @@ class ShelveryEC2AMIBackup(ShelveryEC2Backup):
                                           ClientToken=idempotency_token,
                                           Description=f"Shelvery copy of {backup_id} to {region} from {local_region}",
                                           SourceImageId=backup_id,
-                                          SourceRegion=local_region
+                                          SourceRegion=local_region,
+                                          **self.image_tag_specifications(tags, ami['Name'])
                                           )['ImageId']
 
     def get_backup_resource(self, region: str, backup_id: str) -> BackupResource:
@@ -199,28 +293,35 @@ class ShelveryEC2AMIBackup(ShelveryEC2Backup):
         d_tags = dict(map(lambda x: (x['Key'], x['Value']), ami['Tags']))
         backup_tag_prefix = d_tags['shelvery:tag_name']
 
-        backup = BackupResource.construct(backup_tag_prefix, backup_id, d_tags)
+        backup = BackupResource.construct(backup_tag_prefix, backup_id, d_tags, self.account_id)
+        # for tag updates to reach the snapshots without describing the image again
+        backup.resource_properties = {'ImageId': backup_id, 'SnapshotIds': self._image_snapshot_ids(ami)}
         return backup
 
     def share_backup_with_account(self, backup_region: str, backup_id: str, aws_account_id: str):
-        ec2 = AwsHelper.boto3_session('ec2', region_name=backup_region, arn=self.role_arn, external_id=self.role_external_id)
-        image = ec2.Image(backup_id)
-        image.modify_attribute(Attribute='launchPermission',
-                               LaunchPermission={
-                                   'Add': [{'UserId': aws_account_id}]
-                               },
-                               UserIds=[aws_account_id],
-                               OperationType='add')
-        for bdm in image.block_device_mappings:
-            if 'Ebs' in bdm:
-                snap_id = bdm['Ebs']['SnapshotId']
-                snapshot = ec2.Snapshot(snap_id)
-                snapshot.modify_attribute(Attribute='createVolumePermission',
-                                          CreateVolumePermission={
-                                              'Add': [{'UserId': aws_account_id}]
-                                          },
-                                          UserIds=[aws_account_id],
-                                          OperationType='add')
+        self.share_backup_with_accounts(backup_region, backup_id, [aws_account_id])
+
+    def share_backup_with_accounts(self, backup_region: str, backup_id: str, aws_account_ids: List[str]):
+        regional_client = AwsHelper.boto3_client('ec2', region_name=backup_region, arn=self.role_arn, external_id=self.role_external_id)
+        permissions = [{'UserId': aws_account_id} for aws_account_id in aws_account_ids]
+        ami = regional_client.describe_images(ImageIds=[backup_id])['Images'][0]
+        regional_client.modify_image_attribute(ImageId=backup_id,
+                                               Attribute='launchPermission',
+                                               LaunchPermission={
+                                                   'Add': permissions
+                                               },
+                                               UserIds=list(aws_account_ids),
+                                               OperationType='add')
+        self._for_each_snapshot(
+            lambda snapshot: regional_client.modify_snapshot_attribute(SnapshotId=snapshot,
+                                                                       Attribute='createVolumePermission',
+                                                                       CreateVolumePermission={
+                                                                           'Add': permissions
+                                                                       },
+                                                                       UserIds=list(aws_account_ids),
+                                                                       OperationType='add'),
+            self._image_snapshot_ids(ami)
+        )
                 
     def create_encrypted_backup(self, backup_id: str, kms_key: str, region: str) -> str:
         return backup_id
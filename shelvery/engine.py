@@ -1,6 +1,12 @@
 import abc
+import contextvars
+import functools
 import logging
+import threading
 import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import nullcontext
 import sys
 from unittest import skip
 
@@ -16,15 +22,19 @@ from abc import abstractclassmethod
 
 from shelvery.notifications import ShelveryNotification
 from shelvery.aws_helper import AwsHelper
+from shelvery.availability_poller import AvailabilityPoller, BackupStatus
+from shelvery.backup_pipeline import BackupPipeline
+from shelvery.copy_scheduler import CopyScheduler
 from shelvery.shelvery_invoker import ShelveryInvoker
 from shelvery.runtime_config import RuntimeConfig
 from shelvery.backup_resource import BackupResource
 from shelvery.entity_resource import EntityResource
-from shelvery.backup_report import RunReport, SNS_SUBJECT, describe_error, reported_action
+from shelvery.backup_report import RunReport, SNS_SUBJECT, current_run_report, describe_error, reported_action
 
 from shelvery import __version__
 from shelvery import LAMBDA_WAIT_ITERATION
 from shelvery import S3_DATA_PREFIX
+from shelvery import POLL_ESTIMATES_PREFIX
 from shelvery import SHELVERY_DO_BACKUP_TAGS
 
 
@@ -47,6 +57,36 @@ class ShelveryEngine:
 
     BACKUP_RESOURCE_TAG = 'create_backup'
 
+    # caps on concurrent calls per AWS service during a concurrent clean, see
+    # shelvery_clean_concurrency. Deletes go to the engine's own service, archives to S3.
+    # The snapshot deletes of RDS, DocumentDb and Redshift are throttled far harder than
+    # those of EC2, so their engines set a lower cap.
+    CLEAN_DELETE_CONCURRENCY = 10
+    CLEAN_ARCHIVE_CONCURRENCY = 20
+
+    # DR copies in progress at once per destination region, see CopyScheduler. Engines whose
+    # service documents its own limit use that instead
+    COPY_CONCURRENCY = 5
+    # a copy refused for the copies already in progress - started outside shelvery, as they
+    # don't count against the scheduler - is retried after a delay growing with every attempt
+    COPY_LIMIT_ERROR_CODES = {'ResourceLimitExceeded', 'SnapshotQuotaExceeded', 'SnapshotQuotaExceededFault'}
+    COPY_LIMIT_RETRIES = 3
+    COPY_LIMIT_RETRY_DELAY = 60
+
+    # engines whose copy_backup_to_region and copy_shared_backup create the copy with the tags given,
+    # rather than leaving them to a tag_backup_resource call after the copy
+    TAG_ON_COPY = False
+
+    # names of the data buckets verified - and created if missing - so far, see _get_data_bucket
+    _data_buckets = set()
+    _data_buckets_lock = threading.Lock()
+    # bucket name -> s3.Bucket of each thread, boto3 resources are not thread safe
+    _data_bucket_handles = threading.local()
+
+    # when set, finished run reports are handed over here instead of being published, see
+    # collect_run_reports
+    _run_report_collector = None
+
     def __init__(self):
         # system logger
         FORMAT = "%(asctime)s %(process)s %(thread)s: %(message)s"
@@ -65,6 +105,11 @@ class ShelveryEngine:
         self.snspublisher = ShelveryNotification(RuntimeConfig.get_sns_topic(self))
         self.snspublisher_error = ShelveryNotification(RuntimeConfig.get_error_sns_topic(self))
         self.run_report = None
+        self._run_report_token = None
+        # set while create_backups runs its steps in-process, see BackupPipeline
+        self.pipeline = None
+        # copy slot the pipeline reserved before it ran this engine's copy, see _scheduled_copy
+        self.copy_slot = None
 
     def set_lambda_environment(self, payload, context):
         self.lambda_payload   = payload
@@ -83,13 +128,24 @@ class ShelveryEngine:
         self.run_report = RunReport(
             action=action,
             backup_type=self.get_engine_type(),
-            account_id=self.account_id,
+            account_id=self._report_account_id(),
             region=self.region,
             # in lambda the request id doubles as the run id, so a report links straight
             # back to its CloudWatch log stream
             run_id=self.aws_request_id if RuntimeConfig.is_lambda_runtime(self) else None,
             version=__version__
         )
+        self._run_report_token = current_run_report.set(self.run_report)
+
+    def _report_account_id(self):
+        """The account the action works on - the one behind role_arn when there is one"""
+        if self.role_arn is None:
+            return self.account_id
+        try:
+            return AwsHelper.caller_identity(self.role_arn, self.role_external_id)['Account']
+        except Exception:
+            # the action is about to fail on the same role; the report still has to say which
+            return self.role_arn
 
     def report(self, operation, status, entity_id=None, entity_name=None, retention_type=None,
                backup_id=None, backup_name=None, error=None):
@@ -142,9 +198,20 @@ class ShelveryEngine:
         """
         self.run_report = None
 
+    @classmethod
+    def collect_run_reports(cls, collector):
+        """Hand every run report finished in this process to the collector list, instead of
+        publishing it. A worker process collects its reports for the parent to merge and
+        publish as one, see shelvery_worker_processes. None publishes again.
+        """
+        cls._run_report_collector = collector
+
     def publish_run_report(self):
         """Send the run report to the status topic, if one is configured. Never raises."""
         report, self.run_report = self.run_report, None
+        if self._run_report_token is not None:
+            current_run_report.reset(self._run_report_token)
+            self._run_report_token = None
         if report is None:
             return
 
@@ -152,6 +219,10 @@ class ShelveryEngine:
             self.logger.info(f"{report.action} {report.backup_type}: {report.status} "
                              f"({report.count('OK')} ok, {report.count('ERROR')} failed, "
                              f"{report.count('IGNORE')} skipped of {report.collected} collected)")
+            collector = ShelveryEngine._run_report_collector
+            if collector is not None:
+                collector.append(report)
+                return
             # built here rather than in __init__ so the topic can also come from the lambda
             # payload config block, which isn't available when the engine is constructed
             topic = RuntimeConfig.get_status_sns_topic(self)
@@ -192,40 +263,45 @@ class ShelveryEngine:
         return current_policy != shelvery_bucket_policy
 
     def _get_data_bucket(self, region=None):
+        """Data bucket handle for the region, verified - and created if missing - once per process.
+
+        The verification is shared by every engine in the process, and survives between
+        invocations of a warm lambda container, so storing or archiving backup metadata costs
+        nothing but the object calls themselves. The handle itself is one of the calling thread.
+        """
         bucket_name = self.get_local_bucket_name(region)
+        with ShelveryEngine._data_buckets_lock:
+            if bucket_name not in ShelveryEngine._data_buckets:
+                self._ensure_data_bucket(bucket_name, region)
+                ShelveryEngine._data_buckets.add(bucket_name)
+        handles = ShelveryEngine._data_bucket_handles.__dict__
+        if bucket_name not in handles:
+            handles[bucket_name] = boto3.session.Session().resource('s3').Bucket(bucket_name)
+        return handles[bucket_name]
+
+    def _ensure_data_bucket(self, bucket_name, region=None):
         if region is None:
             loc_constraint = boto3.session.Session().region_name
         else:
             loc_constraint = region
 
-        s3 = boto3.resource('s3')
         try:
             AwsHelper.boto3_client('s3').head_bucket(Bucket=bucket_name)
-            bucket = s3.Bucket(bucket_name)
-            AwsHelper.boto3_client('s3').put_public_access_block(
-                Bucket=bucket_name,
-                PublicAccessBlockConfiguration={
-                    'BlockPublicAcls': True,
-                    'IgnorePublicAcls': True,
-                    'BlockPublicPolicy': True,
-                    'RestrictPublicBuckets': True
-                },
-            )
-
         except ClientError as e:
             if e.response['Error']['Code'] == '404':
                 client_region = loc_constraint
                 s3client = AwsHelper.boto3_client('s3', region_name=client_region)
                 if loc_constraint == "us-east-1":
-                    bucket = s3client.create_bucket(Bucket=bucket_name)
+                    s3client.create_bucket(Bucket=bucket_name)
                 else:
                     if loc_constraint == "eu-west-1":
                         loc_constraint = "EU"
 
-                    bucket = s3client.create_bucket(Bucket=bucket_name, CreateBucketConfiguration={
+                    s3client.create_bucket(Bucket=bucket_name, CreateBucketConfiguration={
                         'LocationConstraint': loc_constraint
                     })
 
+                self._block_public_access(bucket_name, client_region)
                 # store the bucket policy, so the bucket can be accessed from other accounts
                 # that backups are shared with
                 s3client.put_bucket_policy(Bucket=bucket_name,
@@ -234,10 +310,19 @@ class ShelveryEngine:
                                                RuntimeConfig.get_share_with_accounts(self),
                                                bucket_name)
                                            )
-                return s3.Bucket(bucket_name)
             else:
                 raise e
-        return bucket
+
+    def _block_public_access(self, bucket_name, region=None):
+        AwsHelper.boto3_client('s3', region_name=region).put_public_access_block(
+            Bucket=bucket_name,
+            PublicAccessBlockConfiguration={
+                'BlockPublicAcls': True,
+                'IgnorePublicAcls': True,
+                'BlockPublicPolicy': True,
+                'RestrictPublicBuckets': True
+            },
+        )
 
     def _archive_backup_metadata(self, backup, bucket, shared_accounts=[]):
         s3key = f"{S3_DATA_PREFIX}/{self.get_engine_type()}/{backup.name}.yaml"
@@ -259,15 +344,44 @@ class ShelveryEngine:
                          f" s3://{bucket.name}/{s3archive_key}")
 
     def _write_backup_data(self, backup, bucket, shared_account_id=None):
-        s3key = f"{S3_DATA_PREFIX}/{self.get_engine_type()}/{backup.name}.yaml"
-        if shared_account_id is not None:
-            s3key = f"{S3_DATA_PREFIX}/shared/{shared_account_id}/{self.get_engine_type()}/{backup.name}.yaml"
-        bucket.put_object(
-            Body=yaml.dump(backup, default_flow_style=False),
-            Key=s3key
+        self._write_shared_backup_data(backup, bucket, [shared_account_id])
+
+    def _write_shared_backup_data(self, backup, bucket, shared_account_ids):
+        """Write the backup metadata for each of shared_account_ids - None for the account's own -
+        serialised only once"""
+        body = yaml.dump(backup, default_flow_style=False)
+        for shared_account_id in shared_account_ids:
+            s3key = f"{S3_DATA_PREFIX}/{self.get_engine_type()}/{backup.name}.yaml"
+            if shared_account_id is not None:
+                s3key = f"{S3_DATA_PREFIX}/shared/{shared_account_id}/{self.get_engine_type()}/{backup.name}.yaml"
+            bucket.put_object(
+                Body=body,
+                Key=s3key
+            )
+            self.logger.info(f"Wrote meta for backup {backup.name} of type {self.get_engine_type()} to" +
+                             f" s3://{bucket.name}/{s3key}")
+
+    def _poll_estimates_key(self, region):
+        return f"{POLL_ESTIMATES_PREFIX}/{self.get_engine_type()}/{region}.yaml"
+
+    def load_poll_estimates(self, region: str) -> Dict[str, float]:
+        """Completion estimates per entity of backups in region, as saved by the runs that waited on them"""
+        try:
+            body = self._get_data_bucket().Object(self._poll_estimates_key(region)).get()['Body'].read()
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+                return {}
+            raise e
+        return yaml.safe_load(body) or {}
+
+    def save_poll_estimates(self, region: str, estimates: Dict[str, float]):
+        """Merge estimates into those saved for region, keeping the entities other runs saved since"""
+        stored = self.load_poll_estimates(region)
+        stored.update(estimates)
+        self._get_data_bucket().put_object(
+            Key=self._poll_estimates_key(region),
+            Body=yaml.safe_dump(stored, default_flow_style=False)
         )
-        self.logger.info(f"Wrote meta for backup {backup.name} of type {self.get_engine_type()} to" +
-                         f" s3://{bucket.name}/{s3key}")
 
     def _verify_retention(self,backup_resource: BackupResource) -> bool:
         if backup_resource.retention_type == backup_resource.RETENTION_DAILY:
@@ -308,103 +422,188 @@ class ShelveryEngine:
             self.run_report.collected = len(resources)
 
         # create and collect backups
-        backup_resources = []
         current_retention_type = RuntimeConfig.get_current_retention_type(self)
-        for r in resources:
-            backup_resource = BackupResource(
-                tag_prefix=RuntimeConfig.get_tag_prefix(),
-                entity_resource=r,
-                copy_resource_tags=RuntimeConfig.copy_resource_tags(self),
-                exluded_resource_tag_keys=RuntimeConfig.get_exluded_resource_tag_keys(self)
-            )
-            
-            # if retention is explicitly given by runtime environment
-            if current_retention_type is not None:
-                backup_resource.set_retention_type(current_retention_type)
-                        
+        pipeline_workers = RuntimeConfig.get_pipeline_workers(self)
+        if pipeline_workers > 0 and not RuntimeConfig.is_lambda_runtime(self):
+            return self._create_backups_pipelined(resources, resource_type, current_retention_type,
+                                                  pipeline_workers)
+
+        concurrency = RuntimeConfig.get_create_concurrency(self)
+        if concurrency > 1 and len(resources) > 1:
+            self.logger.info(f"Creating backups with {concurrency} concurrent workers")
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                # each in the context of this run, so whatever the workers observe is reported on it
+                contexts = [contextvars.copy_context() for _ in resources]
+                created = list(executor.map(
+                    lambda r, context: context.run(self._create_entity_backup, r, resource_type,
+                                                   current_retention_type),
+                    resources, contexts))
+        else:
+            created = [self._create_entity_backup(r, resource_type, current_retention_type)
+                       for r in resources]
+        # map keeps the collection order, so copies and shares are dispatched as before
+        backup_resources = [br for br in created if br is not None]
+
+        # create backups and disaster recovery region
+        for br in backup_resources:
+            self._dispatch_copy(br)
+
+        # each backup is shared with all accounts at once
+        share_with_accounts = RuntimeConfig.get_share_with_accounts(self)
+        if share_with_accounts:
+            for br in backup_resources:
+                self._dispatch_share(br, share_with_accounts)
+
+        return backup_resources
+
+    def _create_backups_pipelined(self, resources, resource_type, current_retention_type, workers):
+        """create_backups, with every step of every backup run in-process on a BackupPipeline.
+
+        Each backup's copies and shares are queued the moment it is created, rather than after
+        every other backup has been created, and start as soon as it becomes available.
+        """
+        self.logger.info(f"Creating backups on a pipeline of {workers} workers")
+        pipeline = BackupPipeline(workers)
+        created = {}
+
+        def create(index, r):
+            backup_resource = self._create_entity_backup(r, resource_type, current_retention_type)
+            if backup_resource is None:
+                return
+            created[index] = backup_resource
+            self._dispatch_copy(backup_resource)
+            share_with_accounts = RuntimeConfig.get_share_with_accounts(self)
+            if share_with_accounts:
+                self._dispatch_share(backup_resource, share_with_accounts)
+
+        self.pipeline = pipeline
+        try:
+            for index, r in enumerate(resources):
+                pipeline.add(f"create {r.resource_id}", functools.partial(create, index, r),
+                             stage=BackupPipeline.STAGE_CREATE)
+            pipeline.join()
+        finally:
+            self.pipeline = None
+
+        return [created[index] for index in sorted(created)]
+
+    def _dispatch_copy(self, backup_resource):
+        try:
+            self.copy_backup(backup_resource, RuntimeConfig.get_dr_regions(backup_resource.entity_resource.tags, self))
+        except Exception as e:
+            # one failed dispatch used to abort the copy of every remaining backup
+            self.logger.exception(f"Failed to dispatch DR copy of backup {backup_resource.name}:{e}")
+            self.report('CopyBackupToRegion', 'ERROR', error=e, backup_name=backup_resource.name,
+                        **self.backup_context(backup_resource))
+
+    def _dispatch_share(self, backup_resource, aws_account_ids):
+        try:
+            self.share_backup(backup_resource, aws_account_ids)
+        except Exception as e:
+            self.logger.exception(f"Failed to dispatch share of backup {backup_resource.name} "
+                                  f"with accounts {', '.join(aws_account_ids)}:{e}")
+            self.report('ShareBackup', 'ERROR', error=e, backup_name=backup_resource.name,
+                        **self.backup_context(backup_resource))
+
+    def _dispatch(self, method: str, arguments: Dict, backup_region: str, backup_id: str, copy_region: str = None):
+        """Hand an operation waiting on a backup to the pipeline, or to the invoker outside of one.
+        copy_region is the destination of operations that copy the backup, see CopyScheduler"""
+        if self.pipeline is not None:
+            self.pipeline.add_operation(self, method, arguments, backup_region, backup_id, copy_region=copy_region)
+        else:
+            ShelveryInvoker().invoke_shelvery_operation(self, method, arguments)
+
+    def _create_entity_backup(self, r, resource_type, current_retention_type):
+        """Create, tag and store the backup of a single entity.
+
+        Every failure is reported and swallowed here, so one entity can never take down the
+        others - whether they run one after another or on a worker pool. Returns the backup
+        once it has been created and tagged, None if it was skipped or failed before that.
+        """
+        backup_resource = BackupResource(
+            tag_prefix=RuntimeConfig.get_tag_prefix(),
+            entity_resource=r,
+            copy_resource_tags=RuntimeConfig.copy_resource_tags(self),
+            exluded_resource_tag_keys=RuntimeConfig.get_exluded_resource_tag_keys(self),
+            account_id=self.account_id
+        )
+        
+        # if retention is explicitly given by runtime environment
+        if current_retention_type is not None:
+            backup_resource.set_retention_type(current_retention_type)
+                    
+        # Check whether current retention is allowed, if not try next retention type by precedence
+        skip_backup = False
+
+        # skip validation if custom retention type
+        if backup_resource.retention_type in self.RETENTION_TYPE_PRECEDENCE:
             # Check whether current retention is allowed, if not try next retention type by precedence
-            skip_backup = False
-
-            # skip validation if custom retention type
-            if backup_resource.retention_type in self.RETENTION_TYPE_PRECEDENCE:
-                # Check whether current retention is allowed, if not try next retention type by precedence
-                while not self._verify_retention(backup_resource):
-                    self.logger.info(f"Retention Type: {backup_resource.retention_type} disabled")
-                    new_retention_type = self.RETENTION_TYPE_PRECEDENCE[backup_resource.retention_type]
-                    self.logger.info(f"Checking whether retention type: {new_retention_type} is permitted")
-                    if new_retention_type:
-                        backup_resource.set_retention_type(new_retention_type)
-                    else:
-                        #Set skip backup to true as daily is set to 0
-                        skip_backup = True
-                        break 
-            else:
-                self.logger.info(f"Skipping retention check as custom retention type {backup_resource.retention_type} was detected")
+            while not self._verify_retention(backup_resource):
+                self.logger.info(f"Retention Type: {backup_resource.retention_type} disabled")
+                new_retention_type = self.RETENTION_TYPE_PRECEDENCE[backup_resource.retention_type]
+                self.logger.info(f"Checking whether retention type: {new_retention_type} is permitted")
+                if new_retention_type:
+                    backup_resource.set_retention_type(new_retention_type)
+                else:
+                    #Set skip backup to true as daily is set to 0
+                    skip_backup = True
+                    break 
+        else:
+            self.logger.info(f"Skipping retention check as custom retention type {backup_resource.retention_type} was detected")
 
-            # Skip current backup
-            if skip_backup:
-                self.report('CreateBackup', 'IGNORE', backup_name=backup_resource.name,
-                            **self.backup_context(backup_resource))
-                continue
+        # Skip current backup
+        if skip_backup:
+            self.report('CreateBackup', 'IGNORE', backup_name=backup_resource.name,
+                        **self.backup_context(backup_resource))
+            return None
 
-            dr_regions = RuntimeConfig.get_dr_regions(backup_resource.entity_resource.tags, self)
-            backup_resource.tags[f"{RuntimeConfig.get_tag_prefix()}:dr_regions"] = ','.join(dr_regions)
-            
-            re_encrypt_key = RuntimeConfig.get_reencrypt_kms_key_id(backup_resource.entity_resource.tags, self)
-            if re_encrypt_key := RuntimeConfig.get_reencrypt_kms_key_id(backup_resource.entity_resource.tags, self):
-                backup_resource.tags[f"{RuntimeConfig.get_tag_prefix()}:config:shelvery_reencrypt_kms_key_id"] = re_encrypt_key
+        dr_regions = RuntimeConfig.get_dr_regions(backup_resource.entity_resource.tags, self)
+        backup_resource.tags[f"{RuntimeConfig.get_tag_prefix()}:dr_regions"] = ','.join(dr_regions)
+        
+        re_encrypt_key = RuntimeConfig.get_reencrypt_kms_key_id(backup_resource.entity_resource.tags, self)
+        if re_encrypt_key := RuntimeConfig.get_reencrypt_kms_key_id(backup_resource.entity_resource.tags, self):
+            backup_resource.tags[f"{RuntimeConfig.get_tag_prefix()}:config:shelvery_reencrypt_kms_key_id"] = re_encrypt_key
 
 
-            self.logger.info(f"Processing {resource_type} with id {r.resource_id}")
-            self.logger.info(f"Creating backup {backup_resource.name}")
+        self.logger.info(f"Processing {resource_type} with id {r.resource_id}")
+        self.logger.info(f"Creating backup {backup_resource.name}")
 
-            try:
-                self.backup_resource(backup_resource)
+        created = None
+        try:
+            self.backup_resource(backup_resource)
+            if not backup_resource.tagged_on_create:
                 self.tag_backup_resource(backup_resource)
-                self.logger.info(f"Created backup of type {resource_type} for entity {backup_resource.entity_id} "
-                                 f"with id {backup_resource.backup_id}")
-                backup_resources.append(backup_resource)
-                self.store_backup_data(backup_resource)
-                self.snspublisher.notify({
-                    'Operation': 'CreateBackup',
-                    'Status': 'OK',
-                    'BackupType': self.get_engine_type(),
-                    'BackupName': backup_resource.name,
-                    'EntityId': backup_resource.entity_id
-                })
-                self.report('CreateBackup', 'OK', backup_id=backup_resource.backup_id,
-                            backup_name=backup_resource.name,
-                            **self.backup_context(backup_resource))
-            except ClientError as e:
-                if e.response['Error']['Code'] == 'InvalidDBInstanceState':
-                    if RuntimeConfig.ignore_invalid_resource_state(self):
-                        ignore_message = f"{resource_type} {backup_resource.entity_id} is not in a state a backup can be taken. Skipping backup {backup_resource.name}"
-                        self.snspublisher.notify({
-                            'Operation': 'CreateBackup',
-                            'Status': 'IGNORE',
-                            'Message': ignore_message,
-                            'BackupType': self.get_engine_type(),
-                            'BackupName': backup_resource.name,
-                            'EntityId': backup_resource.entity_id
-                        })
-                        self.logger.warn(ignore_message)
-                        self.logger.warn(ignore_message)
-                        self.report('CreateBackup', 'IGNORE',
-                                    backup_name=backup_resource.name,
-                                    **self.backup_context(backup_resource))
-                    else:
-                        self.snspublisher_error.notify({
-                            'Operation': 'CreateBackup',
-                            'Status': 'ERROR',
-                            'ExceptionInfo': e.__dict__,
-                            'BackupType': self.get_engine_type(),
-                            'BackupName': backup_resource.name,
-                            'EntityId': backup_resource.entity_id
-                        })
-                        self.logger.exception(f"Failed to create backup {backup_resource.name}:{e}")
-                        self.report('CreateBackup', 'ERROR', error=e,
-                                    backup_name=backup_resource.name,
-                                    **self.backup_context(backup_resource))
+            self.logger.info(f"Created backup of type {resource_type} for entity {backup_resource.entity_id} "
+                             f"with id {backup_resource.backup_id}")
+            created = backup_resource
+            self.store_backup_data(backup_resource)
+            self.snspublisher.notify({
+                'Operation': 'CreateBackup',
+                'Status': 'OK',
+                'BackupType': self.get_engine_type(),
+                'BackupName': backup_resource.name,
+                'EntityId': backup_resource.entity_id
+            })
+            self.report('CreateBackup', 'OK', backup_id=backup_resource.backup_id,
+                        backup_name=backup_resource.name,
+                        **self.backup_context(backup_resource))
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'InvalidDBInstanceState':
+                if RuntimeConfig.ignore_invalid_resource_state(self):
+                    ignore_message = f"{resource_type} {backup_resource.entity_id} is not in a state a backup can be taken. Skipping backup {backup_resource.name}"
+                    self.snspublisher.notify({
+                        'Operation': 'CreateBackup',
+                        'Status': 'IGNORE',
+                        'Message': ignore_message,
+                        'BackupType': self.get_engine_type(),
+                        'BackupName': backup_resource.name,
+                        'EntityId': backup_resource.entity_id
+                    })
+                    self.logger.warn(ignore_message)
+                    self.logger.warn(ignore_message)
+                    self.report('CreateBackup', 'IGNORE',
+                                backup_name=backup_resource.name,
+                                **self.backup_context(backup_resource))
                 else:
                     self.snspublisher_error.notify({
                         'Operation': 'CreateBackup',
@@ -418,9 +617,7 @@ class ShelveryEngine:
                     self.report('CreateBackup', 'ERROR', error=e,
                                 backup_name=backup_resource.name,
                                 **self.backup_context(backup_resource))
-            except Exception as e:
-                # Anything that isn't a ClientError used to abort the whole run mid loop,
-                # leaving every remaining resource silently un-backed-up. Keep going.
+            else:
                 self.snspublisher_error.notify({
                     'Operation': 'CreateBackup',
                     'Status': 'ERROR',
@@ -433,28 +630,23 @@ class ShelveryEngine:
                 self.report('CreateBackup', 'ERROR', error=e,
                             backup_name=backup_resource.name,
                             **self.backup_context(backup_resource))
+        except Exception as e:
+            # Anything that isn't a ClientError used to abort the whole run mid loop,
+            # leaving every remaining resource silently un-backed-up. Keep going.
+            self.snspublisher_error.notify({
+                'Operation': 'CreateBackup',
+                'Status': 'ERROR',
+                'ExceptionInfo': e.__dict__,
+                'BackupType': self.get_engine_type(),
+                'BackupName': backup_resource.name,
+                'EntityId': backup_resource.entity_id
+            })
+            self.logger.exception(f"Failed to create backup {backup_resource.name}:{e}")
+            self.report('CreateBackup', 'ERROR', error=e,
+                        backup_name=backup_resource.name,
+                        **self.backup_context(backup_resource))
 
-        # create backups and disaster recovery region
-        for br in backup_resources:
-            try:
-                self.copy_backup(br, RuntimeConfig.get_dr_regions(br.entity_resource.tags, self))
-            except Exception as e:
-                # one failed dispatch used to abort the copy of every remaining backup
-                self.logger.exception(f"Failed to dispatch DR copy of backup {br.name}:{e}")
-                self.report('CopyBackupToRegion', 'ERROR', error=e, backup_name=br.name,
-                            **self.backup_context(br))
-
-        for aws_account_id in RuntimeConfig.get_share_with_accounts(self):
-            for br in backup_resources:
-                try:
-                    self.share_backup(br, aws_account_id)
-                except Exception as e:
-                    self.logger.exception(f"Failed to dispatch share of backup {br.name} "
-                                          f"with account {aws_account_id}:{e}")
-                    self.report('ShareBackup', 'ERROR', error=e, backup_name=br.name,
-                                **self.backup_context(br))
-
-        return backup_resources
+        return created
 
     @reported_action
     def clean_backups(self):
@@ -480,72 +672,127 @@ class ShelveryEngine:
                             Keeping last {RuntimeConfig.get_keep_monthly(None, self)} monthly backups
                             Keeping last {RuntimeConfig.get_keep_yearly(None, self)} yearly backups""")
 
-        # check backups for expire date, delete if necessary
+        # expiry is evaluated up front, in memory - only the deletes below talk to AWS
+        custom_retention_types = RuntimeConfig.get_custom_retention_types(self)
+        expired = []
         for backup in existing_backups:
             self.logger.info(f"Checking backup {backup.backup_id}")
             try:
-                if backup.is_stale(self, RuntimeConfig.get_custom_retention_types(self)):
-                    self.logger.info(
-                        f"{backup.retention_type} backup {backup.name} has expired on {backup.expire_date}, cleaning up")
-                    self.delete_backup(backup)
-                    backup.date_deleted = datetime.now(timezone.utc).replace(tzinfo=None)
-                    self._archive_backup_metadata(backup, self._get_data_bucket(), RuntimeConfig.get_share_with_accounts(self))
-                    self.snspublisher.notify({
-                        'Operation': 'DeleteBackup',
-                        'Status': 'OK',
-                        'BackupType': self.get_engine_type(),
-                        'BackupName': backup.name,
-                    })
-                    self.report('DeleteBackup', 'OK', backup_id=backup.backup_id,
-                                backup_name=backup.name, **self.backup_context(backup))
-                
-                # If re-encrypt backup is older than re-encrypt backup cleanup hours, clean up the backup
-                elif '-re-encrypted' in backup.backup_id:
-                    # Get tag prefix to check for cross-account copy
-                    tag_prefix = backup.tags.get('shelvery:tag_name', RuntimeConfig.get_tag_prefix())
-                    is_cross_account_copy = backup.tags.get(f"{tag_prefix}:cross_account_copy") == 'true'
-                    
-                    # Only delete if it's not a cross-account copy
-                    if is_cross_account_copy:
-                        self.logger.info(f"Re-encrypted backup {backup.name} is a cross-account copy e.g., databunker, skipping cleanup")
-                    else:
-                        # Check if backup is older than re-encrypt backup cleanup hours
-                        current_time = datetime.now(timezone.utc).replace(tzinfo=None)
-                        age_hours = (current_time - backup.date_created).total_seconds() / 3600
-                        cleanup_hours = RuntimeConfig.get_reencrypt_backup_cleanup_hours(backup.tags, self)
-                        if age_hours > cleanup_hours:
-                            self.logger.info(
-                                f"Re-encrypted backup {backup.name} is {age_hours:.1f} hours old (> {cleanup_hours} hours), cleaning up")
-                            self.delete_backup(backup)
-                            backup.date_deleted = datetime.now(timezone.utc).replace(tzinfo=None)
-                            self._archive_backup_metadata(backup, self._get_data_bucket(), RuntimeConfig.get_share_with_accounts(self))
-                            self.snspublisher.notify({
-                                'Operation': 'DeleteReencryptedBackup',
-                                'Status': 'OK',
-                                'BackupType': self.get_engine_type(),
-                                'BackupName': backup.name,
-                                'AgeHours': age_hours
-                            })
-                            self.report('DeleteReencryptedBackup', 'OK',
-                                        backup_id=backup.backup_id, backup_name=backup.name,
-                                        **self.backup_context(backup))
-                        else:
-                            self.logger.info(f"Re-encrypted backup {backup.name} is {age_hours:.1f} hours old (< {cleanup_hours} hours), keeping")
-                    
-                else:
-                    self.logger.info(f"{backup.retention_type} backup {backup.name} is valid "
-                                     f"until {backup.expire_date}, keeping this backup")
+                expiry = self._check_expiry(backup, custom_retention_types)
             except Exception as e:
-                self.snspublisher_error.notify({
-                    'Operation': 'DeleteBackup',
-                    'Status': 'ERROR',
-                    'ExceptionInfo': e.__dict__,
-                    'BackupType': self.get_engine_type(),
-                    'BackupName': backup.name,
-                })
-                self.logger.exception(f"Error checking backup {backup.backup_id} for cleanup: {e}")
-                self.report('DeleteBackup', 'ERROR', error=e, backup_id=backup.backup_id,
-                            backup_name=backup.name, **self.backup_context(backup))
+                self._report_clean_failure(backup, e)
+                continue
+            if expiry is not None:
+                expired.append((backup,) + expiry)
+
+        share_with_accounts = RuntimeConfig.get_share_with_accounts(self)
+        concurrency = RuntimeConfig.get_clean_concurrency(self)
+        if concurrency > 1 and len(expired) > 1:
+            self._delete_expired_concurrently(expired, share_with_accounts, concurrency)
+        else:
+            for backup, operation, details in expired:
+                self._delete_expired_backup(backup, operation, details, share_with_accounts)
+
+    def _check_expiry(self, backup, custom_retention_types):
+        """Decide whether a backup is due for deletion, without calling AWS.
+
+        Returns the (operation, notification details) the delete is reported under, or None
+        when the backup is kept.
+        """
+        if backup.is_stale(self, custom_retention_types):
+            self.logger.info(
+                f"{backup.retention_type} backup {backup.name} has expired on {backup.expire_date}, cleaning up")
+            return 'DeleteBackup', {}
+
+        # If re-encrypt backup is older than re-encrypt backup cleanup hours, clean up the backup
+        if '-re-encrypted' in backup.backup_id:
+            # Get tag prefix to check for cross-account copy
+            tag_prefix = backup.tags.get('shelvery:tag_name', RuntimeConfig.get_tag_prefix())
+            is_cross_account_copy = backup.tags.get(f"{tag_prefix}:cross_account_copy") == 'true'
+
+            # Only delete if it's not a cross-account copy
+            if is_cross_account_copy:
+                self.logger.info(f"Re-encrypted backup {backup.name} is a cross-account copy e.g., databunker, skipping cleanup")
+                return None
+
+            # Check if backup is older than re-encrypt backup cleanup hours
+            current_time = datetime.now(timezone.utc).replace(tzinfo=None)
+            age_hours = (current_time - backup.date_created).total_seconds() / 3600
+            cleanup_hours = RuntimeConfig.get_reencrypt_backup_cleanup_hours(backup.tags, self)
+            if age_hours > cleanup_hours:
+                self.logger.info(
+                    f"Re-encrypted backup {backup.name} is {age_hours:.1f} hours old (> {cleanup_hours} hours), cleaning up")
+                return 'DeleteReencryptedBackup', {'AgeHours': age_hours}
+
+            self.logger.info(f"Re-encrypted backup {backup.name} is {age_hours:.1f} hours old (< {cleanup_hours} hours), keeping")
+            return None
+
+        self.logger.info(f"{backup.retention_type} backup {backup.name} is valid "
+                         f"until {backup.expire_date}, keeping this backup")
+        return None
+
+    def _delete_expired_backup(self, backup, operation, details, share_with_accounts,
+                               delete_slots=None, archive_slots=None):
+        """Delete an expired backup and archive its metadata. Reports the outcome, never raises.
+
+        The optional semaphores cap how many workers are inside the engine's delete call and
+        the S3 archive at any one time, when run from _delete_expired_concurrently.
+        """
+        try:
+            with delete_slots or nullcontext():
+                self.delete_backup(backup)
+            backup.date_deleted = datetime.now(timezone.utc).replace(tzinfo=None)
+            with archive_slots or nullcontext():
+                self._archive_backup_metadata(backup, self._get_data_bucket(), share_with_accounts)
+            self.snspublisher.notify({
+                'Operation': operation,
+                'Status': 'OK',
+                'BackupType': self.get_engine_type(),
+                'BackupName': backup.name,
+                **details
+            })
+            self.report(operation, 'OK', backup_id=backup.backup_id,
+                        backup_name=backup.name, **self.backup_context(backup))
+        except Exception as e:
+            self._report_clean_failure(backup, e)
+
+    def _delete_expired_concurrently(self, expired, share_with_accounts, concurrency):
+        delete_slots = threading.BoundedSemaphore(min(concurrency, self.CLEAN_DELETE_CONCURRENCY))
+        archive_slots = threading.BoundedSemaphore(min(concurrency, self.CLEAN_ARCHIVE_CONCURRENCY))
+        self.logger.info(f"Deleting {len(expired)} expired backups with {concurrency} concurrent workers")
+
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+        futures = {
+            executor.submit(contextvars.copy_context().run, self._delete_expired_backup, backup, operation, details,
+                            share_with_accounts, delete_slots, archive_slots): (backup, operation)
+            for backup, operation, details in expired
+        }
+        try:
+            for future in as_completed(futures):
+                future.result()
+        finally:
+            # when the run is cut short, whatever has not started yet is dropped - but it
+            # still has to show up in the report, or a partial clean looks like a full one
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=True)
+            for future, (backup, operation) in futures.items():
+                if future.cancelled():
+                    self.report(operation, 'ERROR', error=CancelledError('clean run ended before the delete started'),
+                                backup_id=backup.backup_id, backup_name=backup.name,
+                                **self.backup_context(backup))
+
+    def _report_clean_failure(self, backup, e):
+        self.snspublisher_error.notify({
+            'Operation': 'DeleteBackup',
+            'Status': 'ERROR',
+            'ExceptionInfo': e.__dict__,
+            'BackupType': self.get_engine_type(),
+            'BackupName': backup.name,
+        })
+        self.logger.exception(f"Error checking backup {backup.backup_id} for cleanup: {e}")
+        self.report('DeleteBackup', 'ERROR', error=e, backup_id=backup.backup_id,
+                    backup_name=backup.name, **self.backup_context(backup))
 
     @reported_action
     def pull_shared_backups(self):
@@ -573,18 +820,10 @@ class ShelveryEngine:
                     bucket_region = 'us-east-1'
                 regional_client = AwsHelper.boto3_client('s3', region_name=bucket_region)
 
-                shared_backups = regional_client.list_objects_v2(Bucket=bucket_name, Prefix=path)
-                if 'Contents' in shared_backups:
-                    all_backups = shared_backups['Contents']
-                else:
+                all_backups = list(AwsHelper.paginate(regional_client, 'list_objects_v2', 'Contents',
+                                                      page_size=1000, Bucket=bucket_name, Prefix=path))
+                if not all_backups:
                     self.logger.info(f"No shared backups of type {self.get_engine_type()} found to pull")
-                    all_backups = {}
-                while 'NextContinuationToken' in shared_backups:
-                    shared_backups = regional_client.list_objects_v2(
-                        Bucket=bucket_name, Delimiter='/',
-                        Prefix=path, ContinuationToken=shared_backups['NextContinuationToken']
-                    )
-                    all_backups.extend(shared_backups['Contents'])
 
                 self.logger.info(f"Collected information for {len(all_backups)} backups from S3.")
                 if self.run_report is not None:
@@ -596,9 +835,11 @@ class ShelveryEngine:
                             Bucket=bucket_name,
                             Key=backup_object['Key'])['Body'].read()
                         shared_backup = yaml.load(serialised_shared_backup, Loader=yaml.Loader)
-                        new_backup_id = self.copy_shared_backup(src_account_id, shared_backup)
-                        new_backup = shared_backup.cross_account_copy(new_backup_id)
-                        self.tag_backup_resource(new_backup)
+                        new_backup = shared_backup.cross_account_copy(None, self.account_id, self.region)
+                        new_backup_id = self.copy_shared_backup(src_account_id, shared_backup, new_backup.tags)
+                        new_backup.backup_id = new_backup_id
+                        if not self.TAG_ON_COPY:
+                            self.tag_backup_resource(new_backup)
                         self.store_backup_data(new_backup)
                         regional_client.delete_object(Bucket=bucket_name, Key=backup_object['Key'])
                         self.logger.info(f"Removed s3://{bucket_name}/{backup_object['Key']}")
@@ -659,6 +900,7 @@ class ShelveryEngine:
         regions.extend(RuntimeConfig.get_dr_regions(None, self))
         for region in regions:
             bucket = self._get_data_bucket(region)
+            self._block_public_access(bucket.name, region)
             
             if self._bucket_policy_changed(region,bucket.name):
                 policy = AwsHelper.get_shelvery_bucket_policy(self.account_id,
@@ -674,20 +916,20 @@ class ShelveryEngine:
             to be executed if code is running in lambda environment, and remaining execution
             time is lower than threshold of 20 seconds"""
 
-        total_wait_time = 0
-        retry = 15
         timeout = RuntimeConfig.get_wait_backup_timeout(self)
         self.logger.info(f"Waiting for backup {backup_id} to become available, timing out after {timeout} seconds...")
 
-        available = self.is_backup_available(backup_region, backup_id)
-        while not available:
-            if total_wait_time >= timeout or total_wait_time + retry > timeout:
-                timeout_fn()
-                raise Exception(f"Backup {backup_id} did not become available in {timeout} seconds")
-            self.logger.info(f"Sleeping for {retry} seconds until backup {backup_id} becomes available")
-            time.sleep(retry)
-            total_wait_time = total_wait_time + retry
-            available = self.is_backup_available(backup_region, backup_id)
+        # the poller checks every pending backup of this engine type and region in batches,
+        # rather than every waiter polling for its own backup
+        poller = AvailabilityPoller.for_engine(self, backup_region)
+        # backups outside of the region the engine runs in are DR copies
+        available = poller.wait(backup_id, learn=backup_region == self.region)
+        try:
+            available.result(timeout=max(timeout, 0))
+        except FutureTimeoutError:
+            poller.forget(backup_id, available)
+            timeout_fn()
+            raise Exception(f"Backup {backup_id} did not become available in {timeout} seconds")
 
     def wait_backup_available(self, backup_region: str, backup_id: str, lambda_method: str, lambda_args: Dict) -> bool:
         """Wait for backup to become available. If running in lambda environment, pass lambda method and
@@ -732,21 +974,80 @@ class ShelveryEngine:
                 'BackupId': backup_resource.backup_id,
                 'Region': region
             }
-            ShelveryInvoker().invoke_shelvery_operation(self, method, arguments)
+            self._dispatch(method, arguments, backup_resource.region, backup_resource.backup_id, copy_region=region)
 
-    def share_backup(self, backup_resource: BackupResource, aws_account_id: str):
+    def _scheduled_copy(self, backup_id: str, origin_region: str, dst_region: str, tags: Dict = None) -> str:
+        """copy_backup_to_region, once there is a free slot for copies to dst_region, see CopyScheduler.
+        The slot is held until the copy is available in dst_region.
         """
-        Share backup with other AWS account - this is orchestration method, rather than
+        if RuntimeConfig.is_lambda_runtime(self):
+            # the container is frozen once the handler returns, so there is no tracking the copy to
+            # release its slot, and no time to wait for one - copies are left to the limit AWS enforces
+            return self.copy_backup_to_region(backup_id, dst_region, tags)
+
+        scheduler = CopyScheduler.for_engine(self, dst_region, RuntimeConfig.get_copy_concurrency(self))
+        # in the pipeline, the slot was granted before the copy was given a worker
+        reservation, self.copy_slot = self.copy_slot, None
+        attempt = 0
+        while True:
+            if reservation is None or not scheduler.take(reservation):
+                scheduler.acquire(lambda: self._backup_size(origin_region, backup_id))
+            reservation = None
+            try:
+                regional_backup_id = self.copy_backup_to_region(backup_id, dst_region, tags)
+            except ClientError as e:
+                scheduler.release()
+                attempt += 1
+                if e.response['Error']['Code'] not in self.COPY_LIMIT_ERROR_CODES or attempt > self.COPY_LIMIT_RETRIES:
+                    raise
+                self.logger.warning(f"Copy of {backup_id} to {dst_region} refused over the copies in progress, "
+                                    f"retrying in {self.COPY_LIMIT_RETRY_DELAY * attempt} seconds: {e}")
+                time.sleep(self.COPY_LIMIT_RETRY_DELAY * attempt)
+                continue
+            except BaseException:
+                scheduler.release()
+                raise
+            break
+
+        if regional_backup_id is None:
+            # nothing to track, e.g. redshift copies through cluster configuration instead
+            scheduler.release()
+            return regional_backup_id
+
+        poller = AvailabilityPoller.for_engine(self, dst_region)
+        completed = poller.wait(regional_backup_id, learn=False)
+        scheduler.release_when_done(completed, RuntimeConfig.get_wait_backup_timeout(self),
+                                    on_timeout=lambda: poller.forget(regional_backup_id, completed))
+        return regional_backup_id
+
+    def update_backup_tags(self, backup_resource: BackupResource):
+        """Write only the tags of the backup that changed since it was read, if any"""
+        changed = backup_resource.changed_tags()
+        if not changed:
+            return
+        self.tag_backup_resource(backup_resource, changed)
+        backup_resource.stored_tags = dict(backup_resource.tags)
+
+    def _backup_size(self, backup_region: str, backup_id: str):
+        """Size of the backup in GiB, if its engine reports one"""
+        status = self.get_backups_status(backup_region, [backup_id]).get(backup_id)
+        return status.size if status is not None else None
+
+    def share_backup(self, backup_resource: BackupResource, aws_account_ids: List[str]):
+        """
+        Share backup with other AWS accounts - this is orchestration method, rather than
         logic implementation, invokes actual implementation or lambda
         """
+        if isinstance(aws_account_ids, str):
+            aws_account_ids = [aws_account_ids]
 
         method = 'do_share_backup'
         arguments = {
             'Region': backup_resource.region,
             'BackupId': backup_resource.backup_id,
-            'AwsAccountId': aws_account_id
+            'AwsAccountIds': list(aws_account_ids)
         }
-        ShelveryInvoker().invoke_shelvery_operation(self, method, arguments)
+        self._dispatch(method, arguments, backup_resource.region, backup_resource.backup_id)
 
     @reported_action
     def do_copy_backup(self, map_args={}, **kwargs):
@@ -773,33 +1074,39 @@ class ShelveryEngine:
         self.logger.info(f"Do copy backup {kwargs['BackupId']} ({kwargs['OriginRegion']}) to region {kwargs['Region']}")
 
         # copy backup
+        regional_backup_id = None
         try:
             src_region = kwargs['OriginRegion']
             dst_region = kwargs['Region']
-            regional_backup_id = self.copy_backup_to_region(kwargs['BackupId'], dst_region)
-
-            # create tags on backup copy
             original_backup_id = kwargs['BackupId']
-            original_backup = self.get_backup_resource(src_region, original_backup_id)
+
+            # tags of the backup copy, with metadata of the dr copy added, for the copy call itself
             resource_copy = BackupResource(None, None, True)
-            resource_copy.backup_id = regional_backup_id
             resource_copy.region = kwargs['Region']
-            resource_copy.tags = original_backup.tags.copy()
-
-            # add metadata to dr copy and original
-            dr_copies_tag_key = f"{RuntimeConfig.get_tag_prefix()}:dr_copies"
+            resource_copy.tags = backup_resource.tags.copy()
             resource_copy.tags[f"{RuntimeConfig.get_tag_prefix()}:region"] = dst_region
             resource_copy.tags[f"{RuntimeConfig.get_tag_prefix()}:dr_copy"] = 'true'
             resource_copy.tags[
                 f"{RuntimeConfig.get_tag_prefix()}:dr_source_backup"] = f"{src_region}:{original_backup_id}"
 
-            if dr_copies_tag_key not in original_backup.tags:
-                original_backup.tags[dr_copies_tag_key] = ''
-            original_backup.tags[dr_copies_tag_key] = original_backup.tags[
-                                                          dr_copies_tag_key] + f"{dst_region}:{regional_backup_id} "
-
-            self.tag_backup_resource(resource_copy)
-            self.tag_backup_resource(original_backup)
+            regional_backup_id = self._scheduled_copy(original_backup_id, src_region, dst_region, resource_copy.tags)
+            resource_copy.backup_id = regional_backup_id
+            # nothing to tag or record without a copy, e.g. redshift copies through cluster configuration instead
+            if regional_backup_id is not None:
+                if not self.TAG_ON_COPY:
+                    self.tag_backup_resource(resource_copy)
+
+                # the id of the copy is only known now, so the original takes a tag write of its own to record
+                # it. The original is read again first: backup_resource was read before waiting for the backup
+                # and the copy slot, and copies to the other dr regions append to dr_copies meanwhile - adding
+                # to the value read then would drop their entries
+                original_backup = self.get_backup_resource(src_region, original_backup_id)
+                dr_copies_tag_key = f"{RuntimeConfig.get_tag_prefix()}:dr_copies"
+                if dr_copies_tag_key not in original_backup.tags:
+                    original_backup.tags[dr_copies_tag_key] = ''
+                original_backup.tags[dr_copies_tag_key] = original_backup.tags[
+                                                              dr_copies_tag_key] + f"{dst_region}:{regional_backup_id} "
+                self.update_backup_tags(original_backup)
             self.snspublisher.notify({
                 'Operation': 'CopyBackupToRegion',
                 'Status': 'OK',
@@ -808,8 +1115,9 @@ class ShelveryEngine:
                 'BackupId': kwargs['BackupId'],
             })
             self.report('CopyBackupToRegion', 'OK', backup_id=kwargs['BackupId'],
-                        **self.backup_context(original_backup))
-            self.store_backup_data(resource_copy)
+                        **self.backup_context(backup_resource))
+            if regional_backup_id is not None:
+                self.store_backup_data(resource_copy)
         except Exception as e:
             self.snspublisher_error.notify({
                 'Operation': 'CopyBackupToRegion',
@@ -822,24 +1130,19 @@ class ShelveryEngine:
             self.logger.exception(f"Error copying backup {kwargs['BackupId']} to {dst_region}")
             self.report('CopyBackupToRegion', 'ERROR', error=e, backup_id=kwargs['BackupId'])
 
-        # shared backup copy with same accounts
-        for shared_account_id in RuntimeConfig.get_share_with_accounts(self):
-            backup_resource = BackupResource(None, None, True)
+        # shared backup copy with same accounts, all at once. There is none to share if the copy failed,
+        # or if the engine made none
+        share_with_accounts = RuntimeConfig.get_share_with_accounts(self)
+        if not share_with_accounts or regional_backup_id is None:
+            return
+        backup_resource = BackupResource(None, None, True)
+        backup_resource.region = kwargs['Region']
+        try:
             backup_resource.backup_id = regional_backup_id
-            backup_resource.region = kwargs['Region']
-            try:
-                self.share_backup(backup_resource, shared_account_id)
-                self.snspublisher.notify({
-                    'Operation': 'ShareRegionalBackupCopy',
-                    'Status': 'OK',
-                    'DestinationAccount': shared_account_id,
-                    'DestinationRegion': kwargs['Region'],
-                    'BackupType': self.get_engine_type(),
-                    'BackupId': kwargs['BackupId'],
-                })
-                self.report('ShareRegionalBackupCopy', 'OK', backup_id=kwargs['BackupId'],
-                            **self.backup_context(backup_resource))
-            except Exception as e:
+            self.share_backup(backup_resource, share_with_accounts)
+        except Exception as e:
+            self.logger.exception(f"Error sharing copied backup {kwargs['BackupId']} to {dst_region}")
+            for shared_account_id in share_with_accounts:
                 self.snspublisher_error.notify({
                     'Operation': 'ShareRegionalBackupCopy',
                     'Status': 'ERROR',
@@ -849,17 +1152,30 @@ class ShelveryEngine:
                     'BackupType': self.get_engine_type(),
                     'BackupId': kwargs['BackupId'],
                 })
-                self.logger.exception(f"Error sharing copied backup {kwargs['BackupId']} to {dst_region}")
                 self.report('ShareRegionalBackupCopy', 'ERROR', error=e,
                             backup_id=kwargs['BackupId'])
+            return
+
+        for shared_account_id in share_with_accounts:
+            self.snspublisher.notify({
+                'Operation': 'ShareRegionalBackupCopy',
+                'Status': 'OK',
+                'DestinationAccount': shared_account_id,
+                'DestinationRegion': kwargs['Region'],
+                'BackupType': self.get_engine_type(),
+                'BackupId': kwargs['BackupId'],
+            })
+            self.report('ShareRegionalBackupCopy', 'OK', backup_id=kwargs['BackupId'],
+                        **self.backup_context(backup_resource))
 
     @reported_action
     def do_share_backup(self, map_args={}, **kwargs):
-        """Share backup with other AWS account, actual implementation"""
+        """Share backup with other AWS accounts, actual implementation"""
         kwargs.update(map_args)
         backup_id = kwargs['BackupId']
         backup_region = kwargs['Region']
-        destination_account_id = kwargs['AwsAccountId']
+        # a single AwsAccountId comes from operations dispatched before shares covered all accounts
+        destination_account_ids = kwargs.get('AwsAccountIds') or [kwargs['AwsAccountId']]
         backup_resource = self.get_backup_resource(backup_region, backup_id)
         
         if re_encrypt_key := RuntimeConfig.get_reencrypt_kms_key_id(backup_resource.tags, self):
@@ -870,7 +1186,7 @@ class ShelveryEngine:
         # in non lambda mode this should never happen
         if RuntimeConfig.is_offload_queueing(self):
             if not self.is_backup_available(backup_region, backup_id):
-                self.share_backup(backup_resource, destination_account_id)
+                self.share_backup(backup_resource, destination_account_ids)
         else:
             if not self.wait_backup_available(backup_region=backup_region,
                                               backup_id=backup_id,
@@ -878,46 +1194,58 @@ class ShelveryEngine:
                                               lambda_args=kwargs):
                 return
 
-        self.logger.info(f"Do share backup {backup_id} ({backup_region}) with {destination_account_id}")
+        self._share_backup_with_accounts(backup_resource, backup_region, backup_id, destination_account_ids)
+
+    def _share_backup_with_accounts(self, backup_resource, backup_region, backup_id, destination_account_ids):
+        accounts = ', '.join(destination_account_ids)
+        self.logger.info(f"Do share backup {backup_id} ({backup_region}) with {accounts}")
         try:
-            self.share_backup_with_account(backup_region, backup_id, destination_account_id)
-            backup_resource = self.get_backup_resource(backup_region, backup_id)                        
-            self._write_backup_data(
+            self.share_backup_with_accounts(backup_region, backup_id, destination_account_ids)
+            backup_resource = self.get_backup_resource(backup_region, backup_id)
+            self._write_shared_backup_data(
                 backup_resource,
                 self._get_data_bucket(backup_region),
-                destination_account_id
+                destination_account_ids
             )
-            self.snspublisher.notify({
-                'Operation': 'ShareBackup',
-                'Status': 'OK',
-                'BackupType': self.get_engine_type(),
-                'BackupName': backup_resource.name,
-                'DestinationAccount': kwargs['AwsAccountId']
-            })
-            self.report('ShareBackup', 'OK', backup_id=backup_id,
-                        backup_name=backup_resource.name,
-                        **self.backup_context(backup_resource))
+            for destination_account_id in destination_account_ids:
+                self.snspublisher.notify({
+                    'Operation': 'ShareBackup',
+                    'Status': 'OK',
+                    'BackupType': self.get_engine_type(),
+                    'BackupName': backup_resource.name,
+                    'DestinationAccount': destination_account_id
+                })
+                self.report('ShareBackup', 'OK', backup_id=backup_id,
+                            backup_name=backup_resource.name,
+                            **self.backup_context(backup_resource))
         except ClientError as e:
             if e.response['Error']['Code'] == 'InvalidDBSnapshotState':
                 # This will occasionally happen due to AWS eventual consistency model
-                self.logger.warn(f"Retrying to share backup {backup_id} ({backup_region}) with account {destination_account_id} due to exception InvalidDBSnapshotState")
-                self.share_backup(backup_resource, destination_account_id)
+                self.logger.warning(f"Retrying to share backup {backup_id} ({backup_region}) with accounts {accounts} due to exception InvalidDBSnapshotState")
+                self.share_backup(backup_resource, destination_account_ids)
+
+            elif e.response['Error']['Code'] == 'InvalidParameterValue' and len(destination_account_ids) > 1:
+                # a single account the backup can't be shared with fails the call for all of them
+                self.logger.warning(f"Attempt to share backup '{backup_id}' in ({backup_region}) with accounts {accounts} failed, sharing with each account on its own: {str(e)}")
+                for destination_account_id in destination_account_ids:
+                    self._share_backup_with_accounts(backup_resource, backup_region, backup_id, [destination_account_id])
 
             elif e.response['Error']['Code'] == 'InvalidParameterValue':
                 # Some backups may fail to be shared due to AWS limitations
-                self.logger.warn(f"Attempt to share backup '{backup_id}' in ({backup_region}) with account {destination_account_id} failed: {str(e)}")
+                self.logger.warning(f"Attempt to share backup '{backup_id}' in ({backup_region}) with account {accounts} failed: {str(e)}")
             else:
-                self.snspublisher_error.notify({
-                    'Operation': 'ShareBackup',
-                    'Status': 'ERROR',
-                    'ExceptionInfo': e.__dict__,
-                    'BackupType': self.get_engine_type(),
-                    'BackupId': backup_id,
-                    'DestinationAccount': kwargs['AwsAccountId']
-                })
                 self.logger.exception(
-                    f"Failed to share backup {backup_id} ({backup_region}) with account {destination_account_id}")
-                self.report('ShareBackup', 'ERROR', error=e, backup_id=backup_id)
+                    f"Failed to share backup {backup_id} ({backup_region}) with accounts {accounts}")
+                for destination_account_id in destination_account_ids:
+                    self.snspublisher_error.notify({
+                        'Operation': 'ShareBackup',
+                        'Status': 'ERROR',
+                        'ExceptionInfo': e.__dict__,
+                        'BackupType': self.get_engine_type(),
+                        'BackupId': backup_id,
+                        'DestinationAccount': destination_account_id
+                    })
+                    self.report('ShareBackup', 'ERROR', error=e, backup_id=backup_id)
 
     def store_backup_data(self, backup_resource: BackupResource):
         """
@@ -933,7 +1261,7 @@ class ShelveryEngine:
             'BackupRegion': backup_resource.region
         }
 
-        ShelveryInvoker().invoke_shelvery_operation(self, method, arguments)
+        self._dispatch(method, arguments, backup_resource.region, backup_resource.backup_id)
 
     @reported_action
     def do_store_backup_data(self, map_args={}, **kwargs):
@@ -976,12 +1304,13 @@ class ShelveryEngine:
     ####
 
     @abstractmethod
-    def copy_shared_backup(self, source_account: str, source_backup: BackupResource) -> str:
+    def copy_shared_backup(self, source_account: str, source_backup: BackupResource, tags: Dict = None) -> str:
         """
         Copy Shelvery backup that has been shared from another account to account where
         shelvery is currently running
         :param source_account:
         :param source_backup:
+        :param tags: tags of the copy, created with them where TAG_ON_COPY
         :return:
         """
 
@@ -1019,20 +1348,21 @@ class ShelveryEngine:
     @abstractmethod
     def backup_resource(self, backup_resource: BackupResource):
         """
-        Returns list of objects with 'date_created', 'id' and 'tags' properties
+        Create the backup. Engines that tag it in the create call set backup_resource.tagged_on_create,
+        otherwise tag_backup_resource follows
         """
         return
 
     @abstractmethod
-    def tag_backup_resource(self, backup_resource: BackupResource):
+    def tag_backup_resource(self, backup_resource: BackupResource, tags: Dict = None):
         """
-        Create backup resource tags
+        Create backup resource tags - only tags where given, all of the backup's tags otherwise
         """
 
     @abstractmethod
-    def copy_backup_to_region(self, backup_id: str, region: str) -> str:
+    def copy_backup_to_region(self, backup_id: str, region: str, tags: Dict = None) -> str:
         """
-        Copy backup to another region
+        Copy backup to another region, with the tags given where TAG_ON_COPY
         """
 
     @abstractmethod
@@ -1042,12 +1372,29 @@ class ShelveryEngine:
         to other regions and shared with other ebs accounts
         """
 
+    def get_backups_status(self, backup_region: str, backup_ids: List[str]) -> Dict[str, BackupStatus]:
+        """
+        Status of a batch of backups within region, for the AvailabilityPoller. Backups missing
+        from the result are treated as not available yet. Engines that can describe many backups
+        in one call override this, by default each backup is checked on its own.
+        """
+        return {backup_id: BackupStatus(bool(self.is_backup_available(backup_region, backup_id)))
+                for backup_id in backup_ids}
+
     @abstractmethod
     def share_backup_with_account(self, backup_region: str, backup_id: str, aws_account_id: str):
         """
         Share backup with another AWS Account
         """
 
+    def share_backup_with_accounts(self, backup_region: str, backup_id: str, aws_account_ids: List[str]):
+        """
+        Share backup with other AWS Accounts. Engines whose API takes many accounts at once
+        override this, by default the backup is shared with each account on its own.
+        """
+        for aws_account_id in aws_account_ids:
+            self.share_backup_with_account(backup_region, backup_id, aws_account_id)
+
     @abstractmethod
     def get_backup_resource(self, backup_region: str, backup_id: str) -> BackupResource:
         """
@@ -8,6 +8,9 @@ from shelvery.documentdb_backup import ShelveryDocumentDbBackup
 
 class ShelveryFactory:
 
+    # everything `shelvery all` runs
+    BACKUP_TYPES = ['ebs', 'ec2ami', 'rds', 'rds_cluster', 'docdb', 'redshift']
+
     @classmethod
     def get_shelvery_instance(cls, type: str) -> ShelveryEngine:
         if type == 'ebs':
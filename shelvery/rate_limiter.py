@@ -0,0 +1,197 @@
+"""Client side rate limiting of AWS api calls.
+
+botocore's retries are the only other protection against throttling, and with many
+threads calling the same api they pile up: every throttled call is retried into an api
+that is already over its limit. Instead every attempt first takes a token from the bucket
+of its (service, region, account, operation class), shared by all clients and threads in
+the process. Each bucket adapts its rate AIMD style - halved when a call is throttled,
+raised a little with every call that goes through - so it settles just under the limit
+AWS actually enforces.
+
+Only the services with tight control plane limits, EC2 and the RDS family, are limited by
+default. Any other service - SNS, STS, Redshift - is only limited when configured with
+shelvery_rate_limits. S3 is never limited: the data bucket is written through boto3
+resources rather than AwsHelper clients, and S3 takes thousands of requests a second
+per prefix anyway.
+"""
+
+import threading
+import time
+
+from shelvery.backup_report import current_run_report
+
+# error codes AWS services use to say a call was throttled
+THROTTLING_ERROR_CODES = {
+    'Throttling',
+    'ThrottlingException',
+    'ThrottledException',
+    'RequestLimitExceeded',
+    'RequestThrottled',
+    'RequestThrottledException',
+    'TooManyRequestsException',
+    'SlowDown',
+}
+
+READ = 'read'
+WRITE = 'write'
+TAG = 'tag'
+
+# tagging calls are frequent and cheap, and EC2 limits them apart from other mutating calls
+TAG_OPERATIONS = {'CreateTags', 'DeleteTags', 'AddTagsToResource', 'RemoveTagsFromResource', 'TagResource',
+                  'UntagResource', 'CreateTagsForResource'}
+
+
+def operation_class(operation_name):
+    if operation_name in TAG_OPERATIONS:
+        return TAG
+    if operation_name.startswith(('Describe', 'List', 'Get', 'Head')):
+        return READ
+    return WRITE
+
+
+class TokenBucket:
+    """Hands out tokens at an adaptive rate, for api calls of one operation class."""
+
+    # a throttle halves the rate, but only once a second - a burst of throttles is usually
+    # the same overload, answered for every call that was already in flight
+    DECREASE_FACTOR = 0.5
+    DECREASE_INTERVAL = 1.0
+
+    # calls per second the rate recovers by, per second of calls going through
+    INCREASE = 0.5
+
+    # calls per second, the rate never drops below this
+    MIN_RATE = 0.2
+
+    def __init__(self, rate, burst):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.throttles = 0
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._decreased = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take a token, waiting for it if there is none. Returns the seconds waited."""
+        with self._lock:
+            self._refill(time.monotonic())
+            # tokens may go negative: each waiter reserves its own, so they go in order
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def succeeded(self):
+        with self._lock:
+            # rate calls a second, each adding INCREASE / rate, raise it by INCREASE a second
+            self.rate = min(self.max_rate, self.rate + self.INCREASE / self.rate)
+
+    def throttled(self):
+        with self._lock:
+            self.throttles += 1
+            now = time.monotonic()
+            if now - self._decreased < self.DECREASE_INTERVAL:
+                return
+            self._refill(now)
+            self._decreased = now
+            self.rate = max(self.MIN_RATE, self.rate * self.DECREASE_FACTOR)
+            # whatever was saved up is what just got throttled
+            self._tokens = min(self._tokens, 0)
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class RateLimiter:
+    """The token buckets of the process, and the botocore event handlers drawing on them."""
+
+    # calls per second and burst, per service and operation class. EC2's own request token
+    # buckets are the starting point, RDS and DocumentDb (on the RDS control plane) throttle at
+    # similar rates. Services not listed here are not limited
+    DEFAULT_LIMITS = {
+        'ec2': {READ: (20, 100), WRITE: (5, 50), TAG: (10, 50)},
+        'rds': {READ: (20, 100), WRITE: (5, 50), TAG: (10, 50)},
+        'docdb': {READ: (20, 100), WRITE: (5, 50), TAG: (10, 50)},
+    }
+
+    # seconds worth of calls a configured service can burst
+    CONFIGURED_BURST_SECONDS = 5
+
+    _buckets = {}
+    _buckets_lock = threading.Lock()
+
+    @classmethod
+    def service_limits(cls, service, configured=None):
+        """Calls per second and burst per operation class of service, None if it is not limited.
+        configured maps services to the calls per second of each of their operation classes,
+        and takes precedence over the defaults
+        """
+        if configured and service in configured:
+            rate = configured[service]
+            return {op_class: (rate, rate * cls.CONFIGURED_BURST_SECONDS) for op_class in (READ, WRITE, TAG)}
+        return cls.DEFAULT_LIMITS.get(service)
+
+    @classmethod
+    def attach(cls, client, account=None, scale=1.0, configured=None):
+        """Rate limit every call the client makes, if its service is limited at all. account tells
+        apart clients acting on other accounts, whose limits are their own. scale multiplies the
+        limits, see service_limits for configured.
+        """
+        service = client.meta.service_model.service_name
+        region = client.meta.region_name
+        limits = cls.service_limits(service, configured)
+        if limits is None:
+            return client
+
+        def before_send(event_name, **kwargs):
+            operation = event_name.split('.')[-1]
+            cls.bucket(service, region, account, operation_class(operation), scale, limits).acquire()
+
+        def needs_retry(response, operation, **kwargs):
+            if response is None:
+                return None
+            http_response, parsed = response
+            bucket = cls.bucket(service, region, account, operation_class(operation.name), scale, limits)
+            error_code = parsed.get('Error', {}).get('Code') if isinstance(parsed, dict) else None
+            if error_code in THROTTLING_ERROR_CODES:
+                bucket.throttled()
+                report = current_run_report.get()
+                if report is not None:
+                    report.throttled(f"{service}:{operation_class(operation.name)}")
+            elif http_response.status_code < 400:
+                bucket.succeeded()
+            # never decides on a retry itself, that is left to botocore
+            return None
+
+        client.meta.events.register('before-send', before_send, unique_id='shelvery-rate-limiter-before-send')
+        client.meta.events.register('needs-retry', needs_retry, unique_id='shelvery-rate-limiter-needs-retry')
+        return client
+
+    @classmethod
+    def bucket(cls, service, region, account, op_class, scale=1.0, limits=None):
+        key = (service, region, account, op_class)
+        with cls._buckets_lock:
+            if key not in cls._buckets:
+                rate, burst = (limits or cls.DEFAULT_LIMITS[service])[op_class]
+                cls._buckets[key] = TokenBucket(rate * scale, max(1, burst * scale))
+            return cls._buckets[key]
+
+    @classmethod
+    def throttle_counts(cls):
+        """Throttled calls so far, per service, region and operation class"""
+        counts = {}
+        with cls._buckets_lock:
+            for (service, region, _, op_class), bucket in cls._buckets.items():
+                if bucket.throttles:
+                    key = f"{service}:{region}:{op_class}"
+                    counts[key] = counts.get(key, 0) + bucket.throttles
+        return counts
+
+    @classmethod
+    def clear(cls):
+        with cls._buckets_lock:
+            cls._buckets.clear()
@@ -8,13 +8,34 @@ from shelvery.entity_resource import EntityResource
 from typing import Dict, List
 from botocore.errorfactory import ClientError
 from shelvery.aws_helper import AwsHelper
+from shelvery.availability_poller import BackupStatus
 
 class ShelveryRDSBackup(ShelveryEngine):
+
+    CLEAN_DELETE_CONCURRENCY = 4
+
+    # RDS allows 20 snapshot copies in progress per destination region
+    COPY_CONCURRENCY = 20
+
+    TAG_ON_COPY = True
+
     def is_backup_available(self, backup_region: str, backup_id: str) -> bool:
         rds_client = AwsHelper.boto3_client('rds', region_name=backup_region, arn=self.role_arn, external_id=self.role_external_id)
         snapshots = rds_client.describe_db_snapshots(DBSnapshotIdentifier=backup_id)
         return snapshots['DBSnapshots'][0]['Status'] == 'available'
 
+    def get_backups_status(self, backup_region: str, backup_ids: List[str]) -> Dict[str, BackupStatus]:
+        rds_client = AwsHelper.boto3_client('rds', region_name=backup_region, arn=self.role_arn, external_id=self.role_external_id)
+        snapshots = AwsHelper.paginate(rds_client, 'describe_db_snapshots', 'DBSnapshots',
+                                       Filters=[{'Name': 'db-snapshot-id', 'Values': backup_ids}])
+        return {snap['DBSnapshotIdentifier']: BackupStatus(
+                    available=snap['Status'] == 'available',
+                    progress=snap.get('PercentProgress'),
+                    size=snap.get('AllocatedStorage'),
+                    started=snap.get('SnapshotCreateTime'),
+                    entity_id=snap.get('DBInstanceIdentifier'))
+                for snap in snapshots}
+
     def get_resource_type(self) -> str:
         return 'RDS Instance'
 
@@ -50,36 +71,39 @@ class ShelveryRDSBackup(ShelveryEngine):
         response = rds_client.copy_db_snapshot(
             SourceDBSnapshotIdentifier=automated_snapshot_id,
             TargetDBSnapshotIdentifier=backup_resource.name,
-            CopyTags=False
+            CopyTags=False,
+            Tags=AwsHelper.rds_tags(backup_resource.tags)
         )
         backup_resource.resource_properties = response['DBSnapshot']
         backup_resource.backup_id = backup_resource.name
+        backup_resource.tagged_on_create = True
         return backup_resource
 
     def backup_from_instance(self, backup_resource):
         rds_client = AwsHelper.boto3_client('rds', arn=self.role_arn, external_id=self.role_external_id)
         response = rds_client.create_db_snapshot(
             DBSnapshotIdentifier=backup_resource.name,
-            DBInstanceIdentifier=backup_resource.entity_id
+            DBInstanceIdentifier=backup_resource.entity_id,
+            Tags=AwsHelper.rds_tags(backup_resource.tags)
         )
         backup_resource.resource_properties = response['DBSnapshot']
         backup_resource.backup_id = backup_resource.name
+        backup_resource.tagged_on_create = True
         return backup_resource
 
     def delete_backup(self, backup_resource: BackupResource):
-        rds_client = AwsHelper.boto3_client('rds', arn=self.role_arn)
+        rds_client = AwsHelper.boto3_client('rds', arn=self.role_arn, external_id=self.role_external_id)
         rds_client.delete_db_snapshot(
             DBSnapshotIdentifier=backup_resource.backup_id
         )
 
-    def tag_backup_resource(self, backup_resource: BackupResource):
+    def tag_backup_resource(self, backup_resource: BackupResource, tags: Dict = None):
         regional_rds_client = AwsHelper.boto3_client('rds', region_name=backup_resource.region, arn=self.role_arn, external_id=self.role_external_id)
         snapshots = regional_rds_client.describe_db_snapshots(DBSnapshotIdentifier=backup_resource.backup_id)
         snapshot_arn = snapshots['DBSnapshots'][0]['DBSnapshotArn']
         regional_rds_client.add_tags_to_resource(
             ResourceName=snapshot_arn,
-            Tags=list(
-                map(lambda k: {'Key': k, 'Value': backup_resource.tags[k].replace(',', ' ')}, backup_resource.tags))
+            Tags=AwsHelper.rds_tags(backup_resource.tags if tags is None else tags)
         )
 
     def get_existing_backups(self, backup_tag_prefix: str) -> List[BackupResource]:
@@ -88,20 +112,26 @@ class ShelveryRDSBackup(ShelveryEngine):
         # collect all snapshots
         all_snapshots = self.collect_all_snapshots(rds_client)
 
-        # filter ones backed up with shelvery
+        # filter ones backed up with shelvery, on the tags already in the describe response
         all_backups = self.get_shelvery_backups_only(all_snapshots, backup_tag_prefix, rds_client)
 
+        # and only then look up the instances those came from
+        self.populate_backup_entity_resource(all_backups, rds_client)
+
         return all_backups
 
     def share_backup_with_account(self, backup_region: str, backup_id: str, aws_account_id: str):
+        self.share_backup_with_accounts(backup_region, backup_id, [aws_account_id])
+
+    def share_backup_with_accounts(self, backup_region: str, backup_id: str, aws_account_ids: List[str]):
         rds_client = AwsHelper.boto3_client('rds', region_name=backup_region, arn=self.role_arn, external_id=self.role_external_id)
         rds_client.modify_db_snapshot_attribute(
             DBSnapshotIdentifier=backup_id,
             AttributeName='restore',
-            ValuesToAdd=[aws_account_id]
+            ValuesToAdd=list(aws_account_ids)
         )
 
-    def copy_backup_to_region(self, backup_id: str, region: str) -> str:
+    def copy_backup_to_region(self, backup_id: str, region: str, tags: Dict = None) -> str:
         local_region = boto3.session.Session().region_name
         client_local = AwsHelper.boto3_client('rds', arn=self.role_arn, external_id=self.role_external_id)
         rds_client = AwsHelper.boto3_client('rds', region_name=region, arn=self.role_arn, external_id=self.role_external_id)
@@ -111,8 +141,9 @@ class ShelveryRDSBackup(ShelveryEngine):
             SourceDBSnapshotIdentifier=snapshot['DBSnapshotArn'],
             TargetDBSnapshotIdentifier=backup_id,
             SourceRegion=local_region,
-            # tags are created explicitly
-            CopyTags=False
+            # tags are those of the source, with the dr copy metadata added
+            CopyTags=False,
+            Tags=AwsHelper.rds_tags(tags or {})
         )
         return backup_id
     
@@ -155,7 +186,7 @@ class ShelveryRDSBackup(ShelveryEngine):
         snapshot = snapshots['DBSnapshots'][0]
         tags = snapshot.get('TagList', [])
         d_tags = dict(map(lambda t: (t['Key'], t['Value']), tags))
-        resource = BackupResource.construct(d_tags['shelvery:tag_name'], backup_id, d_tags)
+        resource = BackupResource.construct(d_tags['shelvery:tag_name'], backup_id, d_tags, self.account_id)
         resource.resource_properties = snapshot
         return resource
 
@@ -198,17 +229,7 @@ class ShelveryRDSBackup(ShelveryEngine):
         :param rds_client: boto3 rds service
         :return: all RDS instances within region for given boto3 client
         """
-        # list of resource models
-        db_instances = []
-        # temporary list of api models, as calls are batched
-        temp_instances = rds_client.describe_db_instances()
-        db_instances.extend(temp_instances['DBInstances'])
-        # collect database instances
-        while 'Marker' in temp_instances:
-            temp_instances = rds_client.describe_db_instances(Marker=temp_instances['Marker'])
-            db_instances.extend(temp_instances['DBInstances'])
-
-        return db_instances
+        return list(AwsHelper.paginate(rds_client, 'describe_db_instances', 'DBInstances', page_size=100))
 
     def get_shelvery_backups_only(self, all_snapshots, backup_tag_prefix, rds_client):
         """
@@ -228,23 +249,23 @@ class ShelveryRDSBackup(ShelveryEngine):
 
             if marker_tag in d_tags:
                 if d_tags[marker_tag] in SHELVERY_DO_BACKUP_TAGS:
-                    backup_resource = BackupResource.construct(backup_tag_prefix, snap['DBSnapshotIdentifier'], d_tags)
-                    backup_resource.entity_resource = snap['EntityResource']
-                    backup_resource.entity_id = snap['EntityResource'].resource_id
+                    backup_resource = BackupResource.construct(backup_tag_prefix, snap['DBSnapshotIdentifier'], d_tags,
+                                                               self.account_id)
+                    backup_resource.entity_id = snap['DBInstanceIdentifier']
 
                     all_backups.append(backup_resource)
 
         return all_backups
 
-    def copy_shared_backup(self, source_account: str, source_backup: BackupResource):
+    def copy_shared_backup(self, source_account: str, source_backup: BackupResource, tags: Dict = None):
         rds_client = AwsHelper.boto3_client('rds', arn=self.role_arn, external_id=self.role_external_id)
-        # copying of tags happens outside this method
         source_arn = f"arn:aws:rds:{source_backup.region}:{source_backup.account_id}:snapshot:{source_backup.backup_id}"
 
         params = {
             'SourceDBSnapshotIdentifier': source_arn,
             'SourceRegion': source_backup.region,
             'CopyTags': False,
+            'Tags': AwsHelper.rds_tags(tags or {}),
             'TargetDBSnapshotIdentifier': source_backup.backup_id
         }
 
@@ -275,46 +296,34 @@ class ShelveryRDSBackup(ShelveryEngine):
     def collect_all_snapshots(self, rds_client):
         """
         :param rds_client:
-        :return: All snapshots within region for rds_client
+        :return: All snapshots within region for rds_client, yielded as they are paged in
         """
-        all_snapshots = []
-        tmp_snapshots = rds_client.describe_db_snapshots(SnapshotType='manual')
-        all_snapshots.extend(tmp_snapshots['DBSnapshots'])
-        while 'Marker' in tmp_snapshots:
-            tmp_snapshots = rds_client.describe_db_snapshots(Marker=tmp_snapshots['Marker'])
-            all_snapshots.extend(tmp_snapshots['DBSnapshots'])
-
-        self.populate_snap_entity_resource(all_snapshots)
+        return AwsHelper.paginate(rds_client, 'describe_db_snapshots', 'DBSnapshots',
+                                  page_size=100, SnapshotType='manual')
 
-        return all_snapshots
+    def populate_backup_entity_resource(self, backups, rds_client):
+        """
+        Attach the source instance to each backup, out of a single scan of all instances in
+        the region indexed by identifier. Instances that no longer exist resolve to an empty entity
+        """
+        if not backups:
+            return
 
-    def populate_snap_entity_resource(self, all_snapshots):
-        instance_ids = []
-        for snap in all_snapshots:
-            if snap['DBInstanceIdentifier'] not in instance_ids:
-                instance_ids.append(snap['DBInstanceIdentifier'])
-        entities = {}
-        rds_client = AwsHelper.boto3_client('rds', arn=self.role_arn, external_id=self.role_external_id)
         local_region = boto3.session.Session().region_name
+        instances = dict(map(lambda i: (i['DBInstanceIdentifier'], i), self.get_all_instances(rds_client)))
 
-        for instance_id in instance_ids:
-            try:
-                rds_instance = rds_client.describe_db_instances(DBInstanceIdentifier=instance_id)['DBInstances'][0]
-                tags = rds_client.list_tags_for_resource(ResourceName=rds_instance['DBInstanceArn']).get('TagList', [])
-                d_tags = dict(map(lambda t: (t['Key'], t['Value']), tags))
-                d_tags = dict(map(lambda t: (t['Key'], t['Value']), tags))
-                rds_entity = EntityResource(instance_id,
-                                            local_region,
-                                            rds_instance['InstanceCreateTime'],
-                                            d_tags)
-                entities[instance_id] = rds_entity
-            except ClientError as e:
-                if 'DBInstanceNotFoundFault' in str(type(e)):
+        entities = {}
+        for backup in backups:
+            instance_id = backup.entity_id
+            if instance_id not in entities:
+                if instance_id in instances:
+                    rds_instance = instances[instance_id]
+                    d_tags = dict(map(lambda t: (t['Key'], t['Value']), rds_instance.get('TagList', [])))
+                    entities[instance_id] = EntityResource(instance_id,
+                                                           local_region,
+                                                           rds_instance['InstanceCreateTime'],
+                                                           d_tags)
+                else:
                     entities[instance_id] = EntityResource.empty()
                     entities[instance_id].resource_id = instance_id
-                else:
-                    raise e
-
-        for snap in all_snapshots:
-            if snap['DBInstanceIdentifier'] in entities:
-                snap['EntityResource'] = entities[snap['DBInstanceIdentifier']]
+            backup.entity_resource = entities[instance_id]
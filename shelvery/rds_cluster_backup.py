@@ -8,13 +8,34 @@ from shelvery.entity_resource import EntityResource
 from typing import Dict, List
 from botocore.errorfactory import ClientError
 from shelvery.aws_helper import AwsHelper
+from shelvery.availability_poller import BackupStatus
 
 class ShelveryRDSClusterBackup(ShelveryEngine):
+
+    CLEAN_DELETE_CONCURRENCY = 4
+
+    # RDS allows 20 snapshot copies in progress per destination region
+    COPY_CONCURRENCY = 20
+
+    TAG_ON_COPY = True
+
     def is_backup_available(self, backup_region: str, backup_id: str) -> bool:
         rds_client = AwsHelper.boto3_client('rds', region_name=backup_region, arn=self.role_arn, external_id=self.role_external_id)
         snapshots = rds_client.describe_db_cluster_snapshots(DBClusterSnapshotIdentifier=backup_id)
         return snapshots['DBClusterSnapshots'][0]['Status'] == 'available'
 
+    def get_backups_status(self, backup_region: str, backup_ids: List[str]) -> Dict[str, BackupStatus]:
+        rds_client = AwsHelper.boto3_client('rds', region_name=backup_region, arn=self.role_arn, external_id=self.role_external_id)
+        snapshots = AwsHelper.paginate(rds_client, 'describe_db_cluster_snapshots', 'DBClusterSnapshots',
+                                       Filters=[{'Name': 'db-cluster-snapshot-id', 'Values': backup_ids}])
+        return {snap['DBClusterSnapshotIdentifier']: BackupStatus(
+                    available=snap['Status'] == 'available',
+                    progress=snap.get('PercentProgress'),
+                    # no size, cluster snapshots report an AllocatedStorage of 1 whatever their size
+                    started=snap.get('SnapshotCreateTime'),
+                    entity_id=snap.get('DBClusterIdentifier'))
+                for snap in snapshots}
+
     def get_resource_type(self) -> str:
         return 'RDS Cluster'
 
@@ -50,20 +71,24 @@ class ShelveryRDSClusterBackup(ShelveryEngine):
         response = rds_client.copy_db_cluster_snapshot(
             SourceDBClusterSnapshotIdentifier=automated_snapshot_id,
             TargetDBClusterSnapshotIdentifier=backup_resource.name,
-            CopyTags=False
+            CopyTags=False,
+            Tags=AwsHelper.rds_tags(backup_resource.tags)
         )
         backup_resource.resource_properties = response['DBClusterSnapshot']
         backup_resource.backup_id = backup_resource.name
+        backup_resource.tagged_on_create = True
         return backup_resource
 
     def backup_from_cluster(self, backup_resource):
         rds_client = AwsHelper.boto3_client('rds', arn=self.role_arn, external_id=self.role_external_id)
         response = rds_client.create_db_cluster_snapshot(
             DBClusterSnapshotIdentifier=backup_resource.name,
-            DBClusterIdentifier=backup_resource.entity_id
+            DBClusterIdentifier=backup_resource.entity_id,
+            Tags=AwsHelper.rds_tags(backup_resource.tags)
         )
         backup_resource.resource_properties = response['DBClusterSnapshot']
         backup_resource.backup_id = backup_resource.name
+        backup_resource.tagged_on_create = True
         return backup_resource
 
     def delete_backup(self, backup_resource: BackupResource):
@@ -72,15 +97,14 @@ class ShelveryRDSClusterBackup(ShelveryEngine):
             DBClusterSnapshotIdentifier=backup_resource.backup_id
         )
 
-    def tag_backup_resource(self, backup_resource: BackupResource):
+    def tag_backup_resource(self, backup_resource: BackupResource, tags: Dict = None):
         regional_rds_client = AwsHelper.boto3_client('rds', region_name=backup_resource.region, arn=self.role_arn, external_id=self.role_external_id)
         snapshots = regional_rds_client.describe_db_cluster_snapshots(
             DBClusterSnapshotIdentifier=backup_resource.backup_id)
         snapshot_arn = snapshots['DBClusterSnapshots'][0]['DBClusterSnapshotArn']
-        tags = list(map(lambda k: {'Key': k, 'Value': backup_resource.tags[k].replace(',', ' ')}, backup_resource.tags))
         regional_rds_client.add_tags_to_resource(
             ResourceName=snapshot_arn,
-            Tags=tags
+            Tags=AwsHelper.rds_tags(backup_resource.tags if tags is None else tags)
         )
 
     def get_existing_backups(self, backup_tag_prefix: str) -> List[BackupResource]:
@@ -89,31 +113,38 @@ class ShelveryRDSClusterBackup(ShelveryEngine):
         # collect all snapshots
         all_snapshots = self.collect_all_snapshots(rds_client)
 
-        # filter ones backed up with shelvery
+        # filter ones backed up with shelvery, on the tags already in the describe response
         all_backups = self.get_shelvery_backups_only(all_snapshots, backup_tag_prefix, rds_client)
 
+        # and only then look up the clusters those came from
+        self.populate_backup_entity_resource(all_backups, rds_client)
+
         return all_backups
 
     def share_backup_with_account(self, backup_region: str, backup_id: str, aws_account_id: str):
+        self.share_backup_with_accounts(backup_region, backup_id, [aws_account_id])
+
+    def share_backup_with_accounts(self, backup_region: str, backup_id: str, aws_account_ids: List[str]):
         rds_client = AwsHelper.boto3_client('rds', region_name=backup_region, arn=self.role_arn, external_id=self.role_external_id)
         rds_client.modify_db_cluster_snapshot_attribute(
             DBClusterSnapshotIdentifier=backup_id,
             AttributeName='restore',
-            ValuesToAdd=[aws_account_id]
+            ValuesToAdd=list(aws_account_ids)
         )
 
-    def copy_backup_to_region(self, backup_id: str, region: str) -> str:
+    def copy_backup_to_region(self, backup_id: str, region: str, tags: Dict = None) -> str:
         local_region = boto3.session.Session().region_name
         client_local = AwsHelper.boto3_client('rds', arn=self.role_arn, external_id=self.role_external_id)
-        rds_client = AwsHelper.boto3_client('rds', region_name=region)
+        rds_client = AwsHelper.boto3_client('rds', region_name=region, arn=self.role_arn, external_id=self.role_external_id)
         snapshots = client_local.describe_db_cluster_snapshots(DBClusterSnapshotIdentifier=backup_id)
         snapshot = snapshots['DBClusterSnapshots'][0]
         rds_client.copy_db_cluster_snapshot(
             SourceDBClusterSnapshotIdentifier=snapshot['DBClusterSnapshotArn'],
             TargetDBClusterSnapshotIdentifier=backup_id,
             SourceRegion=local_region,
-            # tags are created explicitly
-            CopyTags=False
+            # tags are those of the source, with the dr copy metadata added
+            CopyTags=False,
+            Tags=AwsHelper.rds_tags(tags or {})
         )
         return backup_id
     
@@ -132,7 +163,7 @@ class ShelveryRDSClusterBackup(ShelveryEngine):
     def create_encrypted_backup(self, backup_id: str, kms_key: str, region: str) -> str:
         local_region = boto3.session.Session().region_name
         client_local = AwsHelper.boto3_client('rds', arn=self.role_arn, external_id=self.role_external_id)
-        rds_client = AwsHelper.boto3_client('rds', region_name=region)
+        rds_client = AwsHelper.boto3_client('rds', region_name=region, arn=self.role_arn, external_id=self.role_external_id)
         snapshots = client_local.describe_db_cluster_snapshots(DBClusterSnapshotIdentifier=backup_id)
         snapshot = snapshots['DBClusterSnapshots'][0]
         backup_id = f'{backup_id}-re-encrypted'
@@ -151,15 +182,15 @@ class ShelveryRDSClusterBackup(ShelveryEngine):
         rds_client.copy_db_cluster_snapshot(**rds_client_params)
         return backup_id
 
-    def copy_shared_backup(self, source_account: str, source_backup: BackupResource):
+    def copy_shared_backup(self, source_account: str, source_backup: BackupResource, tags: Dict = None):
         rds_client = AwsHelper.boto3_client('rds', arn=self.role_arn, external_id=self.role_external_id)
-        # copying of tags happens outside this method
         source_arn = f"arn:aws:rds:{source_backup.region}:{source_backup.account_id}:cluster-snapshot:{source_backup.backup_id}"
 
         params = {
             'SourceDBClusterSnapshotIdentifier': source_arn,
             'SourceRegion': source_backup.region,
             'CopyTags': False,
+            'Tags': AwsHelper.rds_tags(tags or {}),
             'TargetDBClusterSnapshotIdentifier': source_backup.backup_id
         }
 
@@ -192,7 +223,7 @@ class ShelveryRDSClusterBackup(ShelveryEngine):
         snapshot = snapshots['DBClusterSnapshots'][0]
         tags = snapshot.get('TagList', [])
         d_tags = dict(map(lambda t: (t['Key'], t['Value']), tags))
-        resource = BackupResource.construct(d_tags['shelvery:tag_name'], backup_id, d_tags)
+        resource = BackupResource.construct(d_tags['shelvery:tag_name'], backup_id, d_tags, self.account_id)
         resource.resource_properties = snapshot
         return resource
 
@@ -233,16 +264,7 @@ class ShelveryRDSClusterBackup(ShelveryEngine):
         :param rds_client: boto3 rds service
         :return: all RDS instances within region for given boto3 client
         """
-        # list of resource models
-        db_clusters = []
-        # temporary list of api models, as calls are batched
-        temp_clusters = rds_client.describe_db_clusters()
-        db_clusters.extend(temp_clusters['DBClusters'])
-        # collect database instances
-        while 'Marker' in temp_clusters:
-            temp_clusters = rds_client.describe_db_clusters(Marker=temp_clusters['Marker'])
-            db_clusters.extend(temp_clusters['DBClusters'])
-
+        db_clusters = AwsHelper.paginate(rds_client, 'describe_db_clusters', 'DBClusters', page_size=100)
         db_clusters = [cluster for cluster in db_clusters if cluster.get('Engine') != 'docdb']
         return db_clusters
 
@@ -262,9 +284,8 @@ class ShelveryRDSClusterBackup(ShelveryEngine):
             if marker_tag in d_tags:
                 if d_tags[marker_tag] in SHELVERY_DO_BACKUP_TAGS:
                     backup_resource = BackupResource.construct(backup_tag_prefix, snap['DBClusterSnapshotIdentifier'],
-                                                               d_tags)
-                    backup_resource.entity_resource = snap['EntityResource']
-                    backup_resource.entity_id = snap['EntityResource'].resource_id
+                                                               d_tags, self.account_id)
+                    backup_resource.entity_id = snap['DBClusterIdentifier']
 
                     all_backups.append(backup_resource)
 
@@ -273,54 +294,36 @@ class ShelveryRDSClusterBackup(ShelveryEngine):
     def collect_all_snapshots(self, rds_client):
         """
         :param rds_client:
-        :return: All snapshots within region for rds_client
+        :return: All snapshots within region for rds_client, yielded as they are paged in
         """
-        all_snapshots = []
-
         self.logger.info("Collecting DB cluster snapshots...")
-        tmp_snapshots = rds_client.describe_db_cluster_snapshots(SnapshotType='manual')
-        all_snapshots.extend(tmp_snapshots['DBClusterSnapshots'])
-
-        while 'Marker' in tmp_snapshots:
-            self.logger.info(f"Collected {len(tmp_snapshots['DBClusterSnapshots'])} manual snapshots. Continuing collection...")
-            tmp_snapshots = rds_client.describe_db_cluster_snapshots(SnapshotType='manual', Marker=tmp_snapshots['Marker'])
-            all_snapshots.extend(tmp_snapshots['DBClusterSnapshots'])
-
-        all_snapshots = [snapshot for snapshot in all_snapshots if snapshot.get('Engine') != 'docdb']
-        self.logger.info(f"Collected {len(all_snapshots)} manual snapshots.")
-        self.populate_snap_entity_resource(all_snapshots)
+        all_snapshots = AwsHelper.paginate(rds_client, 'describe_db_cluster_snapshots', 'DBClusterSnapshots',
+                                           page_size=100, SnapshotType='manual')
+        return (snapshot for snapshot in all_snapshots if snapshot.get('Engine') != 'docdb')
 
-        return all_snapshots
-
-    def populate_snap_entity_resource(self, all_snapshots):
-        cluster_ids = []
-
-        for snap in all_snapshots:
-            if snap['DBClusterIdentifier'] not in cluster_ids:
-                cluster_ids.append(snap['DBClusterIdentifier'])
+    def populate_backup_entity_resource(self, backups, rds_client):
+        """
+        Attach the source cluster to each backup, out of a single scan of all clusters in
+        the region indexed by identifier. Clusters that no longer exist resolve to an empty entity
+        """
+        if not backups:
+            return
 
-        entities = {}
-        rds_client = AwsHelper.boto3_client('rds', arn=self.role_arn, external_id=self.role_external_id)
         local_region = boto3.session.Session().region_name
+        clusters = dict(map(lambda c: (c['DBClusterIdentifier'], c), self.get_all_clusters(rds_client)))
 
-        for cluster_id in cluster_ids:
-            try:
-                self.logger.info(f"Collecting tags from DB cluster {cluster_id} ...")
-                rds_instance = rds_client.describe_db_clusters(DBClusterIdentifier=cluster_id)['DBClusters'][0]
-                tags = rds_instance.get('TagList', []) 
-                d_tags = dict(map(lambda t: (t['Key'], t['Value']), tags))
-                rds_entity = EntityResource(cluster_id,
-                                            local_region,
-                                            rds_instance['ClusterCreateTime'],
-                                            d_tags)
-                entities[cluster_id] = rds_entity
-            except ClientError as e:
-                if 'DBClusterNotFoundFault' in str(type(e)):
+        entities = {}
+        for backup in backups:
+            cluster_id = backup.entity_id
+            if cluster_id not in entities:
+                if cluster_id in clusters:
+                    rds_cluster = clusters[cluster_id]
+                    d_tags = dict(map(lambda t: (t['Key'], t['Value']), rds_cluster.get('TagList', [])))
+                    entities[cluster_id] = EntityResource(cluster_id,
+                                                          local_region,
+                                                          rds_cluster['ClusterCreateTime'],
+                                                          d_tags)
+                else:
                     entities[cluster_id] = EntityResource.empty()
                     entities[cluster_id].resource_id = cluster_id
-                else:
-                    raise e
-
-        for snap in all_snapshots:
-            if snap['DBClusterIdentifier'] in entities:
-                snap['EntityResource'] = entities[snap['DBClusterIdentifier']]
+            backup.entity_resource = entities[cluster_id]
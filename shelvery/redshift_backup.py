@@ -1,7 +1,7 @@
 import boto3, datetime
 from botocore.exceptions import ClientError
 
-from typing import List
+from typing import Dict, List
 
 from shelvery.engine import SHELVERY_DO_BACKUP_TAGS
 from shelvery.engine import ShelveryEngine
@@ -12,6 +12,9 @@ from shelvery.backup_resource import BackupResource
 from shelvery.aws_helper import AwsHelper
 
 class ShelveryRedshiftBackup(ShelveryEngine):
+
+	CLEAN_DELETE_CONCURRENCY = 4
+
 	def __init__(self):
 		ShelveryEngine.__init__(self)
 		self.redshift_client = AwsHelper.boto3_client('redshift', arn=self.role_arn, external_id=self.role_external_id)
@@ -74,13 +77,11 @@ class ShelveryRedshiftBackup(ShelveryEngine):
 		"""
 		local_region = boto3.session.Session().region_name
 		marker_tag = f"{backup_tag_prefix}:{BackupResource.BACKUP_MARKER_TAG}"
-		response = self.redshift_client.describe_cluster_snapshots(
-            SnapshotType='manual',
-            TagKeys=[marker_tag],
-            TagValues=SHELVERY_DO_BACKUP_TAGS
-        )
-
-		snapshots = response['Snapshots']
+		snapshots = AwsHelper.paginate(self.redshift_client, 'describe_cluster_snapshots', 'Snapshots',
+									   page_size=100,
+									   SnapshotType='manual',
+									   TagKeys=[marker_tag],
+									   TagValues=SHELVERY_DO_BACKUP_TAGS)
 		backups = []
 
 		for snap in snapshots:
@@ -96,7 +97,8 @@ class ShelveryRedshiftBackup(ShelveryEngine):
 			backup_resource = BackupResource.construct(
                 backup_tag_prefix,
 				backup_id,
-                d_tags
+                d_tags,
+				self.account_id
             )
 			backup_resource.entity_resource = redshift_entity
 			backup_resource.entity_id = redshift_entity.resource_id
@@ -131,20 +133,10 @@ class ShelveryRedshiftBackup(ShelveryEngine):
 
 	# collect all clusters tagged with given tag, in paginated manner
 	def collect_clusters(self, tag_name: str):
-		load_clusters = True
-		next_token = ''
-		all_clusters = []
-
-		while load_clusters:
-			tagged_clusters = self.redshift_client.describe_clusters(TagKeys=[tag_name], TagValues=SHELVERY_DO_BACKUP_TAGS)
-			all_clusters = all_clusters + tagged_clusters['Clusters']
-			if 'Marker' in tagged_clusters and len(tagged_clusters['Marker']) > 0:
-				load_clusters = True
-				next_token = tagged_clusters['Marker']
-			else:
-				load_clusters = False
-
-		return all_clusters
+		return AwsHelper.paginate(self.redshift_client, 'describe_clusters', 'Clusters',
+								  page_size=100,
+								  TagKeys=[tag_name],
+								  TagValues=SHELVERY_DO_BACKUP_TAGS)
 
 	def backup_resource(self, backup_resource: BackupResource) -> BackupResource:
 		"""Redshift supports two modes of snapshot functions: a regular cluster snapshot and copying an existing snapshot to a different region.
@@ -163,9 +155,11 @@ class ShelveryRedshiftBackup(ShelveryEngine):
 		snapshot = self.redshift_client.create_cluster_snapshot(
 			SnapshotIdentifier=backup_resource.name,
 			ClusterIdentifier=backup_resource.entity_id,
+			Tags=backup_resource.boto3_tags
 		)['Snapshot']
 		backup_resource.backup_id = f"arn:aws:redshift:{backup_resource.region}:{backup_resource.account_id}"
 		backup_resource.backup_id = f"{backup_resource.backup_id}:snapshot:{snapshot['ClusterIdentifier']}/{snapshot['SnapshotIdentifier']}"
+		backup_resource.tagged_on_create = True
 		return backup_resource
 
 	def backup_from_latest_automated(self, backup_resource: BackupResource):
@@ -193,18 +187,19 @@ class ShelveryRedshiftBackup(ShelveryEngine):
 		backup_resource.backup_id = f"{backup_resource.backup_id}:snapshot:{snapshot['ClusterIdentifier']}/{snapshot['SnapshotIdentifier']}"
 		return backup_resource
 
-	def tag_backup_resource(self, backup_resource: BackupResource):
+	def tag_backup_resource(self, backup_resource: BackupResource, tags: Dict = None):
 		"""
 		Create backup resource tags.
 		"""
-		# This is unnecessary for Redshift as the tags are included when calling `backup_resource()`.
+		# Only needed for copies of automated snapshots, copy_cluster_snapshot takes no tags.
 		redshift_client = AwsHelper.boto3_client('redshift', region_name = backup_resource.region, arn=self.role_arn, external_id=self.role_external_id)
+		tags = backup_resource.tags if tags is None else tags
 		redshift_client.create_tags(
 			ResourceName=backup_resource.backup_id,
-			Tags=backup_resource.boto3_tags
+			Tags=list(map(lambda k: {'Key': k, 'Value': tags[k]}, tags))
 		)
 
-	def copy_backup_to_region(self, backup_id: str, region: str) -> str:
+	def copy_backup_to_region(self, backup_id: str, region: str, tags: Dict = None) -> str:
 		"""
 		Copy a backup to another region.
 		This enables cross-region automated backups for the Redshift cluster, so future automated backups
@@ -262,9 +257,9 @@ class ShelveryRedshiftBackup(ShelveryEngine):
 		snapshots = redshift_client.describe_cluster_snapshots(SnapshotIdentifier=snapshot_id)
 		snapshot = snapshots['Snapshots'][0]
 		d_tags = BackupResource.dict_from_boto3_tags(snapshot['Tags'])
-		return BackupResource.construct(d_tags['shelvery:tag_name'], backup_id, d_tags)
+		return BackupResource.construct(d_tags['shelvery:tag_name'], backup_id, d_tags, self.account_id)
 
-	def copy_shared_backup(self, source_account: str, source_backup: BackupResource) -> str:
+	def copy_shared_backup(self, source_account: str, source_backup: BackupResource, tags: Dict = None) -> str:
 		"""
 		Copy Shelvery backup that has been shared from another account to account where
 		shelvery is currently running
@@ -69,6 +69,39 @@ class RuntimeConfig:
                                Note that when copying to a new key, the shelvery requires access to both the new key and the original key.
     shelvery_reencrypt_kms_key_id - when re-encrypting a snapshot with a new KMS key before sharing it to a new account.               
     shelvery_reencrypt_backup_cleanup_hours - number of hours to keep re-encrypted backups before cleaning up. Defaults to 72 hours.
+
+    shelvery_create_concurrency - number of entities backed up (created, tagged and stored) in parallel
+                                  by create_backups. Defaults to 1, one entity after another.
+    shelvery_clean_concurrency - number of expired backups deleted (and their metadata archived) in parallel
+                                 by clean_backups. Defaults to 1, one backup after another.
+    shelvery_pipeline_workers - outside lambda, run create_backups with its stores, DR copies and shares
+                                in-process on this many workers, each step starting as soon as its
+                                backup is available. Defaults to 0, each operation dispatched on its own.
+    shelvery_invoker_max_workers - outside lambda, maximum number of dispatched operations (copies, shares,
+                                   backup data stores) running at once. Defaults to 32.
+    shelvery_worker_processes - CLI only, run each action in one of this many worker processes, and
+                                publish a single status report merged from all of them. Defaults to 0,
+                                running in the CLI process itself.
+    shelvery_source_regions - CLI only, comma separated list of regions to run in, each region in worker
+                              processes of its own. Defaults to none, running in the local region only.
+    shelvery_role_arns - CLI only, comma separated list of role ARNs, one per account to run in. Every
+                         role is assumed with role_external_id, if set. Defaults to none, running with
+                         the runtime credentials only.
+    shelvery_role_arns_file - CLI only, path to a file listing more role ARNs, one per line. Blank lines
+                              and lines starting with # are ignored.
+    shelvery_account_concurrency - CLI only, number of accounts from shelvery_role_arns processed at once.
+                                   Defaults to 8.
+    shelvery_rate_limit_scale - multiplies the calls per second AWS api calls are rate limited to, from
+                                the defaults per operation class in RateLimiter. The limits adapt from
+                                there, backing off when calls are throttled. 0 turns rate limiting off.
+                                Defaults to 1.
+    shelvery_rate_limits - calls per second to rate limit other services to, or to override the EC2, RDS
+                           and DocumentDb defaults with, per service, e.g. 'sns:20,redshift:5'. Services
+                           not limited by default or here are not rate limited. Defaults to none.
+    shelvery_copy_concurrency - number of DR copies in progress at once per destination region, either a
+                                single number or per backup type, e.g. 'ebs:10,rds:5'. Copies over the
+                                limit wait for a slot, largest first. Defaults to the limit AWS documents
+                                for the backup type, 5 where it documents none.
     """
 
     DEFAULT_KEEP_DAILY = 14
@@ -112,7 +145,19 @@ class RuntimeConfig:
         'shelvery_copy_kms_key_id': None,
         'shelvery_reencrypt_kms_key_id': None,
         'shelvery_reencrypt_backup_cleanup_hours': 72,
-        'shelvery_status_sns_topic': None
+        'shelvery_status_sns_topic': None,
+        'shelvery_create_concurrency': 1,
+        'shelvery_clean_concurrency': 1,
+        'shelvery_pipeline_workers': 0,
+        'shelvery_invoker_max_workers': 32,
+        'shelvery_worker_processes': 0,
+        'shelvery_source_regions': None,
+        'shelvery_role_arns': None,
+        'shelvery_role_arns_file': None,
+        'shelvery_account_concurrency': 8,
+        'shelvery_rate_limit_scale': 1,
+        'shelvery_rate_limits': None,
+        'shelvery_copy_concurrency': None
     }
 
     @classmethod
@@ -285,6 +330,21 @@ class RuntimeConfig:
     def boto3_retry_times(cls):
         return cls.get_conf_value('boto3_retries', None, None)
 
+    @classmethod
+    def get_rate_limit_scale(cls):
+        return max(0.0, float(cls.get_conf_value('shelvery_rate_limit_scale', None, None)))
+
+    @classmethod
+    def get_rate_limits(cls):
+        limits = cls.get_conf_value('shelvery_rate_limits', None, None)
+        if not limits:
+            return {}
+        rates = {}
+        for pair in str(limits).split(','):
+            service, _, rate = pair.partition(':')
+            rates[service.strip()] = float(rate)
+        return rates
+
     @classmethod
     def get_error_sns_topic(cls, engine):
         topic = cls.get_conf_value('shelvery_error_sns_topic', None, engine.lambda_payload)
@@ -356,4 +416,62 @@ class RuntimeConfig:
 
     @classmethod
     def get_status_sns_topic(cls, engine):
-        return cls.get_conf_value('shelvery_status_sns_topic', None, engine.lambda_payload)
\ No newline at end of file
+        return cls.get_conf_value('shelvery_status_sns_topic', None, engine.lambda_payload)
+
+    @classmethod
+    def get_create_concurrency(cls, engine):
+        return max(1, int(cls.get_conf_value('shelvery_create_concurrency', None, engine.lambda_payload)))
+
+    @classmethod
+    def get_clean_concurrency(cls, engine):
+        return max(1, int(cls.get_conf_value('shelvery_clean_concurrency', None, engine.lambda_payload)))
+
+    @classmethod
+    def get_pipeline_workers(cls, engine):
+        return max(0, int(cls.get_conf_value('shelvery_pipeline_workers', None, engine.lambda_payload)))
+
+    @classmethod
+    def get_invoker_max_workers(cls, engine):
+        return max(1, int(cls.get_conf_value('shelvery_invoker_max_workers', None, engine.lambda_payload)))
+
+    @classmethod
+    def get_worker_processes(cls, engine):
+        return max(0, int(cls.get_conf_value('shelvery_worker_processes', None, engine.lambda_payload)))
+
+    @classmethod
+    def get_source_regions(cls, engine):
+        regions = cls.get_conf_value('shelvery_source_regions', None, engine.lambda_payload)
+        if regions is None:
+            return []
+        return [region.strip() for region in regions.split(',') if region.strip()]
+
+    @classmethod
+    def get_role_arns(cls, engine):
+        role_arns = cls.get_conf_value('shelvery_role_arns', None, engine.lambda_payload) or ''
+        role_arns = [arn.strip() for arn in role_arns.split(',')]
+
+        role_arns_file = cls.get_conf_value('shelvery_role_arns_file', None, engine.lambda_payload)
+        if role_arns_file is not None:
+            with open(role_arns_file) as f:
+                role_arns += [line.strip() for line in f if not line.strip().startswith('#')]
+
+        # each account is only processed once, however many times it is listed
+        return list(dict.fromkeys(arn for arn in role_arns if arn))
+
+    @classmethod
+    def get_account_concurrency(cls, engine):
+        return max(1, int(cls.get_conf_value('shelvery_account_concurrency', None, engine.lambda_payload)))
+
+    @classmethod
+    def get_copy_concurrency(cls, engine):
+        concurrency = cls.get_conf_value('shelvery_copy_concurrency', None, engine.lambda_payload)
+        if concurrency is None:
+            return engine.COPY_CONCURRENCY
+        concurrency = str(concurrency)
+        if ':' not in concurrency:
+            return max(1, int(concurrency))
+        for pair in concurrency.split(','):
+            backup_type, _, limit = pair.partition(':')
+            if backup_type.strip() == engine.get_engine_type():
+                return max(1, int(limit))
+        return engine.COPY_CONCURRENCY
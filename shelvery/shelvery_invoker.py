@@ -1,18 +1,232 @@
+import abc
 import boto3
 import os
 import json
 import logging
+import multiprocessing
+import threading
 
-from typing import Dict
-from threading import Thread
+from abc import abstractmethod
+from collections import namedtuple
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Dict, List
 
 from shelvery.runtime_config import RuntimeConfig
 from shelvery.aws_helper import AwsHelper
+from shelvery.backup_report import RunReport, describe_error
 from shelvery.queue import ShelveryQueue
 
+# Outcome of an operation dispatched outside lambda, as returned by ShelveryInvoker.join
+DispatchResult = namedtuple('DispatchResult', ['engine_type', 'method_name', 'arguments', 'result', 'error'])
+
+
+class DispatchBackend(abc.ABC):
+    """Runs operations the invoker dispatches outside lambda, and keeps track of them until joined"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # role -> [(future, (engine_type, method_name, method_arguments))] of every dispatched operation
+        self._dispatched = {}
+
+    @abstractmethod
+    def submit(self, engine_type: str, method_name: str, method_arguments: Dict, role=None) -> Future:
+        """Queue an operation, to run on an engine acting through role - a (role arn, external id)
+        pair - or with the runtime credentials when there is none
+        """
+
+    def join(self, roles=None) -> List[DispatchResult]:
+        """Wait for every dispatched operation, including those dispatched by operations meanwhile.
+        Given roles, only for the operations acting through one of those, so that accounts joined
+        on their own neither wait for nor collect the operations of each other
+        """
+        results = []
+        while True:
+            with self._lock:
+                joined = list(self._dispatched) if roles is None else [role for role in roles
+                                                                        if role in self._dispatched]
+                dispatched = [operation for role in joined for operation in self._dispatched.pop(role)]
+            if not dispatched:
+                return results
+            wait([future for future, _ in dispatched])
+            for future, (engine_type, method_name, method_arguments) in dispatched:
+                error = future.exception()
+                results.append(DispatchResult(engine_type, method_name, method_arguments,
+                                              None if error is not None else future.result(), error))
+
+    def shutdown(self):
+        pass
+
+    def _track(self, future, engine_type, method_name, method_arguments, role=None):
+        with self._lock:
+            self._dispatched.setdefault(role, []).append((future, (engine_type, method_name, method_arguments)))
+        return future
+
+    @staticmethod
+    def _new_engine(engine_type, role=None):
+        from shelvery.factory import ShelveryFactory
+        engine = ShelveryFactory.get_shelvery_instance(engine_type)
+        if role is not None:
+            engine.role_arn, engine.role_external_id = role
+        return engine
+
+
+class InlineBackend(DispatchBackend):
+    """Runs each operation straight away on the calling thread, see SHELVERY_MONO_THREAD"""
+
+    def submit(self, engine_type, method_name, method_arguments, role=None):
+        future = Future()
+        try:
+            # a fresh engine each time: an operation may dispatch another one inline, while its
+            # own engine is still busy
+            future.set_result(getattr(self._new_engine(engine_type, role), method_name)(method_arguments))
+        except BaseException as e:
+            future.set_exception(e)
+            # as before, the caller sees the failure of an inline operation
+            raise
+        finally:
+            self._track(future, engine_type, method_name, method_arguments, role)
+        return future
+
+
+class ThreadPoolBackend(DispatchBackend):
+    """Runs operations on a bounded pool of threads, each thread reusing one engine per backup type and role"""
+
+    def __init__(self, max_workers: int):
+        super().__init__()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='shelvery-invoker')
+        self._engines = threading.local()
+
+    def submit(self, engine_type, method_name, method_arguments, role=None):
+        future = self._executor.submit(self._execute, engine_type, method_name, method_arguments, role)
+        return self._track(future, engine_type, method_name, method_arguments, role)
+
+    def _execute(self, engine_type, method_name, method_arguments, role):
+        engines = self._engines.__dict__
+        if (engine_type, role) not in engines:
+            engines[(engine_type, role)] = self._new_engine(engine_type, role)
+        return getattr(engines[(engine_type, role)], method_name)(method_arguments)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+class WorkerError(Exception):
+    """A failure in a worker process, described there - not every exception survives pickling"""
+
+
+def _run_work_unit(engine_type, method_name, method_arguments, region=None, role=None):
+    """Runs a work unit in a worker process, see ProcessPoolBackend.
+
+    Whatever the unit dispatches runs on the worker's own invoker backend, and is waited for
+    here. Returns the run reports of all of it, and how each operation went.
+    """
+    from shelvery.engine import ShelveryEngine
+    if region is not None and region != AwsHelper.local_region():
+        # engines, their clients and boto3 sessions all take their default region from the
+        # environment, so for as long as the unit runs, its region is the worker's
+        os.environ['AWS_DEFAULT_REGION'] = region
+        # the engines of the previous unit's backend are bound to the previous region
+        ShelveryInvoker.set_backend(None)
+    reports = []
+    ShelveryEngine.collect_run_reports(reports)
+    try:
+        engine = DispatchBackend._new_engine(engine_type, role)
+        method = getattr(engine, method_name)
+        if method_arguments is None:
+            method()
+        else:
+            method(method_arguments)
+        error = None
+    except BaseException as e:
+        # BaseException: the cli wait timeout calls sys.exit(), which would take the worker
+        # down, and with it the reports of everything else the unit did
+        logging.exception(f"{engine_type} {method_name} failed")
+        error = e
+    results = [DispatchResult(engine_type, method_name, method_arguments, None, error)]
+    results += ShelveryInvoker.join()
+    ShelveryEngine.collect_run_reports(None)
+    return reports, [r._replace(result=None, error=WorkerError(describe_error(r.error)) if r.error else None)
+                     for r in results]
+
+
+class ProcessPoolBackend(DispatchBackend):
+    """Runs independent work units - whole actions - on a pool of worker processes.
+
+    Each worker has its own interpreter, so its own GIL and its own client and credential
+    caches. A unit's run reports are collected in the worker rather than published; once
+    joined, they are available merged from run_report().
+    """
+
+    def __init__(self, max_workers: int):
+        super().__init__()
+        # spawned, not forked: the parent's pools, pollers and cached clients must not be
+        # copied half way through whatever their threads are doing
+        self._executor = ProcessPoolExecutor(max_workers=max_workers,
+                                             mp_context=multiprocessing.get_context('spawn'))
+        self._reports = []
+
+    def submit(self, engine_type, method_name, method_arguments=None, role=None, region=None):
+        """Queue a work unit, to run in the given region, or the worker's default one"""
+        future = self._executor.submit(_run_work_unit, engine_type, method_name, method_arguments, region, role)
+        return self._track(future, engine_type, method_name, method_arguments, role)
+
+    def join(self, roles=None):
+        results = []
+        for result in super().join(roles):
+            if result.error is not None:
+                # the worker itself was lost, nothing came back from it
+                results.append(result)
+                continue
+            reports, unit_results = result.result
+            self._reports += reports
+            results += unit_results
+        return results
+
+    def run_report(self, run_id=None):
+        """The reports of every unit joined so far, as the report of a single run"""
+        return RunReport.merge(self._reports, run_id=run_id) if self._reports else None
+
+    def shutdown(self):
+        self._executor.shutdown()
+
+
 class ShelveryInvoker:
     """Helper to orchestrate execution of shelvery operations on AWS Lambda platform"""
 
+    _backend = None
+    _inline_backend = InlineBackend()
+    _backend_lock = threading.Lock()
+
+    @classmethod
+    def set_backend(cls, backend: DispatchBackend):
+        """Replace the backend operations dispatched outside lambda run on"""
+        with cls._backend_lock:
+            previous, cls._backend = cls._backend, backend
+        if previous is not None and previous is not backend:
+            previous.shutdown()
+
+    @classmethod
+    def get_backend(cls, engine) -> DispatchBackend:
+        if 'SHELVERY_MONO_THREAD' in os.environ and os.environ['SHELVERY_MONO_THREAD'] == "1":
+            return cls._inline_backend
+        with cls._backend_lock:
+            if cls._backend is None:
+                cls._backend = ThreadPoolBackend(RuntimeConfig.get_invoker_max_workers(engine))
+            return cls._backend
+
+    @classmethod
+    def join(cls, roles=None) -> List[DispatchResult]:
+        """Wait for every operation dispatched outside lambda so far, and return how each one went.
+        Given roles - (role arn, external id) pairs, None for the runtime credentials - only for
+        the operations acting through those
+        """
+        results = cls._inline_backend.join(roles)
+        with cls._backend_lock:
+            backend = cls._backend
+        if backend is not None:
+            results += backend.join(roles)
+        return results
+
     def invoke_shelvery_operation(self, engine, method_name: str, method_arguments: Dict):
         """
         Invokes shelvery engine asynchronously
@@ -43,18 +257,7 @@ class ShelveryInvoker:
                 lambda_client = AwsHelper.boto3_client('lambda')
                 lambda_client.invoke_async(FunctionName=function_name, InvokeArgs=bytes_payload)
         else:
-            resource_type = engine.get_engine_type()
-
-            def execute():
-                from shelvery.factory import ShelveryFactory
-                backup_engine = ShelveryFactory.get_shelvery_instance(resource_type)
-                method = backup_engine.__getattribute__(method_name)
-                method(method_arguments)
-
-            logging.info(f"Start new thread to execute :{method_name}")
-            if 'SHELVERY_MONO_THREAD' in os.environ and os.environ['SHELVERY_MONO_THREAD'] == "1":
-                execute()
-            else:
-                thread = Thread(target=execute)
-                thread.start()
-            # thread.join()
+            logging.info(f"Dispatching {method_name}")
+            # the operation acts on the same account as the engine that dispatched it
+            role = None if engine.role_arn is None else (engine.role_arn, engine.role_external_id)
+            self.get_backend(engine).submit(engine.get_engine_type(), method_name, method_arguments, role=role)
@@ -27,14 +27,15 @@ def main(args=None):
     if len(args) == 1 and args[0] == 'create_data_buckets':
         args.insert(0, 'ebs')
     if len(args) < 2:
-        print("""Usage: shelvery <backup_type> <action>\n\nBackup types: rds ebs rds_cluster ec2ami redshift
+        print("""Usage: shelvery <backup_type>[,<backup_type>...]|all <action>[,<action>...]\n
+Backup types: rds ebs rds_cluster ec2ami redshift docdb
 Actions:\n\tcreate_backups\n\tclean_backups\n\tcreate_data_buckets\n\tpull_shared_backups""")
         exit(-2)
 
     setup_logging()
     main_runner = ShelveryCliMain()
-    main_runner.main(args[0], args[1])
+    return main_runner.main(args[0], args[1])
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
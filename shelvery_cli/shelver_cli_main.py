@@ -1,19 +1,141 @@
 import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from shelvery.backup_report import RunReport
+from shelvery.engine import ShelveryEngine
 from shelvery.factory import ShelveryFactory
+from shelvery.runtime_config import RuntimeConfig
+from shelvery.shelvery_invoker import DispatchResult, ProcessPoolBackend, ShelveryInvoker
 
 
 class ShelveryCliMain:
-    
+
     def main(self, backup_type, action):
-    
+
         logger = logging.getLogger()
         logger.setLevel(logging.INFO)
-        
-        # create backup engine
-        backup_engine = ShelveryFactory.get_shelvery_instance(backup_type)
-        method = backup_engine.__getattribute__(action)
-        
-        # start the action
-        method()
-        return 0
 
+        backup_types = ShelveryFactory.BACKUP_TYPES if backup_type == 'all' else backup_type.split(',')
+        actions = action.split(',')
+
+        # create backup engines, once per backup type whatever the number of actions
+        engines = {}
+        for engine_type in backup_types:
+            engines[engine_type] = ShelveryFactory.get_shelvery_instance(engine_type)
+            if engines[engine_type] is None:
+                raise ValueError(f"Unknown backup type {engine_type}")
+        backup_engine = engines[backup_types[0]]
+
+        external_id = RuntimeConfig.get_role_external_id(backup_engine)
+        roles = [(role_arn, external_id) for role_arn in RuntimeConfig.get_role_arns(backup_engine)]
+        regions = RuntimeConfig.get_source_regions(backup_engine)
+        if regions:
+            worker_processes = RuntimeConfig.get_worker_processes(backup_engine) or len(regions)
+            results = self.run_in_worker_processes(backup_engine, backup_types, actions, regions, worker_processes,
+                                                   roles=roles or [None])
+        elif RuntimeConfig.get_worker_processes(backup_engine) > 0:
+            results = self.run_in_worker_processes(backup_engine, backup_types, actions, roles=roles or [None])
+        elif roles:
+            results = self.run_across_accounts(backup_engine, backup_types, actions, roles)
+        elif len(engines) > 1 or len(actions) > 1:
+            results = self.run_concurrently(backup_engine, engines, actions)
+        else:
+            # start the action
+            backup_engine.__getattribute__(action)()
+            # wait for everything the action dispatched - copies, shares, backup data - before exiting
+            results = ShelveryInvoker.join()
+
+        failed = [r for r in results if r.error is not None]
+        for result in failed:
+            logger.error(f"{result.engine_type} {result.method_name} {result.arguments} failed: {result.error}")
+        logger.info(f"{backup_type} {action} finished, {len(failed)} operations failed")
+        return 1 if failed else 0
+
+    def run_concurrently(self, backup_engine, engines, actions):
+        """Run each action on all engines at once in this process, then publish their merged report.
+
+        The engines share the process wide client and credential caches. An action starts once
+        the one before it, and everything that dispatched, is done for every engine.
+        """
+        reports = []
+        results = []
+        ShelveryEngine.collect_run_reports(reports)
+        try:
+            with ThreadPoolExecutor(max_workers=len(engines), thread_name_prefix='shelvery-cli') as executor:
+                for action in actions:
+                    futures = {engine_type: executor.submit(engine.__getattribute__(action))
+                               for engine_type, engine in engines.items()}
+                    for engine_type, future in futures.items():
+                        results.append(DispatchResult(engine_type, action, None, None, future.exception()))
+                    results += ShelveryInvoker.join()
+        finally:
+            ShelveryEngine.collect_run_reports(None)
+
+        self.publish_run_report(backup_engine, RunReport.merge(reports) if reports else None)
+        return results
+
+    def run_across_accounts(self, backup_engine, backup_types, actions, roles):
+        """Run all actions in every account, through its role, then publish their merged report.
+
+        Accounts run in parallel, and each account goes through its actions on its own, so one
+        that is slow or cannot even be assumed into never holds up the rest. Within an account an
+        action starts once the one before it, and everything that dispatched, is done.
+        """
+        reports = []
+        results = []
+        ShelveryEngine.collect_run_reports(reports)
+        try:
+            with ThreadPoolExecutor(max_workers=RuntimeConfig.get_account_concurrency(backup_engine),
+                                    thread_name_prefix='shelvery-account') as executor:
+                for account_results in executor.map(lambda role: self.run_in_account(backup_types, actions, role),
+                                                    roles):
+                    results += account_results
+            results += ShelveryInvoker.join()
+        finally:
+            ShelveryEngine.collect_run_reports(None)
+
+        self.publish_run_report(backup_engine, RunReport.merge(reports) if reports else None)
+        return results
+
+    def run_in_account(self, backup_types, actions, role):
+        results = []
+        for action in actions:
+            for backup_type in backup_types:
+                try:
+                    engine = ShelveryFactory.get_shelvery_instance(backup_type)
+                    engine.role_arn, engine.role_external_id = role
+                    engine.__getattribute__(action)()
+                    error = None
+                except BaseException as e:
+                    logging.exception(f"{backup_type} {action} through {role[0]} failed")
+                    error = e
+                results.append(DispatchResult(backup_type, action, {'RoleArn': role[0]}, None, error))
+            # only what this account dispatched, the others go on meanwhile
+            results += ShelveryInvoker.join(roles=[role])
+        return results
+
+    def run_in_worker_processes(self, backup_engine, backup_types, actions, regions=(None,), worker_processes=None,
+                                roles=(None,)):
+        """Run each action for all backup types, in all regions and accounts, across worker processes,
+        then publish their merged report. A region of None is the local region, a role of None the
+        runtime credentials.
+        """
+        backend = ProcessPoolBackend(worker_processes or RuntimeConfig.get_worker_processes(backup_engine))
+        results = []
+        try:
+            for action in actions:
+                for region in regions:
+                    for role in roles:
+                        for backup_type in backup_types:
+                            backend.submit(backup_type, action, role=role, region=region)
+                results += backend.join()
+        finally:
+            backend.shutdown()
+
+        self.publish_run_report(backup_engine, backend.run_report())
+        return results
+
+    def publish_run_report(self, backup_engine, report):
+        # published through an engine, for its status topic configuration
+        backup_engine.run_report = report
+        backup_engine.publish_run_report()
@@ -0,0 +1,223 @@
+import threading
+import unittest
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from unittest.mock import MagicMock, patch
+
+from shelvery.availability_poller import AvailabilityPoller, BackupStatus, PollSchedule
+from shelvery.factory import ShelveryFactory
+from shelvery_tests.unit.engine_report_unit_test import aws_patchers
+
+
+class FakeEngine:
+    role_arn = None
+    role_external_id = None
+
+    def __init__(self):
+        self.available = set()
+        self.batches = []
+        self.lock = threading.Lock()
+        self.saved = None
+        # cleared to hold the poller's describe calls back
+        self.polling = threading.Event()
+        self.polling.set()
+
+    def get_engine_type(self):
+        return 'ebs'
+
+    def get_backups_status(self, backup_region, backup_ids):
+        self.polling.wait(5)
+        with self.lock:
+            self.batches.append(list(backup_ids))
+            return {backup_id: BackupStatus(backup_id in self.available, entity_id='vol-1')
+                    for backup_id in backup_ids}
+
+    def is_backup_available(self, backup_region, backup_id):
+        return backup_id in self.available
+
+    def load_poll_estimates(self, region):
+        return {}
+
+    def save_poll_estimates(self, region, estimates):
+        self.saved = estimates
+
+
+def fast_polling(test):
+    for name in ['MIN_INTERVAL', 'MAX_INTERVAL']:
+        patcher = patch.object(PollSchedule, name, 0.01)
+        patcher.start()
+        test.addCleanup(patcher.stop)
+
+
+class AvailabilityPollerTest(unittest.TestCase):
+    """Describe calls and threads have to scale with regions, not with backups."""
+
+    def setUp(self):
+        AvailabilityPoller.clear()
+        self.addCleanup(AvailabilityPoller.clear)
+        fast_polling(self)
+
+        self.engine = FakeEngine()
+
+    def test_one_poller_per_engine_type_and_region(self):
+        self.assertIs(AvailabilityPoller.for_engine(self.engine, 'ap-southeast-2'),
+                      AvailabilityPoller.for_engine(FakeEngine(), 'ap-southeast-2'))
+        self.assertIsNot(AvailabilityPoller.for_engine(self.engine, 'ap-southeast-2'),
+                         AvailabilityPoller.for_engine(self.engine, 'us-east-1'))
+
+    def test_pending_backups_are_checked_in_batches(self):
+        poller = AvailabilityPoller.for_engine(self.engine, 'ap-southeast-2')
+        poller.BATCH_SIZE = 100
+        self.engine.available = {f"snap-{i}" for i in range(250)}
+        self.engine.polling.clear()
+
+        futures = [poller.wait(f"snap-{i}") for i in range(250)]
+        self.engine.polling.set()
+
+        self.assertTrue(all(future.result(timeout=5) for future in futures))
+        self.assertTrue(all(len(batch) <= 100 for batch in self.engine.batches))
+        # the first registration may be polled on its own before the others arrive
+        self.assertLessEqual(len(self.engine.batches), 4)
+
+    def test_waiters_are_resolved_as_their_backup_becomes_available(self):
+        poller = AvailabilityPoller.for_engine(self.engine, 'ap-southeast-2')
+        ready, slow = poller.wait('snap-ready'), poller.wait('snap-slow')
+        self.engine.available.add('snap-ready')
+
+        self.assertTrue(ready.result(timeout=5))
+        self.assertFalse(slow.done())
+
+        self.engine.available.add('snap-slow')
+        self.assertTrue(slow.result(timeout=5))
+
+    def test_a_failed_batch_falls_back_to_checking_each_backup(self):
+        self.engine.get_backups_status = MagicMock(side_effect=RuntimeError('InvalidSnapshot.NotFound'))
+        self.engine.available = {'snap-1'}
+        poller = AvailabilityPoller.for_engine(self.engine, 'ap-southeast-2')
+
+        self.assertTrue(poller.wait('snap-1').result(timeout=5))
+
+    def test_forgotten_backups_are_no_longer_polled(self):
+        poller = AvailabilityPoller.for_engine(self.engine, 'ap-southeast-2')
+        future = poller.wait('snap-never')
+        with self.assertRaises(FutureTimeoutError):
+            future.result(timeout=0.05)
+
+        poller.forget('snap-never', future)
+        poller._thread is None or poller._thread.join(timeout=5)
+
+        self.assertIsNone(poller._thread)
+
+    def test_estimates_are_saved_once_nothing_is_pending(self):
+        poller = AvailabilityPoller.for_engine(self.engine, 'ap-southeast-2')
+        self.engine.available = {'snap-1'}
+
+        poller.wait('snap-1').result(timeout=5)
+        poller._thread is None or poller._thread.join(timeout=5)
+
+        self.assertIn('vol-1', self.engine.saved)
+
+    def test_copies_are_not_learned_from(self):
+        poller = AvailabilityPoller.for_engine(self.engine, 'us-east-1')
+        self.engine.available = {'snap-copy'}
+
+        poller.wait('snap-copy', learn=False).result(timeout=5)
+        poller._thread is None or poller._thread.join(timeout=5)
+
+        self.assertIsNone(self.engine.saved, 'a copy completion was saved as a creation estimate')
+
+
+class PollScheduleTest(unittest.TestCase):
+    """Large cold volumes are backed off, small ones and nearly done ones are checked soon."""
+
+    def setUp(self):
+        patcher = patch.object(PollSchedule, 'JITTER', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.schedule = PollSchedule()
+        self.schedule.add('snap-1', 0)
+
+    def interval_after(self, status, now):
+        self.schedule.pending('snap-1', status, now)
+        return self.schedule._pending['snap-1']['next'] - now
+
+    def test_backs_off_exponentially_without_progress(self):
+        intervals = [self.interval_after(BackupStatus(False, size=500), now) for now in range(4)]
+
+        self.assertEqual([10, 20, 40, 80], intervals)
+
+    def test_small_backups_are_checked_at_the_minimum_interval(self):
+        intervals = [self.interval_after(BackupStatus(False, size=1), now) for now in range(4)]
+
+        self.assertEqual([PollSchedule.MIN_INTERVAL] * 4, intervals)
+
+    def test_progress_rate_predicts_the_next_check(self):
+        self.interval_after(BackupStatus(False, progress=10.0, size=500), 0)
+
+        # 20% in 60 seconds leaves 70% for another 210 seconds
+        self.assertEqual(210, self.interval_after(BackupStatus(False, progress=30.0, size=500), 60))
+
+    def test_estimates_from_earlier_runs_are_used_from_the_first_check(self):
+        schedule = PollSchedule({'vol-1': 0.5})
+        schedule.add('snap-2', 0)
+
+        schedule.pending('snap-2', BackupStatus(False, size=400, entity_id='vol-1'), 0)
+
+        # 0.5 seconds per GiB of a 400 GiB volume, jitter aside
+        self.assertAlmostEqual(200, schedule._pending['snap-2']['next'], delta=200 * PollSchedule.JITTER)
+
+    def test_completion_is_remembered_per_entity(self):
+        self.schedule.completed('snap-1', BackupStatus(True, size=100, entity_id='vol-1'), 300)
+        self.assertEqual(3, self.schedule.estimates['vol-1'])
+        self.assertEqual({'vol-1'}, self.schedule.updated)
+
+    def test_copies_neither_use_nor_update_the_estimates(self):
+        schedule = PollSchedule({'vol-1': 0.5})
+        schedule.add('snap-copy', 0, learn=False)
+
+        schedule.pending('snap-copy', BackupStatus(False, size=400, entity_id='vol-1'), 0)
+        # backed off as if nothing was known, rather than by the creation estimate
+        self.assertEqual(PollSchedule.MIN_INTERVAL * 2, schedule._pending['snap-copy']['next'])
+
+        schedule.completed('snap-copy', BackupStatus(True, size=400, entity_id='vol-1'), 1000)
+        self.assertEqual({'vol-1': 0.5}, schedule.estimates)
+        self.assertEqual(set(), schedule.updated)
+
+
+class WaitBackupAvailableTest(unittest.TestCase):
+
+    def setUp(self):
+        for p in aws_patchers():
+            p.start()
+            self.addCleanup(p.stop)
+        AvailabilityPoller.clear()
+        self.addCleanup(AvailabilityPoller.clear)
+        fast_polling(self)
+
+        self.engine = ShelveryFactory.get_shelvery_instance('ebs')
+
+    def test_wait_goes_through_the_batched_check(self):
+        self.engine.get_backups_status = MagicMock(return_value={'snap-1': BackupStatus(True)})
+        self.engine.is_backup_available = MagicMock()
+        self.engine.load_poll_estimates = MagicMock(return_value={})
+        self.engine.save_poll_estimates = MagicMock()
+
+        self.engine.do_wait_backup_available('ap-southeast-2', 'snap-1', timeout_fn=MagicMock())
+
+        self.engine.get_backups_status.assert_called_with('ap-southeast-2', ['snap-1'])
+        self.engine.is_backup_available.assert_not_called()
+
+    @patch.dict('os.environ', {'shelvery_wait_snapshot_timeout': '0'})
+    def test_timeout_calls_the_timeout_function(self):
+        self.engine.get_backups_status = MagicMock(return_value={'snap-1': BackupStatus(False)})
+        self.engine.load_poll_estimates = MagicMock(return_value={})
+        self.engine.save_poll_estimates = MagicMock()
+        timeout_fn = MagicMock()
+
+        with self.assertRaises(Exception):
+            self.engine.do_wait_backup_available('ap-southeast-2', 'snap-1', timeout_fn=timeout_fn)
+
+        timeout_fn.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,230 @@
+import threading
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+
+import boto3
+from botocore.stub import Stubber
+
+from shelvery.aws_helper import AwsHelper
+
+
+def credentials(expires_in=timedelta(hours=1)):
+    return {
+        'AccessKeyId': 'AKIA',
+        'SecretAccessKey': 'secret',
+        'SessionToken': 'token',
+        'Expiration': datetime.now(timezone.utc) + expires_in
+    }
+
+
+class ClientCacheTest(unittest.TestCase):
+    """A run over thousands of volumes must not build thousands of clients."""
+
+    def setUp(self):
+        AwsHelper.clear_client_cache()
+        self.addCleanup(AwsHelper.clear_client_cache)
+
+        patcher = patch('shelvery.aws_helper.boto3.client', side_effect=lambda *a, **kw: MagicMock())
+        self.boto3_client = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_same_service_and_region_reuses_the_client(self):
+        first = AwsHelper.boto3_client('ec2', region_name='ap-southeast-2')
+        second = AwsHelper.boto3_client('ec2', region_name='ap-southeast-2')
+
+        self.assertIs(first, second)
+        self.assertEqual(1, self.boto3_client.call_count)
+        self.assertEqual(1, AwsHelper.client_cache_stats()['hits'])
+        self.assertEqual(1, AwsHelper.client_cache_stats()['misses'])
+
+    def test_region_and_service_are_part_of_the_key(self):
+        AwsHelper.boto3_client('ec2', region_name='ap-southeast-2')
+        AwsHelper.boto3_client('ec2', region_name='us-east-1')
+        AwsHelper.boto3_client('rds', region_name='ap-southeast-2')
+
+        self.assertEqual(3, self.boto3_client.call_count)
+        self.assertEqual(3, AwsHelper.client_cache_stats()['size'])
+
+    def test_role_clients_assume_the_role_once(self):
+        with patch.object(AwsHelper, '_assume_role', return_value=credentials()) as assume_role:
+            for region in ['ap-southeast-2', 'us-east-1']:
+                for _ in range(5):
+                    AwsHelper.boto3_client('ec2', region_name=region,
+                                           arn='arn:aws:iam::111111111111:role/shelvery')
+
+        self.assertEqual(1, assume_role.call_count)
+
+
+class RoleCredentialsTest(unittest.TestCase):
+    """STS must stay off the hot path of every describe, tag and share call."""
+
+    ROLE = 'arn:aws:iam::111111111111:role/shelvery'
+
+    def setUp(self):
+        AwsHelper.clear_client_cache()
+        self.addCleanup(AwsHelper.clear_client_cache)
+
+    def test_credentials_are_reused_until_close_to_expiry(self):
+        with patch.object(AwsHelper, '_assume_role', return_value=credentials()) as assume_role:
+            first = AwsHelper.boto3_sts(self.ROLE, None)
+            second = AwsHelper.boto3_sts(self.ROLE, None)
+
+        self.assertIs(first, second)
+        self.assertEqual(1, assume_role.call_count)
+
+    def test_credentials_are_refreshed_shortly_before_they_expire(self):
+        with patch.object(AwsHelper, '_assume_role',
+                          return_value=credentials(timedelta(minutes=10))) as assume_role:
+            AwsHelper.boto3_sts(self.ROLE, None)
+            AwsHelper.boto3_sts(self.ROLE, None)
+
+        self.assertEqual(2, assume_role.call_count)
+
+    def test_each_role_and_external_id_is_assumed_separately(self):
+        with patch.object(AwsHelper, '_assume_role', return_value=credentials()) as assume_role:
+            AwsHelper.boto3_sts(self.ROLE, None)
+            AwsHelper.boto3_sts(self.ROLE, 'external')
+            AwsHelper.boto3_sts('arn:aws:iam::222222222222:role/shelvery', None)
+            AwsHelper.boto3_sts(self.ROLE, None)
+
+        self.assertEqual(3, assume_role.call_count)
+
+    def test_resources_share_the_role_credentials(self):
+        with patch.object(AwsHelper, '_assume_role', return_value=credentials()) as assume_role:
+            AwsHelper.boto3_session('ec2', region_name='ap-southeast-2', arn=self.ROLE)
+            AwsHelper.boto3_session('ec2', region_name='us-east-1', arn=self.ROLE)
+            AwsHelper.boto3_client('rds', region_name='ap-southeast-2', arn=self.ROLE)
+
+        self.assertEqual(1, assume_role.call_count)
+
+    def test_roles_are_assumed_in_parallel(self):
+        roles = [f"arn:aws:iam::{account}11111111111:role/shelvery" for account in range(1, 7)]
+        # every AssumeRole waits for all of them to be in flight at once
+        in_flight = threading.Barrier(len(roles), timeout=5)
+        broken = []
+
+        def assume_role(arn, external_id):
+            try:
+                in_flight.wait()
+            except threading.BrokenBarrierError:
+                broken.append(arn)
+            return credentials()
+
+        with patch.object(AwsHelper, '_assume_role', side_effect=assume_role):
+            threads = [threading.Thread(target=AwsHelper.boto3_client, args=('ec2', 'ap-southeast-2', role))
+                       for role in roles]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual([], broken, 'roles were assumed one after the other')
+        self.assertEqual(6, AwsHelper.client_cache_stats()['size'])
+
+    def test_cached_clients_do_not_wait_on_a_role_being_assumed(self):
+        cached = AwsHelper.boto3_client('ec2', region_name='ap-southeast-2')
+        assuming = threading.Event()
+        release = threading.Event()
+
+        def assume_role(arn, external_id):
+            assuming.set()
+            release.wait(5)
+            return credentials()
+
+        with patch.object(AwsHelper, '_assume_role', side_effect=assume_role):
+            thread = threading.Thread(target=AwsHelper.boto3_client, args=('ec2', 'ap-southeast-2', self.ROLE))
+            thread.start()
+            assuming.wait(5)
+            self.assertIs(cached, AwsHelper.boto3_client('ec2', region_name='ap-southeast-2'))
+            release.set()
+            thread.join()
+
+
+class CallerIdentityTest(unittest.TestCase):
+    """Building a BackupResource must not cost a GetCallerIdentity round trip."""
+
+    def setUp(self):
+        AwsHelper.clear_client_cache()
+        self.addCleanup(AwsHelper.clear_client_cache)
+
+        self.sts = MagicMock()
+        self.sts.get_caller_identity.return_value = {
+            'Account': '123456789012',
+            'Arn': 'arn:aws-us-gov:iam::123456789012:user/shelvery',
+            'UserId': 'AIDA'
+        }
+        patcher = patch.object(AwsHelper, 'boto3_client', return_value=self.sts)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_identity_is_resolved_once_per_process(self):
+        for _ in range(3):
+            self.assertEqual('123456789012', AwsHelper.local_account_id())
+
+        self.assertEqual(1, self.sts.get_caller_identity.call_count)
+
+    def test_partition_is_taken_from_the_arn(self):
+        self.assertEqual('aws-us-gov', AwsHelper.caller_identity()['Partition'])
+
+    def test_each_role_has_its_own_identity(self):
+        AwsHelper.caller_identity()
+        AwsHelper.caller_identity('arn:aws:iam::111111111111:role/shelvery')
+        AwsHelper.caller_identity()
+
+        self.assertEqual(2, self.sts.get_caller_identity.call_count)
+
+    def test_constructed_backup_takes_the_injected_account(self):
+        from shelvery.backup_resource import BackupResource
+        backup = BackupResource.construct('shelvery', 'snap-1', {
+            'shelvery:retention_type': 'daily',
+            'shelvery:name': 'disk-2026-08-14-0100-daily',
+            'shelvery:date_created': '2026-08-14-0100',
+            'shelvery:region': 'ap-southeast-2'
+        }, account_id='999999999999')
+
+        self.assertEqual('999999999999', backup.account_id)
+        self.sts.get_caller_identity.assert_not_called()
+
+
+
+class PaginateTest(unittest.TestCase):
+    """Every page must be read, with the filters of the first request."""
+
+    FILTERS = [{'Name': 'tag:shelvery:backup', 'Values': ['true']}]
+
+    def setUp(self):
+        self.client = boto3.client('ec2', region_name='ap-southeast-2',
+                                   aws_access_key_id='AKIA', aws_secret_access_key='secret')
+        self.stubber = Stubber(self.client)
+        self.stubber.activate()
+        self.addCleanup(self.stubber.deactivate)
+
+    def test_items_of_every_page_are_yielded_and_filters_kept(self):
+        self.stubber.add_response('describe_snapshots',
+                                  {'Snapshots': [{'SnapshotId': 'snap-1'}], 'NextToken': 'page-2'},
+                                  {'Filters': self.FILTERS, 'MaxResults': 5})
+        self.stubber.add_response('describe_snapshots',
+                                  {'Snapshots': [{'SnapshotId': 'snap-2'}]},
+                                  {'Filters': self.FILTERS, 'MaxResults': 5, 'NextToken': 'page-2'})
+
+        snapshots = AwsHelper.paginate(self.client, 'describe_snapshots', 'Snapshots',
+                                       page_size=5, Filters=self.FILTERS)
+
+        self.assertEqual(['snap-1', 'snap-2'], [snap['SnapshotId'] for snap in snapshots])
+        self.stubber.assert_no_pending_responses()
+
+    def test_pages_are_only_requested_as_they_are_consumed(self):
+        self.stubber.add_response('describe_snapshots',
+                                  {'Snapshots': [{'SnapshotId': 'snap-1'}], 'NextToken': 'page-2'},
+                                  {'Filters': self.FILTERS})
+
+        snapshots = AwsHelper.paginate(self.client, 'describe_snapshots', 'Snapshots', Filters=self.FILTERS)
+
+        self.assertEqual('snap-1', next(snapshots)['SnapshotId'])
+        # the second page was never asked for, so there is nothing to fail on here
+        self.stubber.assert_no_pending_responses()
+
+
+if __name__ == '__main__':
+    unittest.main()
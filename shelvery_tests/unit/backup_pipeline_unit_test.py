@@ -0,0 +1,177 @@
+import sys
+import threading
+import time
+import unittest
+from concurrent.futures import Future
+from unittest.mock import MagicMock, call, patch
+
+from shelvery.backup_pipeline import BackupPipeline
+from shelvery.copy_scheduler import CopyScheduler
+from shelvery.entity_resource import EntityResource
+from shelvery_tests.unit.engine_report_unit_test import EngineTestCase
+
+
+class BackupPipelineTest(unittest.TestCase):
+    """Steps start as soon as what they wait on is done, on a bounded set of workers."""
+
+    def test_steps_run_on_at_most_max_workers(self):
+        pipeline = BackupPipeline(3)
+        running, most_running, lock = [0], [0], threading.Lock()
+
+        def step():
+            with lock:
+                running[0] += 1
+                most_running[0] = max(most_running[0], running[0])
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+
+        for i in range(20):
+            pipeline.add(f"step {i}", step)
+        pipeline.join()
+
+        self.assertLessEqual(most_running[0], 3)
+
+    def test_a_step_waits_for_its_future_and_not_on_a_thread(self):
+        pipeline = BackupPipeline(1)
+        available = Future()
+        ran = []
+
+        pipeline.add('copy', lambda: ran.append('copy'), ready=available)
+        pipeline.add('create', lambda: ran.append('create'))
+        time.sleep(0.05)
+        self.assertEqual(['create'], ran)
+
+        available.set_result(True)
+        pipeline.join()
+        self.assertEqual(['create', 'copy'], ran)
+
+    def test_steps_queued_by_running_steps_are_joined(self):
+        pipeline = BackupPipeline(2)
+        ran = []
+
+        def create(i):
+            ran.append(f"create {i}")
+            pipeline.add(f"copy {i}", lambda: ran.append(f"copy {i}"))
+
+        for i in range(5):
+            pipeline.add(f"create {i}", lambda i=i: create(i), stage=BackupPipeline.STAGE_CREATE)
+        pipeline.join()
+
+        self.assertEqual(10, len(ran))
+
+    def test_follow_up_steps_go_ahead_of_creates(self):
+        pipeline = BackupPipeline(1)
+        gate, ran = threading.Event(), []
+        pipeline.add('blocker', gate.wait)
+        for i in range(3):
+            pipeline.add(f"create {i}", lambda i=i: ran.append(f"create {i}"), stage=BackupPipeline.STAGE_CREATE)
+        pipeline.add('copy', lambda: ran.append('copy'))
+
+        gate.set()
+        pipeline.join()
+
+        self.assertEqual('copy', ran[0])
+
+    def test_the_deadline_releases_a_step_that_is_never_ready(self):
+        pipeline = BackupPipeline(1)
+        expired, ran = MagicMock(), []
+
+        pipeline.add('copy', lambda: ran.append('copy'), ready=Future(),
+                     deadline=time.time() + 0.05, on_expire=expired)
+        pipeline.join()
+
+        self.assertEqual(['copy'], ran)
+        expired.assert_called_once()
+
+    def test_a_failing_step_does_not_stop_the_others(self):
+        pipeline = BackupPipeline(1)
+        ran = []
+
+        pipeline.add('exits', lambda: sys.exit(-5))
+        pipeline.add('copy', lambda: ran.append('copy'))
+        pipeline.join()
+
+        self.assertEqual(['copy'], ran)
+        self.assertEqual('exits', pipeline.errors[0][0])
+
+    def test_only_backups_in_the_engine_region_are_learned_from(self):
+        pipeline = BackupPipeline(1)
+        engine = MagicMock(role_arn=None, role_external_id=None, region='ap-southeast-2')
+        poller = MagicMock()
+
+        with patch('shelvery.backup_pipeline.AvailabilityPoller.for_engine', return_value=poller):
+            pipeline.add_operation(engine, 'do_store_backup_data', {}, 'ap-southeast-2', 'snap-1')
+            pipeline.add_operation(engine, 'do_share_backup', {}, 'us-east-1', 'snap-2')
+
+        self.assertEqual([call('snap-1', learn=True), call('snap-2', learn=False)], poller.wait.call_args_list)
+
+    def test_a_copy_is_only_given_a_worker_once_it_holds_a_slot(self):
+        CopyScheduler.clear()
+        self.addCleanup(CopyScheduler.clear)
+        pipeline = BackupPipeline(1)
+        engine = MagicMock(role_arn=None, role_external_id=None)
+        engine.get_engine_type.return_value = 'ebs'
+        scheduler = CopyScheduler(1)
+        scheduler.acquire(lambda: 1)
+        poller = MagicMock()
+        poller.wait.return_value = Future()
+        poller.wait.return_value.set_result(True)
+        copies = []
+
+        with patch('shelvery.backup_pipeline.AvailabilityPoller.for_engine', return_value=poller), \
+                patch('shelvery.backup_pipeline.CopyScheduler.for_engine', return_value=scheduler), \
+                patch('shelvery.factory.ShelveryFactory.get_shelvery_instance') as get_instance:
+            get_instance.return_value.do_copy_backup.side_effect = \
+                lambda args: copies.append(scheduler.take(get_instance.return_value.copy_slot))
+            pipeline.add_operation(engine, 'do_copy_backup', {}, 'ap-southeast-2', 'snap-1', copy_region='us-east-1')
+            pipeline.add('create', lambda: None)
+            time.sleep(0.05)
+            # the worker was free for the create, rather than waiting on the slot
+            self.assertEqual([], copies)
+            self.assertEqual([], pipeline.errors)
+
+            scheduler.release()
+            pipeline.join()
+
+        self.assertEqual([True], copies)
+        self.assertEqual(1, scheduler.in_flight)
+
+
+class PipelinedCreateBackupsTest(EngineTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.engine.tag_backup_resource = MagicMock()
+        self.engine.get_entities_to_backup = MagicMock(return_value=[
+            EntityResource(f"vol-{i}", 'ap-southeast-2', '2026-08-14', {'Name': f"disk{i}"})
+            for i in range(5)
+        ])
+
+        def backup_resource(br):
+            br.backup_id = f"snap-{br.entity_id}"
+        self.engine.backup_resource = backup_resource
+
+        self.operations = []
+        patcher = patch.object(BackupPipeline, 'add_operation',
+                               side_effect=lambda engine, method, args, region, backup_id, copy_region=None:
+                               self.operations.append((method, backup_id)))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @patch.dict('os.environ', {'shelvery_pipeline_workers': '4',
+                               'shelvery_dr_regions': 'us-east-1',
+                               'shelvery_share_aws_account_ids': '111111111111'})
+    def test_every_step_of_every_backup_goes_on_the_pipeline(self):
+        backups = self.engine.create_backups()
+
+        self.assertEqual([f"vol-{i}" for i in range(5)], [b.entity_id for b in backups])
+        self.assertEqual(15, len(self.operations))
+        self.assertEqual({'do_store_backup_data', 'do_copy_backup', 'do_share_backup'},
+                         {method for method, _ in self.operations})
+        self.assertEqual(5, self.report['summary']['succeeded'])
+        self.assertIsNone(self.engine.pipeline)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,7 @@
 import json
+import pickle
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 
 from botocore.exceptions import ClientError
 
@@ -82,6 +84,54 @@ class SerialisationTest(unittest.TestCase):
         self.assertTrue(make_report().to_dict()['started_at'].endswith('Z'))
 
 
+class MergeTest(unittest.TestCase):
+    """Worker processes report separately, the run is still published as one."""
+
+    def test_report_survives_pickling(self):
+        report = pickle.loads(pickle.dumps(make_report('OK', 'ERROR')))
+
+        report.add({'operation': 'CreateBackup', 'status': 'OK'})
+        self.assertEqual(2, report.count('OK'))
+
+    def test_merged_counters_cover_every_report(self):
+        first, second = make_report('OK', 'ERROR'), make_report('OK')
+        first.collected, second.collected = 2, 1
+
+        merged = RunReport.merge([first, second]).to_dict()
+
+        self.assertEqual({'collected': 3, 'succeeded': 2, 'skipped': 0, 'failed': 1}, merged['summary'])
+        self.assertEqual('PARTIAL', merged['status'])
+
+    def test_entries_are_labelled_where_the_reports_differ(self):
+        ebs, rds = make_report('OK'), make_report('ERROR')
+        rds.backup_type = 'rds'
+
+        merged = RunReport.merge([ebs, rds]).to_dict()
+
+        self.assertEqual('ebs,rds', merged['backup_type'])
+        self.assertEqual('create_backups', merged['action'])
+        self.assertEqual(['ebs', 'rds'], [e['backup_type'] for e in merged['entries']])
+        self.assertNotIn('action', merged['entries'][0])
+
+
+    def test_throttles_are_added_up(self):
+        first, second = make_report(), make_report()
+        first.throttled('ec2:write', 2)
+        second.throttled('ec2:write')
+        second.throttled('rds:read')
+
+        self.assertEqual({'ec2:write': 3, 'rds:read': 1}, RunReport.merge([first, second]).to_dict()['throttles'])
+
+    def test_every_merged_report_gets_a_section(self):
+        first, second = make_report('OK'), make_report(ABORTED)
+        second.account_id = '210987654321'
+
+        sections = RunReport.merge([first, second]).to_dict()['sections']
+
+        self.assertEqual([('123456789012', 'OK'), ('210987654321', 'FAILED')],
+                         [(section['account_id'], section['status']) for section in sections])
+        self.assertEqual(1, sections[1]['summary']['failed'])
+
 class DescribeErrorTest(unittest.TestCase):
 
     def test_none_returns_none(self):
@@ -103,5 +153,18 @@ class DescribeErrorTest(unittest.TestCase):
         self.assertIsNotNone(describe_error(Awkward()))
 
 
+class ThreadSafetyTest(unittest.TestCase):
+    """Entities created on a worker pool all report into the same run."""
+
+    def test_no_entry_is_lost_to_concurrent_adds(self):
+        report = make_report()
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            for _ in range(2000):
+                executor.submit(report.add, {'operation': 'CreateBackup', 'status': 'OK'})
+
+        self.assertEqual(2000, report.to_dict()['summary']['succeeded'])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,213 @@
+import threading
+import time
+import unittest
+from concurrent.futures import Future
+from unittest.mock import MagicMock, patch
+
+from botocore.exceptions import ClientError
+
+from shelvery.copy_scheduler import CopyScheduler
+from shelvery.runtime_config import RuntimeConfig
+
+
+def start_waiting(scheduler, size, started):
+    """acquire in a thread of its own, recording the size once it has a slot"""
+    thread = threading.Thread(target=lambda: (scheduler.acquire(lambda: size), started.append(size)), daemon=True)
+    thread.start()
+    return thread
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            raise AssertionError('condition not met in time')
+        time.sleep(0.01)
+
+
+class CopySchedulerTest(unittest.TestCase):
+
+    def test_copies_never_exceed_the_limit(self):
+        scheduler = CopyScheduler(2)
+        started = []
+        scheduler.acquire(lambda: 1)
+        scheduler.acquire(lambda: 1)
+
+        start_waiting(scheduler, 10, started)
+        wait_for(lambda: scheduler._waiting)
+        self.assertEqual([], started)
+        self.assertEqual(2, scheduler.in_flight)
+
+        scheduler.release()
+        wait_for(lambda: started)
+        self.assertEqual(2, scheduler.in_flight)
+
+    def test_the_largest_waiting_copy_goes_first(self):
+        scheduler = CopyScheduler(1)
+        started = []
+        scheduler.acquire(lambda: 1)
+        for size in (5, 500, 50):
+            start_waiting(scheduler, size, started)
+        wait_for(lambda: len(scheduler._waiting) == 3)
+
+        for count in (1, 2, 3):
+            scheduler.release()
+            wait_for(lambda: len(started) == count)
+
+        self.assertEqual([500, 50, 5], started)
+
+    def test_size_is_only_looked_up_when_the_copy_has_to_wait(self):
+        scheduler = CopyScheduler(1)
+        size_fn = MagicMock(return_value=1)
+
+        scheduler.acquire(size_fn)
+
+        size_fn.assert_not_called()
+
+    def test_a_slot_is_released_once_the_copy_completes(self):
+        scheduler = CopyScheduler(1)
+        scheduler.acquire(lambda: 1)
+        completed = Future()
+
+        scheduler.release_when_done(completed, 60)
+        self.assertEqual(1, scheduler.in_flight)
+        completed.set_result(True)
+
+        self.assertEqual(0, scheduler.in_flight)
+
+    def test_a_slot_is_released_after_the_timeout_only_once(self):
+        scheduler = CopyScheduler(1)
+        scheduler.acquire(lambda: 1)
+        completed = Future()
+        on_timeout = MagicMock()
+
+        scheduler.release_when_done(completed, 0.01, on_timeout=on_timeout)
+        wait_for(lambda: scheduler.in_flight == 0)
+        completed.set_result(True)
+
+        on_timeout.assert_called_once_with()
+        self.assertEqual(0, scheduler.in_flight)
+
+    def test_a_reservation_resolves_once_a_slot_is_released(self):
+        scheduler = CopyScheduler(1)
+        scheduler.acquire(lambda: 1)
+
+        reservation = scheduler.reserve(lambda: 1)
+        self.assertFalse(reservation.done())
+        scheduler.release()
+
+        self.assertTrue(reservation.done())
+        self.assertTrue(scheduler.take(reservation))
+        self.assertFalse(scheduler.take(reservation))
+        self.assertEqual(1, scheduler.in_flight)
+
+    def test_a_discarded_reservation_leaves_the_queue(self):
+        scheduler = CopyScheduler(1)
+        scheduler.acquire(lambda: 1)
+        reservation = scheduler.reserve(lambda: 1)
+
+        scheduler.discard(reservation)
+        scheduler.release()
+
+        self.assertEqual([], scheduler._waiting)
+        self.assertEqual(0, scheduler.in_flight)
+
+    def test_a_discarded_slot_no_copy_took_over_is_freed(self):
+        scheduler = CopyScheduler(1)
+        reservation = scheduler.reserve(lambda: 1)
+        self.assertEqual(1, scheduler.in_flight)
+
+        scheduler.discard(reservation)
+
+        self.assertEqual(0, scheduler.in_flight)
+        self.assertFalse(scheduler.take(reservation))
+
+
+class CopyConcurrencyConfigTest(unittest.TestCase):
+
+    def engine(self, payload):
+        engine = MagicMock(COPY_CONCURRENCY=20, lambda_payload={'config': payload})
+        engine.get_engine_type.return_value = 'ebs'
+        return engine
+
+    def test_defaults_to_the_engine_limit(self):
+        self.assertEqual(20, RuntimeConfig.get_copy_concurrency(self.engine({})))
+
+    def test_single_limit(self):
+        self.assertEqual(3, RuntimeConfig.get_copy_concurrency(self.engine({'shelvery_copy_concurrency': '3'})))
+
+    def test_limit_per_backup_type(self):
+        engine = self.engine({'shelvery_copy_concurrency': 'rds:5, ebs:10'})
+        self.assertEqual(10, RuntimeConfig.get_copy_concurrency(engine))
+        engine.get_engine_type.return_value = 'docdb'
+        self.assertEqual(20, RuntimeConfig.get_copy_concurrency(engine))
+
+
+class ScheduledCopyTest(unittest.TestCase):
+    """The engine side, with copy_backup_to_region stubbed."""
+
+    def setUp(self):
+        for p in (patch('shelvery.aws_helper.AwsHelper.local_account_id', return_value='123456789012'),
+                  patch('shelvery.aws_helper.AwsHelper.local_region', return_value='ap-southeast-2'),
+                  patch('shelvery.aws_helper.AwsHelper.boto3_client', return_value=MagicMock()),
+                  patch('shelvery.engine.time.sleep')):
+            p.start()
+            self.addCleanup(p.stop)
+        CopyScheduler.clear()
+        self.addCleanup(CopyScheduler.clear)
+
+        from shelvery.factory import ShelveryFactory
+        self.engine = ShelveryFactory.get_shelvery_instance('ebs')
+        self.scheduler = CopyScheduler.for_engine(self.engine, 'us-east-1', 20)
+
+    def test_the_slot_is_released_when_the_copy_fails(self):
+        with patch.object(self.engine, 'copy_backup_to_region', side_effect=ValueError('boom')):
+            with self.assertRaises(ValueError):
+                self.engine._scheduled_copy('snap-1', 'ap-southeast-2', 'us-east-1')
+
+        self.assertEqual(0, self.scheduler.in_flight)
+
+    def test_copies_refused_over_the_aws_limit_are_retried(self):
+        refused = ClientError({'Error': {'Code': 'ResourceLimitExceeded', 'Message': 'too many'}}, 'CopySnapshot')
+        poller = MagicMock()
+        poller.wait.return_value = Future()
+
+        with patch.object(self.engine, 'copy_backup_to_region', side_effect=[refused, 'snap-2']), \
+                patch('shelvery.engine.AvailabilityPoller.for_engine', return_value=poller):
+            self.assertEqual('snap-2', self.engine._scheduled_copy('snap-1', 'ap-southeast-2', 'us-east-1'))
+
+        poller.wait.assert_called_once_with('snap-2', learn=False)
+        # held until the copy is available
+        self.assertEqual(1, self.scheduler.in_flight)
+        poller.wait.return_value.set_result(True)
+        self.assertEqual(0, self.scheduler.in_flight)
+
+    def test_a_slot_reserved_by_the_pipeline_is_taken_over(self):
+        poller = MagicMock()
+        poller.wait.return_value = Future()
+        self.scheduler.limit = 1
+        self.engine.copy_slot = self.scheduler.reserve(lambda: 1)
+
+        with patch.object(self.engine, 'copy_backup_to_region', return_value='snap-2'), \
+                patch('shelvery.engine.AvailabilityPoller.for_engine', return_value=poller):
+            self.assertEqual('snap-2', self.engine._scheduled_copy('snap-1', 'ap-southeast-2', 'us-east-1'))
+
+        self.assertIsNone(self.engine.copy_slot)
+        self.assertEqual(1, self.scheduler.in_flight)
+
+    def test_lambda_copies_go_straight_to_aws(self):
+        self.engine.lambda_payload, self.engine.aws_request_id = {}, 'request-1'
+
+        with patch.object(self.engine, 'copy_backup_to_region', return_value='snap-2') as copy, \
+                patch('shelvery.engine.AvailabilityPoller.for_engine') as for_engine, \
+                patch.object(CopyScheduler, 'acquire') as acquire:
+            self.assertEqual('snap-2', self.engine._scheduled_copy('snap-1', 'ap-southeast-2', 'us-east-1'))
+
+        copy.assert_called_once_with('snap-1', 'us-east-1', None)
+        acquire.assert_not_called()
+        for_engine.assert_not_called()
+        self.assertEqual(0, self.scheduler.in_flight)
+
+
+if __name__ == '__main__':
+    unittest.main()
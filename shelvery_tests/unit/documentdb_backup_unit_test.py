@@ -0,0 +1,134 @@
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+from botocore.exceptions import ClientError
+
+from shelvery.factory import ShelveryFactory
+from shelvery_tests.unit.engine_report_unit_test import aws_patchers
+from shelvery_tests.unit.rds_backup_unit_test import shelvery_tags
+
+
+def snapshot_arn(snapshot_id):
+    return f"arn:aws:rds:ap-southeast-2:123456789012:cluster-snapshot:{snapshot_id}"
+
+
+class DocumentDbSnapshotTagsTest(unittest.TestCase):
+    """A DocumentDb clean run must not list tags of every snapshot one at a time."""
+
+    def setUp(self):
+        for p in aws_patchers():
+            p.start()
+            self.addCleanup(p.stop)
+
+        self.engine = ShelveryFactory.get_shelvery_instance('docdb')
+        self.snapshots = [
+            {'DBClusterSnapshotIdentifier': snapshot_id, 'DBClusterIdentifier': 'docs',
+             'DBClusterSnapshotArn': snapshot_arn(snapshot_id)}
+            for snapshot_id in ['docs-1-daily', 'docs-2-daily', 'manual-one']
+        ]
+        self.tags = {
+            snapshot_arn('docs-1-daily'): shelvery_tags('docs-1-daily', 'docs'),
+            snapshot_arn('docs-2-daily'): shelvery_tags('docs-2-daily', 'docs'),
+            snapshot_arn('manual-one'): [],
+        }
+
+        self.docdb = MagicMock()
+        self.docdb.get_paginator.side_effect = lambda operation_name: self.paginator({
+            'describe_db_cluster_snapshots': {'DBClusterSnapshots': self.snapshots},
+            'describe_db_clusters': {'DBClusters': [
+                {'DBClusterIdentifier': 'docs', 'DBClusterArn': 'arn:cluster:docs',
+                 'ClusterCreateTime': datetime(2026, 1, 1)}]},
+        }[operation_name])
+        self.docdb.list_tags_for_resource.side_effect = \
+            lambda ResourceName: {'TagList': self.tags.get(ResourceName, [])}
+
+        self.tagging = MagicMock()
+        self.tagging.get_paginator.return_value = self.paginator({'ResourceTagMappingList': [
+            {'ResourceARN': arn, 'Tags': tags} for arn, tags in self.tags.items() if tags]})
+
+        patcher = patch('shelvery.documentdb_backup.AwsHelper.boto3_client',
+                        side_effect=lambda service, **kwargs:
+                        self.tagging if service == 'resourcegroupstaggingapi' else self.docdb)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def paginator(page):
+        paginator = MagicMock()
+        paginator.paginate.return_value = [page]
+        return paginator
+
+    def snapshot_tag_calls(self):
+        return [c for c in self.docdb.list_tags_for_resource.call_args_list
+                if ':cluster-snapshot:' in c.kwargs['ResourceName']]
+
+    def test_snapshot_tags_are_read_in_bulk(self):
+        backups = self.engine.get_existing_backups('shelvery')
+
+        self.assertEqual(['docs-1-daily', 'docs-2-daily'], sorted(b.backup_id for b in backups))
+        self.assertEqual([], self.snapshot_tag_calls())
+        self.tagging.get_paginator.return_value.paginate.assert_called_once_with(
+            PaginationConfig={'PageSize': 100},
+            TagFilters=[{'Key': 'shelvery:backup', 'Values': ['True', 'true', '1', 'TRUE']}],
+            ResourceTypeFilters=['rds:cluster-snapshot'])
+
+    def test_falls_back_to_cached_per_snapshot_tags(self):
+        self.tagging.get_paginator.return_value.paginate.side_effect = ClientError(
+            {'Error': {'Code': 'AccessDeniedException', 'Message': 'denied'}}, 'GetResources')
+
+        backups = self.engine.get_existing_backups('shelvery')
+        self.engine.get_existing_backups('shelvery')
+
+        self.assertEqual(['docs-1-daily', 'docs-2-daily'], sorted(b.backup_id for b in backups))
+        # fetched once each, the second discovery is answered from the cache
+        self.assertEqual(3, len(self.snapshot_tag_calls()))
+
+
+class DocumentDbBackupsStatusTest(unittest.TestCase):
+    """A few pending snapshots are described by id, not by listing every manual snapshot."""
+
+    def setUp(self):
+        for p in aws_patchers():
+            p.start()
+            self.addCleanup(p.stop)
+
+        self.engine = ShelveryFactory.get_shelvery_instance('docdb')
+        self.docdb = MagicMock()
+        patcher = patch('shelvery.documentdb_backup.AwsHelper.boto3_client', return_value=self.docdb)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def snapshot(snapshot_id, status='available'):
+        return {'DBClusterSnapshotIdentifier': snapshot_id, 'DBClusterIdentifier': 'docs', 'Status': status}
+
+    def test_few_pending_snapshots_are_described_by_id(self):
+        def describe(DBClusterSnapshotIdentifier):
+            if DBClusterSnapshotIdentifier == 'docs-gone':
+                raise ClientError({'Error': {'Code': 'DBClusterSnapshotNotFoundFault', 'Message': 'gone'}},
+                                  'DescribeDBClusterSnapshots')
+            return {'DBClusterSnapshots': [self.snapshot(DBClusterSnapshotIdentifier, 'creating')]}
+        self.docdb.describe_db_cluster_snapshots.side_effect = describe
+
+        statuses = self.engine.get_backups_status('ap-southeast-2', ['docs-1', 'docs-gone'])
+
+        self.assertEqual(['docs-1'], list(statuses))
+        self.assertFalse(statuses['docs-1'].available)
+        self.docdb.get_paginator.assert_not_called()
+
+    def test_many_pending_snapshots_are_found_in_one_listing(self):
+        backup_ids = [f"docs-{i}" for i in range(self.engine.STATUS_DESCRIBE_THRESHOLD + 1)]
+        paginator = MagicMock()
+        paginator.paginate.return_value = [{'DBClusterSnapshots': [self.snapshot(backup_id) for backup_id in backup_ids]
+                                            + [self.snapshot('manual-one')]}]
+        self.docdb.get_paginator.return_value = paginator
+
+        statuses = self.engine.get_backups_status('ap-southeast-2', backup_ids)
+
+        self.assertEqual(set(backup_ids), set(statuses))
+        self.docdb.describe_db_cluster_snapshots.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,285 @@
+import unittest
+from concurrent.futures import Future
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+from botocore.exceptions import ClientError
+
+from shelvery.backup_resource import BackupResource
+from shelvery.copy_scheduler import CopyScheduler
+from shelvery.entity_resource import EntityResource
+from shelvery.factory import ShelveryFactory
+from shelvery_tests.unit.engine_report_unit_test import aws_patchers
+
+
+def backup_of(volume_id):
+    backup = BackupResource(None, None, True)
+    backup.entity_id = volume_id
+    backup.entity_resource = None
+    return backup
+
+
+class PopulateVolumeInformationTest(unittest.TestCase):
+    """A clean run must not make one describe_volumes call per volume."""
+
+    def setUp(self):
+        for p in aws_patchers():
+            p.start()
+            self.addCleanup(p.stop)
+
+        self.engine = ShelveryFactory.get_shelvery_instance('ebs')
+        self.ec2 = MagicMock()
+        self.ec2.describe_volumes.side_effect = self.describe_volumes
+        patcher = patch('shelvery.ebs_backup.AwsHelper.boto3_client', return_value=self.ec2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.deleted = set()
+
+    def describe_volumes(self, VolumeIds):
+        missing = [volume_id for volume_id in VolumeIds if volume_id in self.deleted]
+        if missing:
+            raise ClientError({'Error': {'Code': 'InvalidVolume.NotFound',
+                                         'Message': f"The volume '{missing[0]}' does not exist."}},
+                              'DescribeVolumes')
+        return {'Volumes': [{'VolumeId': volume_id, 'CreateTime': datetime(2026, 1, 1),
+                             'Tags': [{'Key': 'Name', 'Value': volume_id}]} for volume_id in VolumeIds]}
+
+    def test_volumes_are_described_in_batches(self):
+        # three snapshots per volume, as a clean run would see them
+        backups = [backup_of(f"vol-{i}") for i in range(450) for _ in range(3)]
+
+        self.engine.populate_volume_information(backups)
+
+        self.assertEqual(3, self.ec2.describe_volumes.call_count)
+        self.assertTrue(all(b.entity_resource.tags['Name'] == b.entity_id for b in backups))
+
+    def test_deleted_volumes_still_resolve_to_an_empty_entity(self):
+        self.deleted = {'vol-3', 'vol-7'}
+        backups = [backup_of(f"vol-{i}") for i in range(10)]
+
+        self.engine.populate_volume_information(backups)
+
+        by_volume = {b.entity_id: b.entity_resource for b in backups}
+        self.assertEqual({}, by_volume['vol-3'].tags)
+        self.assertEqual('vol-3', by_volume['vol-3'].resource_id)
+        self.assertEqual({}, by_volume['vol-7'].tags)
+        self.assertEqual('vol-5', by_volume['vol-5'].tags['Name'])
+
+    def test_other_errors_are_raised(self):
+        self.ec2.describe_volumes.side_effect = ClientError(
+            {'Error': {'Code': 'UnauthorizedOperation', 'Message': 'denied'}}, 'DescribeVolumes')
+
+        with self.assertRaises(ClientError):
+            self.engine.populate_volume_information([backup_of('vol-1')])
+
+
+
+class ExistingBackupsTest(unittest.TestCase):
+
+    def setUp(self):
+        for p in aws_patchers():
+            p.start()
+            self.addCleanup(p.stop)
+
+        self.engine = ShelveryFactory.get_shelvery_instance('ebs')
+        self.engine.populate_volume_information = MagicMock()
+        patcher = patch('shelvery.ebs_backup.AwsHelper.boto3_client', return_value=MagicMock())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_snapshots_of_ami_backups_are_left_out(self):
+        tags = [{'Key': 'shelvery:tag_name', 'Value': 'shelvery'},
+                {'Key': 'shelvery:name', 'Value': 'disk-2026-01-01-0000-daily'},
+                {'Key': 'shelvery:retention_type', 'Value': 'daily'},
+                {'Key': 'shelvery:date_created', 'Value': '2026-01-01-0000'},
+                {'Key': 'shelvery:region', 'Value': 'ap-southeast-2'}]
+        snapshots = [
+            {'SnapshotId': 'snap-1', 'VolumeId': 'vol-1', 'Tags': tags},
+            # tagged by the create_image call, before the image id is known
+            {'SnapshotId': 'snap-2', 'VolumeId': 'vol-2',
+             'Tags': tags + [{'Key': 'shelvery:ami_name', 'Value': 'web-2026-01-01-0000-daily'}]},
+            {'SnapshotId': 'snap-3', 'VolumeId': 'vol-3', 'Tags': tags + [{'Key': 'shelvery:ami_id', 'Value': 'ami-1'}]},
+        ]
+
+        with patch('shelvery.ebs_backup.AwsHelper.paginate', return_value=iter(snapshots)):
+            backups = self.engine.get_existing_backups('shelvery')
+
+        self.assertEqual(['snap-1'], [backup.backup_id for backup in backups])
+
+
+class BackupsStatusTest(unittest.TestCase):
+
+    def setUp(self):
+        for p in aws_patchers():
+            p.start()
+            self.addCleanup(p.stop)
+
+        self.engine = ShelveryFactory.get_shelvery_instance('ebs')
+        self.ec2 = MagicMock()
+        patcher = patch('shelvery.ebs_backup.AwsHelper.boto3_client', return_value=self.ec2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_snapshots_without_progress_do_not_fail_the_batch(self):
+        self.ec2.describe_snapshots.return_value = {'Snapshots': [
+            {'SnapshotId': 'snap-1', 'State': 'pending', 'VolumeId': 'vol-1'},
+            {'SnapshotId': 'snap-2', 'State': 'completed', 'Progress': '100%', 'VolumeId': 'vol-2'},
+        ]}
+
+        statuses = self.engine.get_backups_status('ap-southeast-2', ['snap-1', 'snap-2'])
+
+        self.assertIsNone(statuses['snap-1'].progress)
+        self.assertTrue(statuses['snap-2'].available)
+
+
+class TagOnCreateTest(unittest.TestCase):
+    """Snapshots carry their tags from the create call, with no create_tags round trip."""
+
+    def setUp(self):
+        for p in aws_patchers():
+            p.start()
+            self.addCleanup(p.stop)
+
+        self.engine = ShelveryFactory.get_shelvery_instance('ebs')
+        self.engine.snspublisher = MagicMock()
+        self.engine.snspublisher_error = MagicMock()
+        self.engine.store_backup_data = MagicMock()
+        self.ec2 = MagicMock()
+        self.ec2.create_snapshot.return_value = {'SnapshotId': 'snap-1'}
+        for target in ('shelvery.ebs_backup.AwsHelper.boto3_client', 'shelvery.ec2_backup.AwsHelper.boto3_client'):
+            patcher = patch(target, return_value=self.ec2)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_tags_are_passed_to_create_snapshot(self):
+        entity = EntityResource('vol-1', 'ap-southeast-2', datetime(2026, 1, 1), {'Name': 'disk'})
+
+        backup = self.engine._create_entity_backup(entity, 'ec2 volume', None)
+
+        self.assertEqual('snap-1', backup.backup_id)
+        tag_specifications = self.ec2.create_snapshot.call_args[1]['TagSpecifications']
+        self.assertEqual([{'ResourceType': 'snapshot', 'Tags': backup.boto3_tags}], tag_specifications)
+        self.ec2.create_tags.assert_not_called()
+
+    def test_dr_copies_are_tagged_by_the_copy_call(self):
+        CopyScheduler.clear()
+        self.addCleanup(CopyScheduler.clear)
+        original = BackupResource.construct('shelvery', 'snap-1', {
+            'shelvery:tag_name': 'shelvery', 'shelvery:name': 'disk-2026-01-01-0000-daily',
+            'shelvery:retention_type': 'daily', 'shelvery:date_created': '2026-01-01-0000',
+            'shelvery:region': 'ap-southeast-2'}, '123456789012')
+        self.engine.get_backup_resource = MagicMock(return_value=original)
+        self.engine.wait_backup_available = MagicMock(return_value=True)
+        self.engine.tag_backup_resource = MagicMock()
+        self.ec2.describe_snapshots.return_value = {'Snapshots': [{'Description': 'disk'}]}
+        self.ec2.copy_snapshot.return_value = {'SnapshotId': 'snap-2'}
+        poller = MagicMock()
+        poller.wait.return_value = Future()
+
+        with patch('shelvery.engine.AvailabilityPoller.for_engine', return_value=poller):
+            self.engine.do_copy_backup(BackupId='snap-1', OriginRegion='ap-southeast-2', Region='us-east-1')
+
+        tags = self.ec2.copy_snapshot.call_args[1]['TagSpecifications'][0]['Tags']
+        self.assertIn({'Key': 'shelvery:dr_copy', 'Value': 'true'}, tags)
+        self.assertIn({'Key': 'shelvery:region', 'Value': 'us-east-1'}, tags)
+        # only the original is tagged afterwards, with just the id of its new copy
+        self.engine.tag_backup_resource.assert_called_once_with(original, {'shelvery:dr_copies': 'us-east-1:snap-2 '})
+
+    @patch.dict('os.environ', {'shelvery_share_aws_account_ids': '111111111111'})
+    def test_nothing_is_recorded_or_shared_without_a_copy(self):
+        original = BackupResource.construct('shelvery', 'snap-1', {
+            'shelvery:tag_name': 'shelvery', 'shelvery:name': 'disk-2026-01-01-0000-daily',
+            'shelvery:retention_type': 'daily', 'shelvery:date_created': '2026-01-01-0000',
+            'shelvery:region': 'ap-southeast-2'}, '123456789012')
+        self.engine.get_backup_resource = MagicMock(return_value=original)
+        self.engine.wait_backup_available = MagicMock(return_value=True)
+        self.engine.tag_backup_resource = MagicMock()
+        self.engine.share_backup = MagicMock()
+
+        # as redshift does, copying through cluster configuration rather than a copy of the backup
+        with patch.object(self.engine, '_scheduled_copy', return_value=None):
+            self.engine.do_copy_backup(BackupId='snap-1', OriginRegion='ap-southeast-2', Region='us-east-1')
+
+        self.assertEqual(1, self.engine.get_backup_resource.call_count)
+        self.engine.tag_backup_resource.assert_not_called()
+        self.engine.store_backup_data.assert_not_called()
+        self.engine.share_backup.assert_not_called()
+
+
+class ShareWithAccountsTest(unittest.TestCase):
+    """A backup is shared with all of the configured accounts in a single call."""
+
+    def setUp(self):
+        for p in aws_patchers():
+            p.start()
+            self.addCleanup(p.stop)
+
+        self.engine = ShelveryFactory.get_shelvery_instance('ebs')
+        self.engine.snspublisher = MagicMock()
+        self.engine.snspublisher_error = MagicMock()
+        self.engine.wait_backup_available = MagicMock(return_value=True)
+        self.engine._get_data_bucket = MagicMock()
+        self.backup = BackupResource.construct('shelvery', 'snap-1', {
+            'shelvery:tag_name': 'shelvery', 'shelvery:name': 'disk-2026-01-01-0000-daily',
+            'shelvery:retention_type': 'daily', 'shelvery:date_created': '2026-01-01-0000',
+            'shelvery:region': 'ap-southeast-2'}, '123456789012')
+        self.engine.get_backup_resource = MagicMock(return_value=self.backup)
+        self.ec2 = MagicMock()
+        patcher = patch('shelvery.ebs_backup.AwsHelper.boto3_session', return_value=self.ec2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_one_share_is_dispatched_per_backup(self):
+        self.engine.share_backup = MagicMock()
+        self.engine.store_backup_data = MagicMock()
+        self.engine._dispatch_copy = MagicMock()
+        self.engine.backup_resource = MagicMock()
+        self.engine.get_entities_to_backup = MagicMock(return_value=[
+            EntityResource('vol-1', 'ap-southeast-2', datetime(2026, 1, 1), {}),
+            EntityResource('vol-2', 'ap-southeast-2', datetime(2026, 1, 1), {})])
+
+        with patch.dict('os.environ', {'shelvery_share_aws_account_ids': '111111111111,222222222222'}):
+            self.engine.create_backups()
+
+        self.assertEqual(2, self.engine.share_backup.call_count)
+        for call in self.engine.share_backup.call_args_list:
+            self.assertEqual(['111111111111', '222222222222'], call[0][1])
+
+    def test_all_accounts_are_added_in_one_call(self):
+        self.engine.do_share_backup(BackupId='snap-1', Region='ap-southeast-2',
+                                    AwsAccountIds=['111111111111', '222222222222'])
+
+        self.ec2.Snapshot.return_value.modify_attribute.assert_called_once_with(
+            Attribute='createVolumePermission',
+            CreateVolumePermission={'Add': [{'UserId': '111111111111'}, {'UserId': '222222222222'}]},
+            UserIds=['111111111111', '222222222222'],
+            OperationType='add')
+        keys = [c[1]['Key'] for c in self.engine._get_data_bucket.return_value.put_object.call_args_list]
+        self.assertEqual(['backups/shared/111111111111/ebs/disk-2026-01-01-0000-daily.yaml',
+                          'backups/shared/222222222222/ebs/disk-2026-01-01-0000-daily.yaml'], keys)
+        self.assertEqual(2, self.engine.snspublisher.notify.call_count)
+
+    def test_single_account_payloads_are_still_shared(self):
+        self.engine.do_share_backup(BackupId='snap-1', Region='ap-southeast-2', AwsAccountId='111111111111')
+
+        self.assertEqual(['111111111111'],
+                         self.ec2.Snapshot.return_value.modify_attribute.call_args[1]['UserIds'])
+
+    def test_accounts_are_shared_one_by_one_when_one_is_rejected(self):
+        def modify_attribute(**kwargs):
+            if '222222222222' in kwargs['UserIds']:
+                raise ClientError({'Error': {'Code': 'InvalidParameterValue'}}, 'ModifySnapshotAttribute')
+        self.ec2.Snapshot.return_value.modify_attribute.side_effect = modify_attribute
+
+        self.engine.do_share_backup(BackupId='snap-1', Region='ap-southeast-2',
+                                    AwsAccountIds=['111111111111', '222222222222'])
+
+        calls = [c[1]['UserIds'] for c in self.ec2.Snapshot.return_value.modify_attribute.call_args_list]
+        self.assertEqual([['111111111111', '222222222222'], ['111111111111'], ['222222222222']], calls)
+        # the account that accepted the share still gets its metadata
+        self.engine.snspublisher.notify.assert_called_once()
+        self.engine.snspublisher_error.notify.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,195 @@
+import unittest
+from unittest.mock import MagicMock, call, patch
+
+import yaml
+from botocore.exceptions import ClientError
+
+from shelvery.backup_report import RunReport, current_run_report
+from shelvery.factory import ShelveryFactory
+from shelvery_tests.unit.engine_report_unit_test import aws_patchers
+
+IMAGE = {
+    'ImageId': 'ami-1',
+    'Tags': [
+        {'Key': 'shelvery:tag_name', 'Value': 'shelvery'},
+        {'Key': 'shelvery:name', 'Value': 'web-2026-01-01-0000-daily'},
+        {'Key': 'shelvery:retention_type', 'Value': 'daily'},
+        {'Key': 'shelvery:date_created', 'Value': '2026-01-01-0000'},
+        {'Key': 'shelvery:region', 'Value': 'ap-southeast-2'},
+        {'Key': 'shelvery:dr_copies', 'Value': ''},
+    ],
+    'BlockDeviceMappings': [
+        {'DeviceName': '/dev/xvda', 'Ebs': {'SnapshotId': 'snap-1'}},
+        {'DeviceName': '/dev/xvdb', 'Ebs': {'SnapshotId': 'snap-2'}},
+        {'DeviceName': '/dev/xvdc', 'VirtualName': 'ephemeral0'},
+    ],
+}
+
+
+class TagUpdateTest(unittest.TestCase):
+    """Tag updates only send what changed, to the image and its snapshots at once."""
+
+    def setUp(self):
+        for p in aws_patchers():
+            p.start()
+            self.addCleanup(p.stop)
+
+        self.engine = ShelveryFactory.get_shelvery_instance('ec2ami')
+        self.ec2 = MagicMock()
+        self.ec2.describe_images.return_value = {'Images': [IMAGE]}
+        patcher = patch('shelvery.ec2ami_backup.AwsHelper.boto3_client', return_value=self.ec2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_only_changed_tags_are_written_in_one_call(self):
+        backup = self.engine.get_backup_resource('ap-southeast-2', 'ami-1')
+        backup.tags['shelvery:dr_copies'] += 'us-east-1:ami-2 '
+
+        self.engine.update_backup_tags(backup)
+
+        self.ec2.create_tags.assert_called_once_with(
+            Resources=['ami-1', 'snap-1', 'snap-2'],
+            Tags=[{'Key': 'shelvery:dr_copies', 'Value': 'us-east-1:ami-2 '}])
+        self.assertEqual(1, self.ec2.describe_images.call_count)
+
+    def test_nothing_is_written_without_changes(self):
+        backup = self.engine.get_backup_resource('ap-southeast-2', 'ami-1')
+
+        self.engine.update_backup_tags(backup)
+
+        self.ec2.create_tags.assert_not_called()
+
+    def test_stored_data_leaves_out_the_tags_as_read(self):
+        backup = self.engine.get_backup_resource('ap-southeast-2', 'ami-1')
+        backup.tagged_on_create = True
+
+        body = yaml.dump(backup, default_flow_style=False)
+        self.assertNotIn('stored_tags', body)
+        self.assertNotIn('tagged_on_create', body)
+
+        loaded = yaml.load(body, Loader=yaml.Loader)
+        self.assertEqual({}, loaded.changed_tags())
+        self.assertFalse(loaded.tagged_on_create)
+
+
+class TagOnCreateTest(unittest.TestCase):
+    """Images and their snapshots are tagged by the create call."""
+
+    def setUp(self):
+        for p in aws_patchers():
+            p.start()
+            self.addCleanup(p.stop)
+
+        self.engine = ShelveryFactory.get_shelvery_instance('ec2ami')
+        self.ec2 = MagicMock()
+        self.ec2.create_image.return_value = {'ImageId': 'ami-1'}
+        patcher = patch('shelvery.ec2ami_backup.AwsHelper.boto3_client', return_value=self.ec2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_snapshots_are_marked_with_the_image_name_and_not_as_its_id(self):
+        tags = {t['Key']: t['Value'] for t in IMAGE['Tags']}
+        backup = MagicMock(region='ap-southeast-2', entity_id='i-1', tags=tags)
+        backup.name = 'web-2026-01-01-0000-daily'
+
+        self.engine.backup_resource(backup)
+
+        specifications = {s['ResourceType']: {t['Key']: t['Value'] for t in s['Tags']}
+                          for s in self.ec2.create_image.call_args[1]['TagSpecifications']}
+        self.assertEqual('web-2026-01-01-0000-daily', specifications['snapshot']['shelvery:ami_name'])
+        self.assertNotIn('shelvery:ami_id', specifications['snapshot'])
+        self.assertNotIn('shelvery:ami_name', specifications['image'])
+        self.assertEqual('ami-1', backup.backup_id)
+
+
+class SnapshotCallsTest(unittest.TestCase):
+    """Images are described in batches, and their snapshots are shared and deleted concurrently."""
+
+    def setUp(self):
+        for p in aws_patchers():
+            p.start()
+            self.addCleanup(p.stop)
+
+        self.engine = ShelveryFactory.get_shelvery_instance('ec2ami')
+        self.ec2 = MagicMock()
+        self.ec2.describe_images.return_value = {'Images': [IMAGE]}
+        patcher = patch('shelvery.ec2ami_backup.AwsHelper.boto3_client', return_value=self.ec2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_delete_reuses_the_snapshots_read_with_the_backup(self):
+        backup = self.engine.get_backup_resource('ap-southeast-2', 'ami-1')
+
+        self.engine.delete_backup(backup)
+
+        self.assertEqual(1, self.ec2.describe_images.call_count)
+        self.ec2.deregister_image.assert_called_once_with(ImageId='ami-1')
+        self.assertCountEqual([call(SnapshotId='snap-1'), call(SnapshotId='snap-2')],
+                              self.ec2.delete_snapshot.call_args_list)
+
+    def test_a_failed_snapshot_delete_fails_the_backup_delete(self):
+        backup = self.engine.get_backup_resource('ap-southeast-2', 'ami-1')
+        self.ec2.delete_snapshot.side_effect = ClientError({'Error': {'Code': 'InvalidSnapshot.InUse'}},
+                                                           'DeleteSnapshot')
+
+        with self.assertRaises(ClientError):
+            self.engine.delete_backup(backup)
+
+    def test_image_and_snapshots_are_shared_with_all_accounts(self):
+        self.engine.share_backup_with_accounts('ap-southeast-2', 'ami-1', ['111111111111', '222222222222'])
+
+        permissions = {'Add': [{'UserId': '111111111111'}, {'UserId': '222222222222'}]}
+        self.ec2.modify_image_attribute.assert_called_once_with(
+            ImageId='ami-1', Attribute='launchPermission', LaunchPermission=permissions,
+            UserIds=['111111111111', '222222222222'], OperationType='add')
+        self.assertCountEqual(['snap-1', 'snap-2'],
+                              [c[1]['SnapshotId'] for c in self.ec2.modify_snapshot_attribute.call_args_list])
+        for c in self.ec2.modify_snapshot_attribute.call_args_list:
+            self.assertEqual(permissions, c[1]['CreateVolumePermission'])
+
+    def test_snapshot_calls_run_in_the_callers_context(self):
+        report = RunReport('create_backups', 'ec2ami', '123456789012', 'ap-southeast-2')
+        seen = []
+        self.ec2.modify_snapshot_attribute.side_effect = lambda **kwargs: seen.append(current_run_report.get(None))
+
+        token = current_run_report.set(report)
+        try:
+            self.engine.share_backup_with_accounts('ap-southeast-2', 'ami-1', ['111111111111'])
+        finally:
+            current_run_report.reset(token)
+
+        self.assertEqual([report, report], seen)
+
+    def test_pending_images_report_the_progress_of_their_snapshots(self):
+        pending = dict(IMAGE, State='pending', BlockDeviceMappings=[
+            {'DeviceName': '/dev/xvda', 'Ebs': {'SnapshotId': 'snap-1', 'VolumeSize': 10}},
+            {'DeviceName': '/dev/xvdb', 'Ebs': {'SnapshotId': 'snap-2', 'VolumeSize': 30}},
+        ])
+        available = dict(IMAGE, ImageId='ami-2', State='available')
+        self.ec2.describe_images.return_value = {'Images': [pending, available]}
+        self.ec2.describe_snapshots.return_value = {'Snapshots': [
+            {'SnapshotId': 'snap-1', 'Progress': '100%'},
+            {'SnapshotId': 'snap-2', 'Progress': '50%'},
+        ]}
+
+        statuses = self.engine.get_backups_status('ap-southeast-2', ['ami-1', 'ami-2'])
+
+        self.ec2.describe_snapshots.assert_called_once_with(SnapshotIds=['snap-1', 'snap-2'])
+        self.assertFalse(statuses['ami-1'].available)
+        self.assertEqual(62.5, statuses['ami-1'].progress)
+        self.assertEqual(40, statuses['ami-1'].size)
+        self.assertTrue(statuses['ami-2'].available)
+
+    def test_images_are_still_polled_when_snapshot_progress_is_unknown(self):
+        self.ec2.describe_images.return_value = {'Images': [dict(IMAGE, State='pending')]}
+        self.ec2.describe_snapshots.side_effect = ClientError({'Error': {'Code': 'InvalidSnapshot.NotFound'}},
+                                                              'DescribeSnapshots')
+
+        statuses = self.engine.get_backups_status('ap-southeast-2', ['ami-1'])
+
+        self.assertFalse(statuses['ami-1'].available)
+        self.assertIsNone(statuses['ami-1'].progress)
+
+
+if __name__ == '__main__':
+    unittest.main()
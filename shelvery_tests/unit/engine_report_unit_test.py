@@ -1,9 +1,13 @@
+import threading
+import time
 import unittest
 from unittest.mock import MagicMock, patch
 
 from botocore.exceptions import ClientError
 
 import shelvery.engine
+from shelvery.availability_poller import BackupStatus
+from shelvery.engine import ShelveryEngine
 from shelvery.entity_resource import EntityResource
 from shelvery.factory import ShelveryFactory
 
@@ -106,6 +110,25 @@ class ReportIsAdditiveTest(EngineTestCase):
         self.engine.start_run_report('create_backups')
         self.engine.publish_run_report()   # must not raise
 
+    def test_report_names_the_account_of_the_role(self):
+        self.engine.role_arn = 'arn:aws:iam::210987654321:role/shelvery'
+        with patch('shelvery.engine.AwsHelper.caller_identity', return_value={'Account': '210987654321'}):
+            self.engine.start_run_report('create_backups')
+        self.engine.publish_run_report()
+
+        self.assertEqual('210987654321', self.report['account_id'])
+
+    def test_collected_reports_are_handed_over_instead_of_published(self):
+        collected = []
+        ShelveryEngine.collect_run_reports(collected)
+        self.addCleanup(ShelveryEngine.collect_run_reports, None)
+
+        self.engine.start_run_report('create_backups')
+        self.engine.publish_run_report()
+
+        self.assertEqual([], self.published)
+        self.assertEqual(['create_backups'], [r.action for r in collected])
+
 
 class DecoratorCoverageTest(EngineTestCase):
     """Guards against a future subclass override silently dropping reporting."""
@@ -260,6 +283,9 @@ class StoreBackupDataReportTest(EngineTestCase):
 
         self.engine.get_backup_resource = MagicMock(return_value=backup)
         self.engine.is_backup_available = MagicMock(return_value=True)
+        self.engine.get_backups_status = MagicMock(return_value={'snap-1': BackupStatus(True)})
+        self.engine.load_poll_estimates = MagicMock(return_value={})
+        self.engine.save_poll_estimates = MagicMock()
         self.engine._get_data_bucket = MagicMock()
         self.engine._write_backup_data = MagicMock()
 
@@ -343,3 +369,211 @@ class ResourceContextTest(EngineTestCase):
     def test_backup_context_tolerates_a_bare_object(self):
         self.assertEqual({'entity_id': None, 'entity_name': None, 'retention_type': None},
                          self.engine.backup_context(object()))
+
+
+class ConcurrentCreateBackupsTest(EngineTestCase):
+    """Running entities on a worker pool must not change what a run reports."""
+
+    def setUp(self):
+        super().setUp()
+        self.engine.tag_backup_resource = MagicMock()
+        self.engine.store_backup_data = MagicMock()
+        self.engine.copy_backup = MagicMock()
+        self.engine.get_entities_to_backup = MagicMock(return_value=[
+            EntityResource(f"vol-{i}", 'ap-southeast-2', '2026-08-14', {'Name': f"disk{i}"})
+            for i in range(20)
+        ])
+        patcher = patch.dict('os.environ', {'shelvery_create_concurrency': '4'})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_every_entity_is_reported_and_copied_in_order(self):
+        def backup_resource(br):
+            if br.entity_id == 'vol-7':
+                raise RuntimeError('unsupported backup mode')
+            br.backup_id = f"snap-{br.entity_id}"
+        self.engine.backup_resource = backup_resource
+
+        backups = self.engine.create_backups()
+
+        self.assertEqual('PARTIAL', self.report['status'])
+        self.assertEqual(19, self.report['summary']['succeeded'])
+        self.assertEqual(1, self.report['summary']['failed'])
+        self.assertEqual(19, self.engine.snspublisher.notify.call_count)
+        self.assertEqual([f"vol-{i}" for i in range(20) if i != 7], [b.entity_id for b in backups])
+        self.assertEqual([b.backup_id for b in backups],
+                         [c[0][0].backup_id for c in self.engine.copy_backup.call_args_list])
+
+    def test_a_failed_store_still_copies_the_created_backup(self):
+        self.engine.backup_resource = MagicMock()
+        self.engine.store_backup_data = MagicMock(side_effect=RuntimeError('s3 down'))
+
+        backups = self.engine.create_backups()
+
+        self.assertEqual(20, len(backups))
+        self.assertEqual(20, self.report['summary']['failed'])
+
+
+class ConcurrentCleanBackupsTest(EngineTestCase):
+    """A retention change can expire tens of thousands of backups in one run."""
+
+    def setUp(self):
+        super().setUp()
+        self.backups = []
+        for i in range(30):
+            backup = MagicMock()
+            backup.backup_id = f"snap-{i}"
+            backup.name = f"disk{i}-daily"
+            backup.is_stale.return_value = i % 3 != 0
+            self.backups.append(backup)
+        self.engine.get_existing_backups = MagicMock(return_value=self.backups)
+        self.engine._get_data_bucket = MagicMock()
+        self.engine._archive_backup_metadata = MagicMock()
+
+        self.deleted = []
+        self.deleting = 0
+        self.most_deleting = 0
+        self.lock = threading.Lock()
+
+    def delete_backup(self, backup):
+        with self.lock:
+            self.deleted.append(backup.backup_id)
+            self.deleting += 1
+            self.most_deleting = max(self.most_deleting, self.deleting)
+        time.sleep(0.01)
+        with self.lock:
+            self.deleting -= 1
+        if backup.backup_id == 'snap-5':
+            raise RuntimeError('snapshot in use')
+
+    def test_every_outcome_is_reported_and_deletes_are_capped(self):
+        self.engine.delete_backup = self.delete_backup
+        self.engine.CLEAN_DELETE_CONCURRENCY = 3
+
+        with patch.dict('os.environ', {'shelvery_clean_concurrency': '8'}):
+            self.engine.clean_backups()
+
+        self.assertEqual(19, self.report['summary']['succeeded'])
+        self.assertEqual(1, self.report['summary']['failed'])
+        self.assertEqual(19, self.engine._archive_backup_metadata.call_count)
+        self.assertLessEqual(self.most_deleting, 3)
+        # the backups that are kept were never touched
+        self.assertEqual(sorted(b.backup_id for b in self.backups if b.is_stale.return_value),
+                         sorted(self.deleted))
+
+    def test_backups_that_never_started_are_reported(self):
+        started = []
+
+        def delete_backup(backup):
+            started.append(backup)
+            if len(started) == 1:
+                raise KeyboardInterrupt()
+
+        self.engine._delete_expired_backup = MagicMock(side_effect=lambda backup, *args: delete_backup(backup))
+
+        with patch.dict('os.environ', {'shelvery_clean_concurrency': '2'}):
+            with self.assertRaises(KeyboardInterrupt):
+                self.engine.clean_backups()
+
+        reported = [e for e in self.report['entries'] if e['operation'] == 'DeleteBackup']
+        # each expired backup either started, or is reported as never having started
+        self.assertEqual(20, len(started) + len(reported))
+        self.assertTrue(all(e['error'].startswith('CancelledError') for e in reported))
+
+
+class DataBucketCacheTest(EngineTestCase):
+    """Archiving a backup's metadata must not cost three S3 control plane calls."""
+
+    def setUp(self):
+        super().setUp()
+        for cache in (shelvery.engine.ShelveryEngine._data_buckets,
+                      shelvery.engine.ShelveryEngine._data_bucket_handles.__dict__):
+            cache.clear()
+            self.addCleanup(cache.clear)
+
+        self.s3 = MagicMock()
+        patcher = patch('shelvery.engine.AwsHelper.boto3_client', return_value=self.s3)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch('shelvery.engine.boto3.session.Session', side_effect=lambda *args, **kwargs: MagicMock())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_bucket_is_verified_once_per_region(self):
+        for _ in range(5):
+            self.engine._get_data_bucket()
+            self.engine._get_data_bucket('us-east-1')
+
+        self.assertEqual(2, self.s3.head_bucket.call_count)
+        self.s3.put_public_access_block.assert_not_called()
+
+    def test_threads_share_the_verification_but_not_the_handle(self):
+        handles = []
+        threads = [threading.Thread(target=lambda: handles.append(self.engine._get_data_bucket()))
+                   for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(1, self.s3.head_bucket.call_count)
+        self.assertEqual(3, len({id(handle) for handle in handles}))
+
+    def test_a_missing_bucket_is_created_with_public_access_blocked(self):
+        self.s3.head_bucket.side_effect = ClientError({'Error': {'Code': '404', 'Message': 'nope'}},
+                                                      'HeadBucket')
+
+        self.engine._get_data_bucket('us-east-1')
+        self.engine._get_data_bucket('us-east-1')
+
+        self.s3.create_bucket.assert_called_once()
+        self.s3.put_public_access_block.assert_called_once()
+        self.s3.put_bucket_policy.assert_called_once()
+
+    def test_create_data_buckets_enforces_public_access_block(self):
+        self.engine._bucket_policy_changed = MagicMock(return_value=False)
+
+        self.engine.create_data_buckets()
+
+        self.assertEqual(1, self.s3.put_public_access_block.call_count)
+
+
+class PollEstimatesTest(EngineTestCase):
+    """Completion estimates outlive the run that observed them."""
+
+    def setUp(self):
+        super().setUp()
+        self.objects = {}
+        bucket = MagicMock()
+        bucket.put_object.side_effect = lambda Key, Body: self.objects.__setitem__(Key, Body)
+
+        def get_object(key):
+            if key not in self.objects:
+                raise ClientError({'Error': {'Code': 'NoSuchKey', 'Message': 'missing'}}, 'GetObject')
+            return {'Body': MagicMock(read=MagicMock(return_value=self.objects[key].encode()))}
+
+        bucket.Object.side_effect = lambda key: MagicMock(get=lambda: get_object(key))
+        self.engine._get_data_bucket = MagicMock(return_value=bucket)
+
+    def test_nothing_saved_yet(self):
+        self.assertEqual({}, self.engine.load_poll_estimates('ap-southeast-2'))
+
+    def test_saved_estimates_are_loaded_back(self):
+        self.engine.save_poll_estimates('ap-southeast-2', {'vol-1': 2.5})
+
+        self.assertEqual({'vol-1': 2.5}, self.engine.load_poll_estimates('ap-southeast-2'))
+        self.assertEqual(['poll_estimates/ebs/ap-southeast-2.yaml'], list(self.objects))
+
+    def test_regions_are_saved_apart(self):
+        self.engine.save_poll_estimates('ap-southeast-2', {'vol-1': 2.5})
+        self.engine.save_poll_estimates('us-east-1', {'vol-1': 9.0})
+
+        self.assertEqual({'vol-1': 2.5}, self.engine.load_poll_estimates('ap-southeast-2'))
+        self.assertEqual({'vol-1': 9.0}, self.engine.load_poll_estimates('us-east-1'))
+
+    def test_saving_keeps_the_estimates_saved_since(self):
+        self.engine.save_poll_estimates('ap-southeast-2', {'vol-1': 2.5})
+        # another run saved vol-2 in the meantime
+        self.engine.save_poll_estimates('ap-southeast-2', {'vol-2': 4.0})
+
+        self.assertEqual({'vol-1': 2.5, 'vol-2': 4.0}, self.engine.load_poll_estimates('ap-southeast-2'))
@@ -0,0 +1,163 @@
+import unittest
+from unittest.mock import patch
+
+import boto3
+from botocore.awsrequest import AWSResponse
+from botocore.config import Config
+
+from shelvery.backup_report import RunReport, current_run_report
+from shelvery.rate_limiter import READ, TAG, WRITE, RateLimiter, TokenBucket, operation_class
+
+THROTTLED = (503, b'<Response><Errors><Error><Code>RequestLimitExceeded</Code>'
+                  b'<Message>Request limit exceeded.</Message></Error></Errors></Response>')
+NO_SNAPSHOTS = (200, b'<DescribeSnapshotsResponse><snapshotSet/></DescribeSnapshotsResponse>')
+
+
+class RawBody:
+    def __init__(self, body):
+        self.body = body
+
+    def stream(self, **kwargs):
+        yield self.body
+
+
+class TokenBucketTest(unittest.TestCase):
+    """Additive increase, multiplicative decrease."""
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = patch('shelvery.rate_limiter.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.sleep = patch('shelvery.rate_limiter.time.sleep').start()
+        self.addCleanup(patch.stopall)
+
+    def test_a_throttle_halves_the_rate_once_per_interval(self):
+        bucket = TokenBucket(8, 10)
+
+        bucket.throttled()
+        bucket.throttled()
+        self.assertEqual(4, bucket.rate)
+
+        self.now += TokenBucket.DECREASE_INTERVAL
+        bucket.throttled()
+        self.assertEqual(2, bucket.rate)
+        self.assertEqual(3, bucket.throttles)
+
+    def test_the_rate_recovers_up_to_its_limit(self):
+        bucket = TokenBucket(8, 10)
+        bucket.throttled()
+
+        for _ in range(1000):
+            bucket.succeeded()
+
+        self.assertEqual(8, bucket.rate)
+
+    def test_callers_wait_their_turn_once_the_burst_is_spent(self):
+        bucket = TokenBucket(2, 2)
+
+        waits = [bucket.acquire() for _ in range(4)]
+
+        self.assertEqual([0, 0, 0.5, 1.0], waits)
+
+    def test_the_rate_never_drops_to_nothing(self):
+        bucket = TokenBucket(1, 1)
+        for _ in range(20):
+            self.now += TokenBucket.DECREASE_INTERVAL
+            bucket.throttled()
+
+        self.assertEqual(TokenBucket.MIN_RATE, bucket.rate)
+
+
+class OperationClassTest(unittest.TestCase):
+
+    def test_operations_are_classified(self):
+        self.assertEqual(READ, operation_class('DescribeSnapshots'))
+        self.assertEqual(TAG, operation_class('CreateTags'))
+        self.assertEqual(TAG, operation_class('AddTagsToResource'))
+        self.assertEqual(WRITE, operation_class('CreateSnapshot'))
+        self.assertEqual(WRITE, operation_class('CopyDBSnapshot'))
+
+
+class ClientRateLimitTest(unittest.TestCase):
+    """Hooked into the calls of a real botocore client, answered without reaching AWS."""
+
+    def setUp(self):
+        RateLimiter.clear()
+        self.addCleanup(RateLimiter.clear)
+        patch('shelvery.rate_limiter.time.sleep').start()
+        self.addCleanup(patch.stopall)
+
+        self.client = boto3.client('ec2', region_name='ap-southeast-2', aws_access_key_id='AKIA',
+                                   aws_secret_access_key='secret', config=Config(retries={'max_attempts': 3}))
+        RateLimiter.attach(self.client, account='arn:aws:iam::111111111111:role/shelvery')
+        self.responses = []
+
+        def respond(request, **kwargs):
+            status, body = self.responses.pop(0)
+            return AWSResponse(request.url, status, {}, RawBody(body))
+        # registered after the limiter, so every attempt still goes through it first
+        self.client.meta.events.register('before-send', respond)
+
+    def bucket(self):
+        return RateLimiter.bucket('ec2', 'ap-southeast-2', 'arn:aws:iam::111111111111:role/shelvery', READ)
+
+    def test_throttles_back_off_the_bucket_and_are_reported(self):
+        self.responses = [THROTTLED, NO_SNAPSHOTS]
+        report = RunReport('create_backups', 'ebs', '111111111111', 'ap-southeast-2')
+        token = current_run_report.set(report)
+        try:
+            self.client.describe_snapshots()
+        finally:
+            current_run_report.reset(token)
+
+        self.assertEqual({'ec2:read': 1}, report.to_dict()['throttles'])
+        self.assertEqual({'ec2:ap-southeast-2:read': 1}, RateLimiter.throttle_counts())
+        self.assertLess(self.bucket().rate, RateLimiter.DEFAULT_LIMITS['ec2'][READ][0])
+
+    def test_every_attempt_takes_a_token(self):
+        self.responses = [THROTTLED, THROTTLED, NO_SNAPSHOTS]
+
+        with patch.object(TokenBucket, 'acquire') as acquire:
+            self.client.describe_snapshots()
+
+        self.assertEqual(3, acquire.call_count)
+
+
+
+class ServiceLimitsTest(unittest.TestCase):
+    """Only the services whose limits shelvery runs into are limited, unless configured."""
+
+    def setUp(self):
+        RateLimiter.clear()
+        self.addCleanup(RateLimiter.clear)
+
+    def client(self, service):
+        return boto3.client(service, region_name='ap-southeast-2', aws_access_key_id='AKIA',
+                            aws_secret_access_key='secret')
+
+    def test_other_services_are_not_limited_by_default(self):
+        for service in ['sns', 'sts', 'redshift']:
+            self.assertIsNone(RateLimiter.service_limits(service))
+        sns = RateLimiter.attach(self.client('sns'))
+        sns.meta.events.register('before-send', lambda request, **kwargs: AWSResponse(
+            request.url, 200, {}, RawBody(b'<PublishResponse><PublishResult/></PublishResponse>')))
+
+        with patch.object(TokenBucket, 'acquire') as acquire:
+            sns.publish(TopicArn='arn:aws:sns:ap-southeast-2:111111111111:shelvery', Message='{}')
+
+        acquire.assert_not_called()
+        self.assertEqual({}, RateLimiter.throttle_counts())
+
+    def test_configured_services_are_limited_in_every_class(self):
+        limits = RateLimiter.service_limits('sns', {'sns': 20.0})
+
+        self.assertEqual({READ: (20.0, 100.0), WRITE: (20.0, 100.0), TAG: (20.0, 100.0)}, limits)
+
+    def test_configuration_overrides_the_defaults(self):
+        self.assertEqual((50.0, 250.0), RateLimiter.service_limits('ec2', {'ec2': 50.0})[WRITE])
+        self.assertEqual((5, 50), RateLimiter.service_limits('ec2', {'sns': 50.0})[WRITE])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+from shelvery.factory import ShelveryFactory
+from shelvery_tests.unit.engine_report_unit_test import aws_patchers
+
+
+def shelvery_tags(name, instance_id):
+    return [
+        {'Key': 'shelvery:backup', 'Value': 'true'},
+        {'Key': 'shelvery:tag_name', 'Value': 'shelvery'},
+        {'Key': 'shelvery:name', 'Value': name},
+        {'Key': 'shelvery:retention_type', 'Value': 'daily'},
+        {'Key': 'shelvery:date_created', 'Value': '2026-08-14-0100'},
+        {'Key': 'shelvery:region', 'Value': 'ap-southeast-2'},
+        {'Key': 'shelvery:entity_id', 'Value': instance_id},
+    ]
+
+
+class RdsDiscoveryTest(unittest.TestCase):
+    """Only shelvery's own snapshots are worth enriching with their source instance."""
+
+    def setUp(self):
+        for p in aws_patchers():
+            p.start()
+            self.addCleanup(p.stop)
+
+        self.engine = ShelveryFactory.get_shelvery_instance('rds')
+        self.rds = MagicMock()
+        self.rds.get_paginator.side_effect = self.paginator
+        self.pages = {
+            'describe_db_snapshots': {'DBSnapshots': [
+                {'DBSnapshotIdentifier': 'db1-daily', 'DBInstanceIdentifier': 'db1',
+                 'TagList': shelvery_tags('db1-daily', 'db1')},
+                {'DBSnapshotIdentifier': 'gone-daily', 'DBInstanceIdentifier': 'gone',
+                 'TagList': shelvery_tags('gone-daily', 'gone')},
+                {'DBSnapshotIdentifier': 'someone-elses', 'DBInstanceIdentifier': 'db2', 'TagList': []},
+            ]},
+            'describe_db_instances': {'DBInstances': [
+                {'DBInstanceIdentifier': 'db1', 'InstanceCreateTime': datetime(2026, 1, 1),
+                 'TagList': [{'Key': 'Name', 'Value': 'orders'}]},
+                {'DBInstanceIdentifier': 'db2', 'InstanceCreateTime': datetime(2026, 1, 1), 'TagList': []},
+            ]},
+        }
+        self.scanned = []
+
+    def paginator(self, operation_name):
+        self.scanned.append(operation_name)
+        paginator = MagicMock()
+        paginator.paginate.return_value = [self.pages[operation_name]]
+        return paginator
+
+    def get_existing_backups(self):
+        with patch('shelvery.rds_backup.AwsHelper.boto3_client', return_value=self.rds):
+            return self.engine.get_existing_backups('shelvery')
+
+    def test_only_marked_snapshots_are_returned_and_enriched(self):
+        backups = {b.backup_id: b for b in self.get_existing_backups()}
+
+        self.assertEqual({'db1-daily', 'gone-daily'}, set(backups))
+        self.assertEqual('orders', backups['db1-daily'].entity_resource.tags['Name'])
+        self.assertEqual('gone', backups['gone-daily'].entity_resource.resource_id)
+        self.assertEqual({}, backups['gone-daily'].entity_resource.tags)
+
+    def test_instances_are_scanned_once_and_tags_come_from_the_describe(self):
+        self.get_existing_backups()
+
+        self.assertEqual(1, self.scanned.count('describe_db_instances'))
+        self.rds.describe_db_instances.assert_not_called()
+        self.rds.list_tags_for_resource.assert_not_called()
+
+    def test_no_instance_scan_without_shelvery_snapshots(self):
+        self.pages['describe_db_snapshots']['DBSnapshots'] = \
+            self.pages['describe_db_snapshots']['DBSnapshots'][2:]
+
+        self.assertEqual([], self.get_existing_backups())
+        self.assertNotIn('describe_db_instances', self.scanned)
+
+
+
+class CopyThroughRoleTest(unittest.TestCase):
+    """DR copies of the RDS family are made in the account of the engine's role, not the runtime's."""
+
+    def setUp(self):
+        for p in aws_patchers():
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_copies_use_the_role_in_both_regions(self):
+        for engine_type, service in [('rds', 'rds'), ('rds_cluster', 'rds'), ('docdb', 'docdb')]:
+            engine = ShelveryFactory.get_shelvery_instance(engine_type)
+            engine.role_arn, engine.role_external_id = 'arn:aws:iam::111111111111:role/shelvery', 'external'
+            client = MagicMock()
+            client.describe_db_snapshots.return_value = {'DBSnapshots': [{'DBSnapshotArn': 'arn:snapshot'}]}
+            client.describe_db_cluster_snapshots.return_value = {
+                'DBClusterSnapshots': [{'DBClusterSnapshotArn': 'arn:snapshot'}]}
+            with patch(f"shelvery.{engine.__module__.split('.')[-1]}.AwsHelper.boto3_client",
+                       return_value=client) as boto3_client:
+                engine.copy_backup_to_region('snap-1', 'us-east-1')
+
+            for c in boto3_client.call_args_list:
+                self.assertEqual(service, c.args[0])
+                self.assertEqual(('arn:aws:iam::111111111111:role/shelvery', 'external'),
+                                 (c.kwargs.get('arn'), c.kwargs.get('external_id')), engine_type)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,175 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+from shelvery.backup_report import RunReport
+from shelvery.engine import ShelveryEngine
+from shelvery.factory import ShelveryFactory
+from shelvery.runtime_config import RuntimeConfig
+from shelvery.shelvery_invoker import ShelveryInvoker, ThreadPoolBackend
+from shelvery_cli.shelver_cli_main import ShelveryCliMain
+
+
+class FakeEngine:
+    calls = []
+    lock = threading.Lock()
+
+    def __init__(self, engine_type):
+        self.engine_type = engine_type
+        self.lambda_payload = None
+        self.logger = MagicMock()
+        self.run_report = None
+        self._run_report_token = None
+        self.published = []
+
+    def create_backups(self):
+        self._run('create_backups')
+
+    def clean_backups(self):
+        self._run('clean_backups')
+        if self.engine_type == 'redshift':
+            raise RuntimeError('clean failed')
+
+    def _run(self, action):
+        role_arn = getattr(self, 'role_arn', None)
+        if role_arn == 'arn:aws:iam::222222222222:role/broken':
+            raise RuntimeError('AccessDenied')
+        with FakeEngine.lock:
+            FakeEngine.calls.append((self.engine_type, action))
+        account_id = role_arn.split(':')[4] if role_arn else '123456789012'
+        self.run_report = RunReport(action, self.engine_type, account_id, 'ap-southeast-2')
+        self.run_report.add({'operation': 'CreateBackup', 'status': 'OK'})
+        ShelveryEngine.publish_run_report(self)
+
+    def publish_run_report(self):
+        self.published.append(self.run_report)
+
+
+class CliTestCase(unittest.TestCase):
+
+    def setUp(self):
+        FakeEngine.calls = []
+        # the first engine of each type, the one the cli publishes through
+        self.engines = {}
+
+        def get_instance(engine_type):
+            engine = FakeEngine(engine_type)
+            first = self.engines.setdefault(engine_type, engine)
+            return first if self.shared_engines else engine
+        patcher = patch.object(ShelveryFactory, 'get_shelvery_instance', side_effect=get_instance)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class AllBackupTypesTest(CliTestCase):
+    """One invocation, every backup type, one report."""
+
+    shared_engines = True
+
+    def test_every_type_runs_each_action_before_the_next_one(self):
+        exit_code = ShelveryCliMain().main('all', 'create_backups,clean_backups')
+
+        created = len(ShelveryFactory.BACKUP_TYPES)
+        self.assertEqual({'create_backups'}, {action for _, action in FakeEngine.calls[:created]})
+        self.assertEqual({'clean_backups'}, {action for _, action in FakeEngine.calls[created:]})
+        self.assertEqual(1, exit_code)
+
+    def test_reports_are_published_once_merged(self):
+        ShelveryCliMain().main('ebs,rds', 'create_backups')
+
+        published = self.engines['ebs'].published
+        self.assertEqual(1, len(published))
+        self.assertEqual('ebs,rds', published[0].backup_type)
+        self.assertEqual(2, published[0].count('OK'))
+        self.assertEqual([], self.engines['rds'].published)
+
+    @patch.dict(os.environ, {'shelvery_source_regions': 'ap-southeast-2, us-east-1,'})
+    def test_source_regions_run_in_worker_processes_of_their_own(self):
+        with patch.object(ShelveryCliMain, 'run_in_worker_processes', return_value=[]) as run:
+            ShelveryCliMain().main('ebs', 'create_backups')
+
+        run.assert_called_once_with(self.engines['ebs'], ['ebs'], ['create_backups'],
+                                    ['ap-southeast-2', 'us-east-1'], 2, roles=[None])
+
+    def test_unknown_backup_type_is_refused(self):
+        with patch.object(ShelveryFactory, 'get_shelvery_instance', return_value=None):
+            with self.assertRaises(ValueError):
+                ShelveryCliMain().main('ebs,nope', 'create_backups')
+
+
+class AccountsTest(CliTestCase):
+    """Many accounts in one run, none of them holding up the others."""
+
+    # each account gets engines of its own
+    shared_engines = False
+
+    @patch.dict(os.environ, {'shelvery_role_arns': 'arn:aws:iam::111111111111:role/shelvery,'
+                                                   'arn:aws:iam::222222222222:role/broken,'
+                                                   'arn:aws:iam::333333333333:role/shelvery'})
+    def test_a_broken_account_does_not_stop_the_others(self):
+        exit_code = ShelveryCliMain().main('ebs', 'create_backups')
+
+        self.assertEqual(1, exit_code)
+        self.assertEqual(2, len(FakeEngine.calls))
+        report = self.engines['ebs'].published[0].to_dict()
+        self.assertEqual(['111111111111', '333333333333'],
+                         sorted(section['account_id'] for section in report['sections']))
+
+    @patch.dict(os.environ, {'shelvery_role_arns': 'arn:aws:iam::111111111111:role/shelvery'})
+    def test_each_action_waits_for_what_the_one_before_dispatched(self):
+        order = []
+        with patch.object(FakeEngine, 'clean_backups', lambda engine: order.append('clean_backups')), \
+                patch('shelvery_cli.shelver_cli_main.ShelveryInvoker.join',
+                      side_effect=lambda roles=None: order.append('join') or []):
+            ShelveryCliMain().main('ebs', 'create_backups,clean_backups')
+
+        self.assertEqual(['join', 'clean_backups'], order[:2])
+
+    def test_an_account_only_waits_for_what_it_dispatched(self):
+        ShelveryInvoker.set_backend(ThreadPoolBackend(4))
+        self.addCleanup(ShelveryInvoker.set_backend, None)
+        slow_role, fast_role = ('arn:aws:iam::111111111111:role/shelvery', None), \
+                               ('arn:aws:iam::333333333333:role/shelvery', None)
+        copying, gate = threading.Event(), threading.Event()
+
+        def create_backups(engine):
+            ShelveryInvoker.get_backend(engine).submit(engine.engine_type, 'do_copy_backup', {'RoleArn': engine.role_arn},
+                                                       role=(engine.role_arn, engine.role_external_id))
+
+        def do_copy_backup(engine, arguments):
+            if engine.role_arn == slow_role[0]:
+                copying.set()
+                gate.wait(5)
+
+        cli, slow_results = ShelveryCliMain(), []
+        with patch.object(FakeEngine, 'create_backups', create_backups), \
+                patch.object(FakeEngine, 'do_copy_backup', do_copy_backup, create=True):
+            slow = threading.Thread(target=lambda: slow_results.extend(
+                cli.run_in_account(['ebs'], ['create_backups'], slow_role)))
+            slow.start()
+            copying.wait(5)
+
+            fast_results = cli.run_in_account(['ebs'], ['create_backups'], fast_role)
+            self.assertFalse(gate.is_set())
+            gate.set()
+            slow.join(5)
+
+        self.assertEqual([fast_role[0]], [r.arguments['RoleArn'] for r in fast_results if r.method_name == 'do_copy_backup'])
+        self.assertEqual([slow_role[0]], [r.arguments['RoleArn'] for r in slow_results if r.method_name == 'do_copy_backup'])
+
+    def test_role_arns_come_from_config_and_file(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.txt') as f:
+            f.write('# production\narn:aws:iam::111111111111:role/shelvery\n\narn:aws:iam::333333333333:role/shelvery\n')
+            f.flush()
+            with patch.dict(os.environ, {'shelvery_role_arns': 'arn:aws:iam::111111111111:role/shelvery',
+                                         'shelvery_role_arns_file': f.name}):
+                role_arns = RuntimeConfig.get_role_arns(FakeEngine('ebs'))
+
+        self.assertEqual(['arn:aws:iam::111111111111:role/shelvery', 'arn:aws:iam::333333333333:role/shelvery'],
+                         role_arns)
+
+
+if __name__ == '__main__':
+    unittest.main()
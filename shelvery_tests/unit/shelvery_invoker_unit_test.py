@@ -0,0 +1,194 @@
+import os
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from shelvery.backup_report import RunReport
+from shelvery.engine import ShelveryEngine
+from shelvery.shelvery_invoker import (InlineBackend, ProcessPoolBackend, ShelveryInvoker, ThreadPoolBackend,
+                                       WorkerError, _run_work_unit)
+
+
+class FakeEngine:
+    created = []
+    lock = threading.Lock()
+
+    def __init__(self):
+        with FakeEngine.lock:
+            FakeEngine.created.append(self)
+        self.calls = []
+
+    def do_copy_backup(self, arguments):
+        time.sleep(0.01)
+        if arguments.get('fail'):
+            raise RuntimeError('copy failed')
+        self.calls.append(arguments)
+        return arguments['BackupId']
+
+
+class DispatchBackendTest(unittest.TestCase):
+    """Thousands of operations must not mean thousands of threads, or a run that exits early."""
+
+    def setUp(self):
+        FakeEngine.created = []
+        patcher = patch('shelvery.shelvery_invoker.DispatchBackend._new_engine',
+                        side_effect=lambda engine_type, role=None: FakeEngine())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_threads_are_bounded_and_engines_reused_per_thread(self):
+        backend = ThreadPoolBackend(4)
+        threads_before = threading.active_count()
+
+        for i in range(50):
+            backend.submit('ebs', 'do_copy_backup', {'BackupId': f"snap-{i}"})
+        self.assertLessEqual(threading.active_count() - threads_before, 4)
+        results = backend.join()
+
+        self.assertEqual(50, len(results))
+        self.assertLessEqual(len(FakeEngine.created), 4)
+
+    def test_each_role_gets_engines_of_its_own(self):
+        backend = ThreadPoolBackend(1)
+        for role in [None, ('arn:aws:iam::111111111111:role/shelvery', None), None]:
+            backend.submit('ebs', 'do_copy_backup', {'BackupId': 'snap-1'}, role=role)
+        backend.join()
+
+        self.assertEqual(2, len(FakeEngine.created))
+
+    def test_results_and_errors_are_aggregated(self):
+        backend = ThreadPoolBackend(2)
+        backend.submit('ebs', 'do_copy_backup', {'BackupId': 'snap-1'})
+        backend.submit('ebs', 'do_copy_backup', {'BackupId': 'snap-2', 'fail': True})
+
+        results = sorted(backend.join(), key=lambda r: r.arguments['BackupId'])
+
+        self.assertEqual('snap-1', results[0].result)
+        self.assertIsNone(results[0].error)
+        self.assertIsInstance(results[1].error, RuntimeError)
+        self.assertEqual([], backend.join())
+
+    def test_join_waits_for_operations_dispatched_by_operations(self):
+        backend = ThreadPoolBackend(2)
+
+        def copy_then_share(arguments):
+            backend.submit('ebs', 'do_copy_backup', {'BackupId': 'snap-copy'})
+            return 'shared'
+        FakeEngine.do_share_backup = lambda self, arguments: copy_then_share(arguments)
+        self.addCleanup(delattr, FakeEngine, 'do_share_backup')
+
+        backend.submit('ebs', 'do_share_backup', {'BackupId': 'snap-1'})
+
+        self.assertEqual(2, len(backend.join()))
+
+    def test_inline_failures_still_reach_the_caller(self):
+        backend = InlineBackend()
+
+        with self.assertRaises(RuntimeError):
+            backend.submit('ebs', 'do_copy_backup', {'BackupId': 'snap-1', 'fail': True})
+
+        self.assertIsInstance(backend.join()[0].error, RuntimeError)
+
+
+class ReportingEngine:
+    logger = MagicMock()
+    lambda_payload = None
+    _run_report_token = None
+
+    def create_backups(self):
+        self.run_report = RunReport('create_backups', 'ebs', '123456789012', 'ap-southeast-2')
+        self.run_report.add({'operation': 'CreateBackup', 'status': 'OK'})
+        ShelveryEngine.publish_run_report(self)
+        ShelveryInvoker().get_backend(self).submit('ebs', 'do_copy_backup', {'BackupId': 'snap-1', 'fail': True})
+
+    def clean_backups(self):
+        raise SystemExit(1)
+
+
+class WorkUnitTest(unittest.TestCase):
+    """What a worker process sends back to the parent."""
+
+    def setUp(self):
+        patcher = patch('shelvery.shelvery_invoker.DispatchBackend._new_engine',
+                        side_effect=lambda engine_type, role=None: FakeEngine() if engine_type == 'ebs' else ReportingEngine())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        ShelveryInvoker.set_backend(ThreadPoolBackend(2))
+        self.addCleanup(ShelveryInvoker.set_backend, None)
+
+    def test_reports_are_collected_and_dispatched_operations_joined(self):
+        reports, results = _run_work_unit('reporting', 'create_backups', None)
+
+        self.assertEqual(['create_backups'], [r.action for r in reports])
+        self.assertEqual([None, 'RuntimeError: copy failed'],
+                         [r.error and str(r.error) for r in results])
+        self.assertIsNone(ShelveryEngine._run_report_collector)
+
+    @patch.dict(os.environ, {'AWS_DEFAULT_REGION': 'ap-southeast-2'})
+    def test_a_unit_runs_in_its_own_region(self):
+        previous = ShelveryInvoker.get_backend(ReportingEngine())
+
+        reports, _ = _run_work_unit('reporting', 'create_backups', None, region='us-east-1')
+
+        self.assertEqual('us-east-1', os.environ['AWS_DEFAULT_REGION'])
+        self.assertIsNot(previous, ShelveryInvoker._backend)
+
+    def test_even_an_exit_comes_back_as_a_failed_unit(self):
+        _, results = _run_work_unit('reporting', 'clean_backups', None)
+
+        self.assertIsInstance(results[0].error, WorkerError)
+
+
+class ProcessPoolBackendTest(unittest.TestCase):
+
+    def test_work_units_run_in_worker_processes(self):
+        backend = ProcessPoolBackend(2)
+        self.addCleanup(backend.shutdown)
+
+        # no such engine type - fails in the worker, without touching AWS
+        backend.submit('no_such_type', 'create_backups')
+        results = backend.join()
+
+        self.assertEqual(1, len(results))
+        self.assertIsInstance(results[0].error, WorkerError)
+        self.assertIsNone(backend.run_report())
+
+
+class InvokerBackendTest(unittest.TestCase):
+
+    def setUp(self):
+        ShelveryInvoker.set_backend(None)
+        self.addCleanup(ShelveryInvoker.set_backend, None)
+        self.engine = MagicMock(aws_request_id=0, lambda_payload=None, role_arn=None)
+        self.engine.get_engine_type.return_value = 'ebs'
+
+    def test_operations_go_to_the_configured_backend(self):
+        backend = MagicMock()
+        ShelveryInvoker.set_backend(backend)
+
+        with patch.dict(os.environ, {'SHELVERY_MONO_THREAD': '0'}):
+            ShelveryInvoker().invoke_shelvery_operation(self.engine, 'do_copy_backup', {'BackupId': 'snap-1'})
+
+        backend.submit.assert_called_once_with('ebs', 'do_copy_backup', {'BackupId': 'snap-1'}, role=None)
+
+    def test_operations_act_through_the_role_of_the_dispatching_engine(self):
+        backend = MagicMock()
+        ShelveryInvoker.set_backend(backend)
+        self.engine.role_arn, self.engine.role_external_id = 'arn:aws:iam::111111111111:role/shelvery', 'secret'
+
+        with patch.dict(os.environ, {'SHELVERY_MONO_THREAD': '0'}):
+            ShelveryInvoker().invoke_shelvery_operation(self.engine, 'do_copy_backup', {'BackupId': 'snap-1'})
+
+        self.assertEqual(('arn:aws:iam::111111111111:role/shelvery', 'secret'), backend.submit.call_args[1]['role'])
+
+    @patch.dict(os.environ, {'shelvery_invoker_max_workers': '3', 'SHELVERY_MONO_THREAD': '0'})
+    def test_default_backend_is_a_bounded_thread_pool(self):
+        backend = ShelveryInvoker.get_backend(self.engine)
+
+        self.assertIsInstance(backend, ThreadPoolBackend)
+        self.assertEqual(3, backend._executor._max_workers)
+
+
+if __name__ == '__main__':
+    unittest.main()